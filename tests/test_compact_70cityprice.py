@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""compact 只恢复规范排序、统一城市名，其他单元格按原文写回"""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tools'))
+
+from storage_70cityprice import CSV_COLUMNS  # noqa: E402
+from update_70cityprice import compact_csv  # noqa: E402
+
+
+def _row(date, city, fixedbase, house):
+    row = dict.fromkeys(CSV_COLUMNS, '')
+    row.update({'DATE': date, 'ADCODE': '000000', 'CITY': city, 'FixedBase': fixedbase, 'HouseIDX': house})
+    return row
+
+
+def test_compact_keeps_cell_text(tmp_path):
+    csv_path = tmp_path / '70cityprice.csv'
+    rows = [
+        _row('2024/2/1', '上海', '环比', '102'),
+        _row('2024/1/1', '北京市', '同比', '-'),
+        _row('2024/1/1', '北京', '环比', '101.23456789'),
+        _row('2024/1/1', '上海', '同比', '99.50'),
+        _row('2023/12/1', '上海', '环比', ''),
+    ]
+    pd.DataFrame(rows, columns=CSV_COLUMNS).to_csv(csv_path, index=False, quoting=1)
+
+    compact_csv(str(csv_path))
+
+    with open(csv_path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert [line.split(',')[:5] for line in lines[1:]] == [
+        ['"2023/12/1"', '"000000"', '"上海"', '"环比"', '""'],
+        ['"2024/1/1"', '"000000"', '"上海"', '"同比"', '"99.50"'],
+        ['"2024/2/1"', '"000000"', '"上海"', '"环比"', '"102"'],
+        ['"2024/1/1"', '"000000"', '"北京"', '"同比"', '"-"'],
+        ['"2024/1/1"', '"000000"', '"北京"', '"环比"', '"101.23456789"'],
+    ]
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+70城房价性能基准测试
+以真实CSV为模板生成放大N倍的合成数据，测量读取、提取、更新、校验和页面解析的关键路径，
+结果写入JSON，并可与基线结果比较，发现性能回退
+
+合成数据:
+    与真实CSV相同的列（REQUIRED_COLUMNS）、日期和取值；第0份为真实的70城（CITY_ADCODE），
+    第 k 份（k = 1 .. N-1）把每个城市换成独立的合成城市（名称 合成<k><序号>、ADCODE 9<k><序号>），
+    拼接后按 CITY/DATE/FixedBase 规范排序。所有日期都在真实数据的区间内，日期解析与排序走正常路径；
+    合成城市不在70城之列，validate_csv 在N>1时按设计报告城市名与每月城市数的问题（退出码为1）
+
+测量项目（每项重复 --repeat 次，记录最短与中位耗时）:
+    load_data_cold   删除缓存后首次 load_data（含建立列式缓存）
+    load_data        缓存有效时的 load_data
+    extract_by_month 最近12个月
+    extract_by_city  北上广深
+    update_csv       替换最新一个月的数据（全量重写并刷新缓存）
+    validate_csv     全部校验规则
+    process_tables   解析发布页面的6个表格（与数据规模无关，只测一次）
+
+使用方法:
+    python tools/benchmark_70cityprice.py                                   # 1x/10x/100x，输出 projects/benchmark.json
+    python tools/benchmark_70cityprice.py --scales 1 10 --repeat 5
+    python tools/benchmark_70cityprice.py --baseline projects/benchmark_baseline.json --threshold 0.25
+    python tools/benchmark_70cityprice.py --html saved_release.html         # 指定已保存的发布页面
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from storage_70cityprice import CSV_COLUMNS, get_cache_dir, parse_month_key
+
+BENCHMARK_FORMAT_VERSION = 2
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.25
+# 合成城市名前缀（不含任何真实城市名，城市名标准化不会把它匹配回70城）
+SYNTHETIC_CITY_PREFIX = '合成'
+EXTRACT_CITIES = ['北京', '上海', '广州', '深圳']
+
+
+def get_default_csv_path():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), '70cityprice.csv')
+
+
+def generate_dataset(template, scale):
+    """
+    以真实数据为模板生成 scale 倍的合成数据集（第 k 份副本为一组合成城市，日期不变）
+
+    参数:
+        template: read_csv(dtype=str) 读入的真实数据
+    返回: (df, info)；info 含 rows / months / cities
+    """
+    import pandas as pd
+    if scale < 1:
+        raise ValueError("放大倍数至少为1")
+    if scale > 1000:
+        raise ValueError("放大倍数最多为1000")
+    template = template[CSV_COLUMNS].reset_index(drop=True)
+    date_codes, date_values = pd.factorize(template['DATE'])
+    value_keys = np.array([parse_month_key(v) for v in date_values], dtype=np.int64)
+    if (value_keys < 0).any():
+        raise ValueError("模板数据中存在无法解析的日期")
+    city_codes, city_values = pd.factorize(template['CITY'])
+    if (city_codes < 0).any():
+        raise ValueError("模板数据中存在空的城市名")
+    n_rows = len(template)
+
+    data = {column: np.tile(template[column].to_numpy(dtype=object), scale) for column in CSV_COLUMNS}
+    # 第 k 份副本: 城市与ADCODE换成按 (k, 城市序号) 生成的合成值
+    for k in range(1, scale):
+        names = np.array([f'{SYNTHETIC_CITY_PREFIX}{k:03d}{i:02d}' for i in range(len(city_values))], dtype=object)
+        adcodes = np.array([f'9{k:03d}{i:02d}' for i in range(len(city_values))], dtype=object)
+        block = slice(k * n_rows, (k + 1) * n_rows)
+        data['CITY'][block] = names[city_codes]
+        data['ADCODE'][block] = adcodes[city_codes]
+    df = pd.DataFrame(data, columns=CSV_COLUMNS)
+
+    # 规范顺序: CITY, DATE（按月份）, FixedBase
+    keys = np.tile(value_keys[date_codes], scale)
+    city_rank = pd.factorize(df['CITY'], sort=True)[0]
+    fixedbase_rank = pd.factorize(df['FixedBase'], sort=True)[0]
+    order = np.lexsort((fixedbase_rank, keys, city_rank))
+    df = df.iloc[order].reset_index(drop=True)
+
+    info = {
+        'rows': len(df),
+        'months': len(value_keys),
+        'cities': len(city_values) * scale,
+    }
+    return df, info
+
+
+def synthetic_release_html(template):
+    """
+    由模板数据最新月份生成与统计局发布页面结构相同的HTML（6个表格），
+    没有已保存的发布页面时用于测量 process_tables
+    """
+    from update_70cityprice import CITY_ADCODE, MAIN_INDEX_COLUMNS, SIZE_GROUPS, SIZE_INDEX_COLUMNS
+    last_key = max(parse_month_key(v) for v in template['DATE'].unique())
+    latest = template[template['DATE'].map(parse_month_key) == last_key]
+    values = {(row['CITY'], row['FixedBase']): row for row in latest.to_dict('records')}
+    cities = list(CITY_ADCODE)
+    halves = [cities[:35], cities[35:]]
+
+    def cell(city, fixedbase, column):
+        value = values.get((city, fixedbase), {}).get(column)
+        return value if isinstance(value, str) else ''
+
+    def table(rows, width, header_rows):
+        lines = ['<table>']
+        for _ in range(header_rows):
+            lines.append('<tr>' + '<td>标题</td>' * width + '</tr>')
+        for row in rows:
+            lines.append('<tr>' + ''.join(f'<td>{v}</td>' for v in row) + '</tr>')
+        lines.append('</table>')
+        return '\n'.join(lines)
+
+    tables = []
+    # 表1、表2: 城市|环比|同比|定基比 左右两栏
+    for column in MAIN_INDEX_COLUMNS.values():
+        rows = []
+        for left, right in zip(*halves):
+            rows.append([part for city in (left, right)
+                         for part in (city, *(cell(city, fb, column) for fb in ('环比', '同比', '定基比')))])
+        tables.append(table(rows, 8, 2))
+    # 表3(一)(二)、表4(一)(二): 城市|各面积段 环比|同比|定基比
+    for table_name in ('commodity', 'secondhand'):
+        for half in halves:
+            rows = [[city] + [cell(city, fb, SIZE_INDEX_COLUMNS[(table_name, size)])
+                              for size in SIZE_GROUPS for fb in ('环比', '同比', '定基比')]
+                    for city in half]
+            tables.append(table(rows, 10, 3))
+    return '<html><body>\n' + '\n'.join(tables) + '\n</body></html>'
+
+
+def find_release_html(paths=None):
+    """发布页面HTML: 命令行指定的文件，否则为页面快照缓存中的全部页面；返回 [(来源, 内容)]"""
+    if paths:
+        sources = paths
+    else:
+        from snapshot_70cityprice import get_snapshot_dir
+        sources = sorted(glob.glob(os.path.join(get_snapshot_dir(), 'raw', '*.html')))
+    pages = []
+    for path in sources:
+        with open(path, 'rb') as f:
+            pages.append((path, f.read()))
+    return pages
+
+
+def measure(func, repeat, setup=None):
+    """重复执行 func（不计 setup 时间，屏蔽输出），返回耗时统计与最后一次的返回值"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            runs.append(time.perf_counter() - start)
+    return {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}, result
+
+
+def bench_scale(template, scale, repeat, workdir):
+    """生成 scale 倍数据并测量各项，返回 (info, timings)"""
+    from extract_70cityprice import extract_by_city, extract_by_month, load_data, month_key_to_tuple
+    from storage_70cityprice import write_dataset
+    from update_70cityprice import update_csv
+    from validate_70cityprice import validate_csv
+
+    df, info = generate_dataset(template, scale)
+    csv_path = os.path.join(workdir, f'bench_{scale}x.csv')
+    write_dataset(df, csv_path)
+    info['csv_bytes'] = os.path.getsize(csv_path)
+
+    last_key = max(parse_month_key(v) for v in df['DATE'].unique())
+    last_date = df['DATE'][df['DATE'].map(parse_month_key) == last_key].iloc[0]
+    month_records = df[df['DATE'] == last_date].to_dict('records')
+    end_year, end_month = month_key_to_tuple(last_key)
+    start_year, start_month = month_key_to_tuple(last_key - 11)
+    del df
+
+    def clear_cache():
+        shutil.rmtree(get_cache_dir(csv_path), ignore_errors=True)
+
+    timings = {}
+    timings['load_data_cold'], _ = measure(lambda: load_data(csv_path), repeat, setup=clear_cache)
+    timings['load_data'], loaded = measure(lambda: load_data(csv_path), repeat)
+    timings['extract_by_month'], _ = measure(
+        lambda: extract_by_month(loaded, start_year, start_month, end_year, end_month), repeat)
+    timings['extract_by_city'], _ = measure(lambda: extract_by_city(loaded, EXTRACT_CITIES), repeat)
+    del loaded
+    timings['update_csv'], _ = measure(lambda: update_csv(csv_path, month_records), repeat)
+    timings['validate_csv'], exit_code = measure(lambda: validate_csv(csv_path), repeat)
+    info['validate_exit_code'] = exit_code
+    return info, timings
+
+
+def bench_release(pages, repeat):
+    """测量 process_tables（每个页面分别解析为表格后计时）"""
+    import pandas as pd
+    from update_70cityprice import process_tables, process_tables_long
+
+    tables_list = [pd.read_html(io.BytesIO(content)) for _, content in pages]
+    timings = {}
+    timings['process_tables'], _ = measure(
+        lambda: [process_tables(tables) for tables in tables_list], repeat)
+    timings['process_tables_long'], _ = measure(
+        lambda: [process_tables_long(tables) for tables in tables_list], repeat)
+    return timings
+
+
+def environment_info():
+    import pandas as pd
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """
+    与基线比较中位耗时
+    返回: (rows, regressions)；rows 为 (项目, 基线秒, 本次秒, 变化比例)，回退为变化超过 threshold 的项目
+    """
+    rows = []
+    regressions = []
+    previous = baseline.get('results', {})
+    for key, current in results.items():
+        if key not in previous:
+            continue
+        before = previous[key]['median']
+        after = current['median']
+        change = (after - before) / before if before > 0 else 0.0
+        rows.append((key, before, after, change))
+        if change > threshold:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='70城房价性能基准测试（合成放大数据）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  %(prog)s                                             # 1x/10x/100x
+  %(prog)s --scales 1 10 --repeat 5 --output projects/bench.json
+  %(prog)s --baseline projects/benchmark_baseline.json  # 与基线比较，有回退时退出码为1
+        """
+    )
+    parser.add_argument('--scales', nargs='+', type=int, default=list(DEFAULT_SCALES),
+                        help='数据放大倍数 (默认: 1 10 100)')
+    parser.add_argument('--repeat', '-r', type=int, default=DEFAULT_REPEAT,
+                        help=f'每项重复次数 (默认: {DEFAULT_REPEAT})')
+    parser.add_argument('--output', '-o', default='projects/benchmark.json',
+                        help='结果JSON（相对路径以仓库根目录为准，默认: projects/benchmark.json）')
+    parser.add_argument('--baseline', help='基线结果JSON（之前的输出文件）')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'中位耗时增加超过该比例视为回退 (默认: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--html', nargs='+', help='发布页面HTML文件（默认使用页面快照缓存，没有时使用合成页面）')
+    parser.add_argument('--csv', default=get_default_csv_path(), help='作为模板的真实CSV文件')
+    parser.add_argument('--keep', action='store_true', help='保留生成的合成数据目录')
+    args = parser.parse_args()
+
+    if args.repeat <= 0 or any(scale <= 0 for scale in args.scales):
+        print("错误: --repeat 与 --scales 必须为正整数")
+        sys.exit(1)
+    if not os.path.exists(args.csv):
+        print(f"错误: CSV文件不存在: {args.csv}")
+        sys.exit(1)
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"错误: 无法读取基线结果: {e}")
+            sys.exit(1)
+        if baseline.get('version') != BENCHMARK_FORMAT_VERSION:
+            print(f"错误: 基线结果的格式版本为 {baseline.get('version')}，与当前版本 {BENCHMARK_FORMAT_VERSION} "
+                  f"的合成数据不同，请重新生成基线")
+            sys.exit(1)
+
+    import pandas as pd
+    from extract_70cityprice import get_repo_root
+    template = pd.read_csv(args.csv, dtype=str, keep_default_na=False)
+    template = template.replace('', None)
+
+    report = {
+        'version': BENCHMARK_FORMAT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment_info(),
+        'repeat': args.repeat,
+        'scales': {},
+        'results': {},
+    }
+
+    workdir = tempfile.mkdtemp(prefix='70cityprice_bench_')
+    try:
+        for scale in args.scales:
+            print(f"\n[{scale}x] 生成合成数据...")
+            info, timings = bench_scale(template, scale, args.repeat, workdir)
+            report['scales'][f'{scale}x'] = info
+            print(f"[{scale}x] {info['rows']} 行，{info['cities']} 个城市 × {info['months']} 个月，"
+                  f"{info['csv_bytes'] / 1024 / 1024:.1f}MB")
+            for name, stats in timings.items():
+                report['results'][f'{name}@{scale}x'] = stats
+                print(f"  {name:<20} 中位 {stats['median'] * 1000:9.1f}ms  最短 {stats['min'] * 1000:9.1f}ms")
+
+        pages = find_release_html(args.html)
+        source = 'file' if args.html else 'snapshot'
+        if not pages:
+            pages = [('synthetic', synthetic_release_html(template).encode('utf-8'))]
+            source = 'synthetic'
+        print(f"\n[页面解析] {len(pages)} 个发布页面（{source}）")
+        report['release'] = {'pages': len(pages), 'source': source}
+        for name, stats in bench_release(pages, args.repeat).items():
+            report['results'][name] = stats
+            print(f"  {name:<20} 中位 {stats['median'] * 1000:9.1f}ms  最短 {stats['min'] * 1000:9.1f}ms")
+    finally:
+        if args.keep:
+            print(f"\n合成数据保留在: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output_path = args.output if os.path.isabs(args.output) else os.path.join(get_repo_root(), args.output)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"\n✅ 结果已保存到: {output_path}")
+
+    if baseline is not None:
+        rows, regressions = compare_with_baseline(report['results'], baseline, args.threshold)
+        print(f"\n与基线比较（{args.baseline}，阈值 +{args.threshold:.0%}）:")
+        for key, before, after, change in rows:
+            mark = '  ⚠️ 回退' if key in regressions else ''
+            print(f"  {key:<28} {before * 1000:9.1f}ms -> {after * 1000:9.1f}ms  {change:+7.1%}{mark}")
+        if regressions:
+            print(f"\n错误: {len(regressions)} 项性能回退超过 {args.threshold:.0%}")
+            sys.exit(1)
+        print("\n未发现性能回退")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+70城房价连续价格水平（环比链式指数）
+由环比数据逐月连乘，得到每个城市、每个指数列的连续价格水平
+
+计算方法:
+    对每个 (指数列, 城市)，以首个环比月份的上月为100，逐月乘以 环比/100；
+    序列中途缺少某月环比时，此后的水平无法连接，记为空值。
+    全部城市一次性构造 (指数列, 城市, 月份) 的三维环比矩阵，沿月份轴 np.cumprod。
+
+缓存格式:
+    <CSV所在目录>/.cache/<CSV文件名>.chain.npz
+        months   连续的整数月份键（年*12 + 月-1）
+        cities   城市名（按名称排序）
+        metrics  指数列名
+        levels   float64 价格水平，形状 (指数列, 城市, 月份)
+        sha256   计算时CSV的内容哈希（与列式缓存键一致），不一致时重新计算
+
+增量更新:
+    update_70cityprice 写入新月份后调用 extend_chain，
+    只对新增月份计算 上月水平 × 新环比 的累乘，结果与全量重算逐位一致。
+
+使用方法:
+    python tools/chain_70cityprice.py 北京 上海 --metric CommodityHouseIDX --start 201101 --end 202512
+    python tools/chain_70cityprice.py --output levels.csv     # 全部城市
+    python tools/chain_70cityprice.py --rebuild               # 强制全量重算
+
+作为库调用:
+    from chain_70cityprice import chain_frame, load_chain
+    chain = load_chain()
+    df = chain_frame(chain, 'CommodityHouseIDX', cities=['北京', '上海'])
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from storage_70cityprice import (
+    NUMERIC_COLUMNS, cache_enabled, encode_frame, get_cache_dir, get_sidecar_path, load_encoded,
+    parse_month_key, source_sha
+)
+
+CHAIN_SUFFIX = '.chain.npz'
+CHAIN_FORMAT_VERSION = 1
+CHAIN_FIXED_BASE = '环比'
+CHAIN_BASE_LEVEL = 100.0
+CHAIN_COLUMNS = ['DATE', 'CITY', 'FixedBase'] + NUMERIC_COLUMNS
+DEFAULT_METRIC = 'CommodityHouseIDX'
+
+
+def get_default_csv_path():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), '70cityprice.csv')
+
+
+def compute_chain_levels(ratios, last_level=None, started=None):
+    """
+    环比矩阵 -> 价格水平矩阵（沿最后一维累乘）
+
+    参数:
+        ratios: 环比值，形状 (..., 月份)，空值为NaN
+        last_level / started: 之前月份的末期水平与是否已开始（增量计算时传入），形状 (...)
+    序列开始前与中途断开后的水平为NaN
+    """
+    ratios = np.asarray(ratios, dtype=np.float64)
+    shape = ratios.shape[:-1]
+    if last_level is None:
+        last_level = np.full(shape, np.nan)
+        started = np.zeros(shape, dtype=bool)
+    valid = ~np.isnan(ratios)
+    began = np.logical_or.accumulate(valid, axis=-1) | started[..., None]
+    broken = np.logical_or.accumulate(began & ~valid, axis=-1) | (started & np.isnan(last_level))[..., None]
+
+    # 首列放入基期水平再整体累乘: 增量计算从上月水平接着乘，与全量结果逐位一致
+    base = np.where(started, last_level, CHAIN_BASE_LEVEL)
+    factors = np.concatenate([base[..., None], np.where(valid, ratios / 100.0, 1.0)], axis=-1)
+    levels = np.cumprod(factors, axis=-1)[..., 1:]
+    levels[~began | broken] = np.nan
+    return levels
+
+
+def ratio_matrix(arrays, months=None, cities=None):
+    """
+    由字典编码数组构造环比矩阵
+
+    参数:
+        arrays: encode_frame / load_encoded 的输出（需含 DATE、CITY、FixedBase 与指数列）
+        months / cities: 指定矩阵的月份键与城市（默认取数据中出现的连续月份范围与排序后的城市）
+    返回: (months, cities, ratios)，ratios 形状 (指数列, 城市, 月份)；同一格有多条记录时取最后一条
+    """
+    import pandas as pd
+    fb_values = arrays['FixedBase.values']
+    rows = np.flatnonzero(np.isin(arrays['FixedBase.codes'], np.flatnonzero(fb_values == CHAIN_FIXED_BASE)))
+
+    date_keys = np.array([parse_month_key(v) for v in arrays['DATE.values'].tolist()] + [-1], dtype=np.int64)
+    row_month = date_keys[arrays['DATE.codes'][rows]]
+    row_city = arrays['CITY.codes'][rows].astype(np.int64)
+    city_values = arrays['CITY.values']
+    keep = (row_month >= 0) & (row_city >= 0)
+    rows, row_month, row_city = rows[keep], row_month[keep], row_city[keep]
+
+    if months is None:
+        months = np.arange(row_month.min(), row_month.max() + 1) if len(rows) else np.empty(0, dtype=np.int64)
+    months = np.asarray(months, dtype=np.int64)
+    if cities is None:
+        cities = sorted(str(city_values[c]) for c in np.unique(row_city))
+    cities = list(cities)
+
+    city_lookup = {city: pos for pos, city in enumerate(cities)}
+    city_pos = np.array([city_lookup.get(str(v), -1) for v in city_values.tolist()], dtype=np.int64)[row_city]
+    month_pos = row_month - months[0] if len(months) else np.full(len(rows), -1, dtype=np.int64)
+    inside = (city_pos >= 0) & (month_pos >= 0) & (month_pos < len(months))
+    rows, city_pos, month_pos = rows[inside], city_pos[inside], month_pos[inside]
+
+    ratios = np.full((len(NUMERIC_COLUMNS), len(cities), len(months)), np.nan)
+    for i, column in enumerate(NUMERIC_COLUMNS):
+        values = arrays[f'{column}.values']
+        numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        lookup = np.append(numbers, np.nan)
+        ratios[i, city_pos, month_pos] = lookup[arrays[f'{column}.codes'][rows]]
+    return months, cities, ratios
+
+
+def _read_chain(csv_path):
+    try:
+        with np.load(get_sidecar_path(csv_path, CHAIN_SUFFIX), allow_pickle=False) as npz:
+            if int(npz['version']) != CHAIN_FORMAT_VERSION:
+                return None
+            if npz['metrics'].tolist() != NUMERIC_COLUMNS:
+                return None
+            return {
+                'months': npz['months'],
+                'cities': npz['cities'].tolist(),
+                'metrics': npz['metrics'].tolist(),
+                'levels': npz['levels'],
+                'sha256': str(npz['sha256']),
+            }
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_chain(csv_path, chain):
+    """先写临时文件再原子替换"""
+    os.makedirs(get_cache_dir(csv_path), exist_ok=True)
+    path = get_sidecar_path(csv_path, CHAIN_SUFFIX)
+    tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(
+        tmp_path,
+        version=np.int64(CHAIN_FORMAT_VERSION),
+        months=np.asarray(chain['months'], dtype=np.int64),
+        cities=np.asarray(chain['cities'], dtype=str),
+        metrics=np.asarray(chain['metrics'], dtype=str),
+        levels=chain['levels'],
+        sha256=np.asarray(chain['sha256'], dtype=str),
+    )
+    os.replace(tmp_path, path)
+
+
+def build_chain(csv_path):
+    """全量计算价格水平（启用缓存时写入 .chain.npz）"""
+    arrays = load_encoded(csv_path, columns=CHAIN_COLUMNS)
+    months, cities, ratios = ratio_matrix(arrays)
+    chain = {
+        'months': months,
+        'cities': cities,
+        'metrics': list(NUMERIC_COLUMNS),
+        'levels': compute_chain_levels(ratios),
+        'sha256': source_sha(csv_path) if cache_enabled() else None,
+    }
+    if chain['sha256'] is not None:
+        try:
+            _save_chain(csv_path, chain)
+        except OSError as e:
+            print(f"警告: 无法写入价格水平缓存 ({e})")
+    return chain
+
+
+def load_chain(csv_path=None, rebuild=False):
+    """
+    加载价格水平: 缓存与CSV内容一致时直接读取，否则全量重算
+    返回: dict{'months': 月份键数组, 'cities': 城市列表, 'metrics': 指数列列表,
+              'levels': (指数列, 城市, 月份) float64, 'sha256'}
+    """
+    csv_path = csv_path or get_default_csv_path()
+    if cache_enabled() and not rebuild:
+        sha = source_sha(csv_path)
+        chain = _read_chain(csv_path) if sha is not None else None
+        if chain is not None and chain['sha256'] == sha:
+            return chain
+    return build_chain(csv_path)
+
+
+def extend_chain(csv_path, new_df, previous_sha):
+    """
+    CSV追加新月份后增量更新价格水平缓存
+
+    参数:
+        new_df: 本次写入的记录（字符串DataFrame）
+        previous_sha: 写入前CSV的内容哈希（source_sha）
+    只有缓存与写入前的CSV一致、且新记录全部晚于缓存的最后一个月时才增量计算；
+    否则不做处理，下次 load_chain 时全量重算。
+    返回: 是否完成增量更新
+    """
+    if not cache_enabled() or previous_sha is None or len(new_df) == 0:
+        return False
+    chain = _read_chain(csv_path)
+    sha = source_sha(csv_path)
+    if chain is None or chain['sha256'] != previous_sha or sha is None:
+        return False
+
+    arrays = encode_frame(new_df[[c for c in CHAIN_COLUMNS if c in new_df.columns]])
+    if any(f'{c}.codes' not in arrays for c in CHAIN_COLUMNS):
+        return False
+    new_keys = [parse_month_key(v) for v in arrays['DATE.values'].tolist()]
+    old_months = chain['months']
+    last_month = int(old_months[-1]) if len(old_months) else None
+    if min(new_keys) < 0 or (last_month is not None and min(new_keys) <= last_month):
+        return False
+
+    first_month = last_month + 1 if last_month is not None else min(new_keys)
+    months = np.arange(first_month, max(new_keys) + 1)
+    _, new_cities, _ = ratio_matrix(arrays)
+    cities = sorted(set(chain['cities']) | set(new_cities))
+
+    # 已有城市按新的城市顺序重排，新城市的历史水平为空
+    old_levels = np.full((len(NUMERIC_COLUMNS), len(cities), len(old_months)), np.nan)
+    positions = [cities.index(city) for city in chain['cities']]
+    old_levels[:, positions, :] = chain['levels']
+    _, _, ratios = ratio_matrix(arrays, months=months, cities=cities)
+
+    if len(old_months):
+        last_level = old_levels[..., -1]
+        started = ~np.isnan(old_levels).all(axis=-1)
+        new_levels = compute_chain_levels(ratios, last_level, started)
+    else:
+        new_levels = compute_chain_levels(ratios)
+
+    chain = {
+        'months': np.concatenate([old_months, months]),
+        'cities': cities,
+        'metrics': list(NUMERIC_COLUMNS),
+        'levels': np.concatenate([old_levels, new_levels], axis=-1),
+        'sha256': sha,
+    }
+    try:
+        _save_chain(csv_path, chain)
+    except OSError as e:
+        print(f"警告: 无法写入价格水平缓存 ({e})")
+        return False
+    return True
+
+
+def chain_frame(chain, metric=DEFAULT_METRIC, cities=None, start_key=None, end_key=None):
+    """
+    价格水平 -> 宽表DataFrame（行: DATE，与CSV相同的 YYYY/M/1 格式；列: 城市）
+
+    参数:
+        cities: 城市列表（默认全部）；start_key / end_key: 起止月份键（含）
+    """
+    import pandas as pd
+    if metric not in chain['metrics']:
+        raise ValueError(f"未知的指数列: {metric}")
+    all_cities = chain['cities']
+    cities = list(all_cities) if cities is None else list(cities)
+    unknown = [c for c in cities if c not in all_cities]
+    if unknown:
+        raise ValueError(f"未找到城市: {', '.join(unknown)}")
+
+    months = chain['months']
+    mask = np.ones(len(months), dtype=bool)
+    if start_key is not None:
+        mask &= months >= start_key
+    if end_key is not None:
+        mask &= months <= end_key
+
+    matrix = chain['levels'][chain['metrics'].index(metric)]
+    rows = [all_cities.index(c) for c in cities]
+    dates = [f'{key // 12}/{key % 12 + 1}/1' for key in months[mask].tolist()]
+    return pd.DataFrame(matrix[rows][:, mask].T, index=pd.Index(dates, name='DATE'), columns=cities)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='70城房价连续价格水平（环比链式指数）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  %(prog)s 北京 上海 广州 深圳                         # 新建商品住宅价格水平
+  %(prog)s 成都 --metric SecondHandIDX --start 201101  # 二手住宅，2011年起
+  %(prog)s --output levels.csv                         # 全部城市导出CSV
+        """
+    )
+    parser.add_argument('cities', nargs='*', help='城市名称列表（默认全部城市）')
+    parser.add_argument('--metric', '-m', default=DEFAULT_METRIC, choices=NUMERIC_COLUMNS,
+                        help=f'指数列（默认{DEFAULT_METRIC}）')
+    parser.add_argument('--start', '-s', help='起始月份 (格式: YYYYMM)')
+    parser.add_argument('--end', '-e', help='结束月份 (格式: YYYYMM)')
+    parser.add_argument('--output', '-o', help='输出CSV文件名（默认打印到终端）')
+    parser.add_argument('--csv', default=get_default_csv_path(), help='CSV文件路径')
+    parser.add_argument('--rebuild', action='store_true', help='忽略缓存，全量重算')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        print(f"错误: CSV文件不存在: {args.csv}")
+        sys.exit(1)
+
+    from extract_70cityprice import month_key, parse_month_arg
+    from update_70cityprice import standardize_city_column
+    try:
+        start_key = month_key(*parse_month_arg(args.start)) if args.start else None
+        end_key = month_key(*parse_month_arg(args.end)) if args.end else None
+        cities = [standardize_city_column(c) for c in args.cities] or None
+        chain = load_chain(args.csv, rebuild=args.rebuild)
+        df = chain_frame(chain, args.metric, cities, start_key, end_key)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    df = df.dropna(how='all')
+    if args.output:
+        df.to_csv(args.output, float_format='%.4f')
+        print(f"已保存 {len(df)} 个月份 × {len(df.columns)} 个城市的价格水平到: {args.output}")
+    else:
+        print(df.round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
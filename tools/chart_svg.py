@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+轻量SVG/HTML图表后端（纯Python，不导入matplotlib）
+绘制与 generate_chart 默认图表相同形状的折线图: 多城市折线、100基准线、图例与数据来源标注；
+也可输出自包含的HTML页面（完整图表 + 每个城市一行的迷你走势图），供网页看板直接使用
+
+字体只写入 font-family 列表，由浏览器选择，不做任何本地字体查找
+
+使用方法:
+    python tools/generate_chart.py --backend svg                            # assets/price_trend.svg
+    python tools/generate_chart.py --backend svg --format html              # assets/price_trend.html
+    python tools/generate_chart.py --spec tools/charts_all.json --backend svg --format svg html
+
+作为库调用:
+    from chart_svg import line_chart_svg
+    svg = line_chart_svg([{'label': '北京', 'color': '#E53935', 'months': [...], 'values': [...]}],
+                         title='北京新建商品住宅价格指数（同比）', ylabel='价格指数（上年同期=100）')
+"""
+
+import math
+from xml.sax.saxutils import escape
+
+# 绘图代码改变输出效果时加1（计入 generate_chart 的图表指纹）
+SVG_RENDER_VERSION = 1
+FONT_FAMILY = "'PingFang SC', 'Heiti SC', 'SimHei', 'Microsoft YaHei', 'Noto Sans CJK SC', sans-serif"
+# 绘图区边距（像素）: 左、右、上、下
+MARGINS = (72, 20, 52, 36)
+
+
+def nice_ticks(low, high, max_ticks=8):
+    """坐标轴刻度: 步长取 1/2/2.5/5 × 10^n，刻度数不超过 max_ticks"""
+    if not high > low:
+        return [low]
+    raw = (high - low) / max(1, max_ticks - 1)
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw)
+    first = math.ceil(low / step - 1e-9)
+    last = math.floor(high / step + 1e-9)
+    return [round(i * step, 10) for i in range(first, last + 1)]
+
+
+def year_ticks(first_key, last_key, max_ticks=10):
+    """横轴刻度: 每隔 1/2/5/10 年的1月（月份键）"""
+    first_year = -(-first_key // 12)
+    last_year = last_key // 12
+    step = next((s for s in (1, 2, 5, 10) if (last_year - first_year) // s + 1 <= max_ticks), 20)
+    return [year * 12 for year in range(first_year, last_year + 1) if year % step == 0]
+
+
+def _value_range(lines, baseline, ylim):
+    if ylim:
+        return float(ylim[0]), float(ylim[1])
+    values = [v for line in lines for v in line['values']]
+    if baseline is not None:
+        values.append(baseline)
+    if not values:
+        return 0.0, 1.0
+    low, high = min(values), max(values)
+    pad = (high - low) * 0.05 or 1.0
+    return low - pad, high + pad
+
+
+def _month_range(lines):
+    months = [m for line in lines for m in line['months']]
+    if not months:
+        return 0.0, 1.0
+    low, high = min(months), max(months)
+    pad = (high - low) * 0.05 or 1.0
+    return low - pad, high + pad
+
+
+def _points(months, values, x, y):
+    return ' '.join(f'{x(m):.1f},{y(v):.1f}' for m, v in zip(months, values))
+
+
+def line_chart_svg(lines, title, ylabel='', baseline=100, ylim=None, source=None, width=960, height=480):
+    """
+    折线图SVG
+
+    参数:
+        lines: [{'label', 'color', 'months': 月份键列表, 'values': 数值列表}, ...]
+        baseline: 基准线数值（None 不画）
+        ylim: (下限, 上限)，默认按数据自动确定
+    返回: SVG文本
+    """
+    left, right, top, bottom = MARGINS
+    plot_w = width - left - right
+    plot_h = height - top - bottom
+    x_low, x_high = _month_range(lines)
+    y_low, y_high = _value_range(lines, baseline, ylim)
+
+    def x(month):
+        return left + (month - x_low) / (x_high - x_low) * plot_w
+
+    def y(value):
+        return top + (y_high - value) / (y_high - y_low) * plot_h
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{escape(FONT_FAMILY)}">',
+        f'<rect width="{width}" height="{height}" fill="#fff"/>',
+        f'<text x="{width / 2:.1f}" y="{top / 2 + 6:.1f}" text-anchor="middle" font-size="18" '
+        f'font-weight="bold">{escape(title)}</text>',
+        f'<clipPath id="plot"><rect x="{left}" y="{top}" width="{plot_w}" height="{plot_h}"/></clipPath>',
+    ]
+
+    # 网格与刻度
+    grid = []
+    labels = []
+    for value in nice_ticks(y_low, y_high):
+        if y_low <= value <= y_high:
+            grid.append(f'M{left},{y(value):.1f}H{left + plot_w}')
+            labels.append(f'<text x="{left - 6}" y="{y(value) + 4:.1f}" text-anchor="end">{value:g}</text>')
+    if lines and any(line['months'] for line in lines):
+        for key in year_ticks(math.ceil(x_low), math.floor(x_high)):
+            grid.append(f'M{x(key):.1f},{top}V{top + plot_h}')
+            labels.append(f'<text x="{x(key):.1f}" y="{top + plot_h + 18}" text-anchor="middle">{key // 12}</text>')
+    parts.append(f'<path d="{"".join(grid)}" stroke="#000" stroke-opacity="0.1" fill="none"/>')
+    parts.append(f'<g font-size="12" fill="#333">{"".join(labels)}</g>')
+    parts.append(f'<rect x="{left}" y="{top}" width="{plot_w}" height="{plot_h}" fill="none" stroke="#333"/>')
+    if ylabel:
+        parts.append(f'<text transform="translate(18 {top + plot_h / 2:.1f}) rotate(-90)" text-anchor="middle" '
+                     f'font-size="13">{escape(ylabel)}</text>')
+
+    # 基准线与折线
+    parts.append('<g clip-path="url(#plot)" fill="none">')
+    if baseline is not None and y_low <= baseline <= y_high:
+        parts.append(f'<path d="M{left},{y(baseline):.1f}H{left + plot_w}" stroke="#808080" '
+                     f'stroke-opacity="0.5" stroke-dasharray="5 3"/>')
+    for line in lines:
+        if line['months']:
+            parts.append(f'<polyline points="{_points(line["months"], line["values"], x, y)}" '
+                         f'stroke="{line["color"]}" stroke-width="1.5" stroke-linejoin="round"/>')
+    parts.append('</g>')
+
+    # 图例（右上角）
+    if lines:
+        legend_w = max(len(line['label']) for line in lines) * 14 + 44
+        legend_x = left + plot_w - legend_w - 8
+        legend_y = top + 8
+        parts.append(f'<rect x="{legend_x}" y="{legend_y}" width="{legend_w}" height="{len(lines) * 20 + 8}" '
+                     f'fill="#fff" fill-opacity="0.9" stroke="#ccc" rx="3"/>')
+        for i, line in enumerate(lines):
+            row_y = legend_y + 16 + i * 20
+            parts.append(f'<path d="M{legend_x + 8},{row_y - 4}h24" stroke="{line["color"]}" stroke-width="2"/>'
+                         f'<text x="{legend_x + 38}" y="{row_y}" font-size="13">{escape(line["label"])}</text>')
+
+    # 数据来源
+    if source:
+        parts.append(f'<text x="{left + plot_w * 0.02:.1f}" y="{top + plot_h * 0.98:.1f}" font-size="11" '
+                     f'fill="#808080" fill-opacity="0.7">{escape(source)}</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts) + '\n'
+
+
+def sparkline_svg(months, values, color, width=160, height=32, baseline=None):
+    """迷你走势图SVG（无坐标轴），基准线在取值范围内时以虚线标出"""
+    if not months:
+        return f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}"></svg>'
+    x_low, x_high = min(months), max(months)
+    y_low, y_high = min(values), max(values)
+    x_span = (x_high - x_low) or 1
+    y_span = (y_high - y_low) or 1
+
+    def x(month):
+        return 1 + (month - x_low) / x_span * (width - 2)
+
+    def y(value):
+        return 1 + (y_high - value) / y_span * (height - 2)
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">']
+    if baseline is not None and y_low <= baseline <= y_high:
+        parts.append(f'<path d="M0,{y(baseline):.1f}H{width}" stroke="#999" stroke-dasharray="3 2" fill="none"/>')
+    parts.append(f'<polyline points="{_points(months, values, x, y)}" stroke="{color}" stroke-width="1.2" '
+                 f'fill="none"/>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def chart_html(lines, title, chart_svg, baseline=100):
+    """
+    自包含HTML页面: 完整图表 + 每个城市一行（最新月份、最新值、区间最低/最高、迷你走势图）
+    不引用任何外部脚本、样式或字体
+    """
+    rows = []
+    for line in lines:
+        if line['months']:
+            last_month = line['months'][-1]
+            cells = (f'{last_month // 12}年{last_month % 12 + 1}月', f'{line["values"][-1]:.1f}',
+                     f'{min(line["values"]):.1f}', f'{max(line["values"]):.1f}')
+        else:
+            cells = ('-', '-', '-', '-')
+        spark = sparkline_svg(line['months'], line['values'], line['color'], baseline=baseline)
+        rows.append(f'<tr><th style="color:{line["color"]}">{escape(line["label"])}</th>'
+                    + ''.join(f'<td>{cell}</td>' for cell in cells) + f'<td>{spark}</td></tr>')
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>{escape(title)}</title>
+<style>
+body {{ font-family: {FONT_FAMILY}; margin: 24px; color: #333; }}
+svg {{ max-width: 100%; height: auto; }}
+table {{ border-collapse: collapse; margin-top: 16px; }}
+th, td {{ padding: 4px 12px; border-bottom: 1px solid #eee; text-align: right; white-space: nowrap; }}
+th {{ text-align: left; }}
+td:last-child svg {{ vertical-align: middle; }}
+</style>
+</head>
+<body>
+{chart_svg}<table>
+<tr><th>城市</th><td>最新月份</td><td>最新值</td><td>最低</td><td>最高</td><td>走势</td></tr>
+{chr(10).join(rows)}
+</table>
+</body>
+</html>
+"""
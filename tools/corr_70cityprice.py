@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+70城房价跨城市相关与领先-滞后矩阵
+对 城市 × 月份 矩阵一次性批量计算全部城市对（70城为2415对）在各个滞后月数下的相关系数
+
+计算方法:
+    corr[指数列, 滞后l, i, j] = corr(城市i第t月, 城市j第t+l月)，即城市i领先城市j l个月时的相关系数；
+    负滞后无需另算: corr(城市i第t月, 城市j第t-l月) = corr[指数列, l, j, i]。
+    缺失月份按配对删除（每对城市只用两者都有数据的月份），有效月份少于 min_periods 时为空值。
+    全部指数列、滞后和城市对通过一次批量矩阵乘法 (指数列, 滞后, 城市, 月份) @ (…, 月份, 城市) 完成。
+
+缓存格式:
+    <CSV所在目录>/.cache/<CSV文件名>.corr-<内容哈希前16位>-<窗口键>.npz
+        窗口键由 指数列、指数类型、起止月份、最大滞后、最少有效月份 决定，同一窗口重复查询直接读取；
+        CSV内容变化后旧缓存自动清理
+        corr     float32，形状 (指数列, 滞后, 城市, 城市)
+        counts   int32，每对城市参与计算的月份数，形状同上
+        metrics / lags / cities / months（窗口内的月份键）
+
+作为库调用:
+    from corr_70cityprice import load_correlations, lead_lag
+    result = load_correlations(start_key=..., end_key=..., max_lag=6)
+    lags, best = lead_lag(result['corr'][0])    # 每对城市相关最强的滞后月数及其相关系数
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from storage_70cityprice import cache_enabled, get_cache_dir, get_sidecar_path, source_sha
+
+CORR_SUFFIX = '.corr'
+CORR_FORMAT_VERSION = 1
+CORR_METRICS = ['CommodityHouseIDX', 'SecondHandIDX']
+CORR_FIXED_BASE = '环比'
+CORR_MAX_LAG = 6
+CORR_MIN_PERIODS = 12
+
+
+def get_default_csv_path():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), '70cityprice.csv')
+
+
+def lagged_correlations(values, max_lag=CORR_MAX_LAG, min_periods=CORR_MIN_PERIODS):
+    """
+    批量计算滞后相关矩阵
+
+    参数:
+        values: (..., 城市, 月份) 数组，缺失为NaN
+    返回: (corr, counts)，形状 (..., max_lag+1, 城市, 城市)；
+          corr[..., l, i, j] 为城市i第t月与城市j第t+l月的相关系数
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if max_lag < 0:
+        raise ValueError("最大滞后月数不能为负数")
+    valid = ~np.isnan(values)
+    n_valid = valid.sum(axis=-1, keepdims=True)
+    # 先减去各序列均值，避免 Σx² - (Σx)²/n 的精度损失；相关系数不受平移影响
+    means = np.divide(np.where(valid, values, 0.0).sum(axis=-1, keepdims=True), n_valid,
+                      out=np.zeros(n_valid.shape), where=n_valid > 0)
+    x = np.where(valid, values - means, 0.0)
+    m = valid.astype(np.float64)
+
+    # 右侧序列按滞后平移: shifted[..., l, 城市, t] = 原序列[..., 城市, t+l]（越界补0，即视为缺失）
+    n_months = values.shape[-1]
+    lags = min(max_lag, n_months)
+    shape = values.shape[:-2] + (max_lag + 1,) + values.shape[-2:]
+    y = np.zeros(shape)
+    my = np.zeros(shape)
+    for lag in range(lags + 1):
+        y[..., lag, :, :n_months - lag] = x[..., lag:]
+        my[..., lag, :, :n_months - lag] = m[..., lag:]
+
+    left_x = x[..., None, :, :]
+    left_m = m[..., None, :, :]
+    y_t = np.swapaxes(y, -1, -2)
+    my_t = np.swapaxes(my, -1, -2)
+    n = left_m @ my_t
+    sum_x = left_x @ my_t
+    sum_y = left_m @ y_t
+    sum_xx = (left_x * left_x) @ my_t
+    sum_yy = left_m @ (y_t * y_t)
+    sum_xy = left_x @ y_t
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x * sum_x / n
+        var_y = sum_yy - sum_y * sum_y / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < min_periods) | ~(var_x > 0) | ~(var_y > 0)] = np.nan
+    np.clip(corr, -1.0, 1.0, out=corr)
+    return corr, n.astype(np.int32)
+
+
+def lead_lag(corr):
+    """
+    每对城市相关最强的滞后月数
+
+    参数:
+        corr: (滞后, 城市, 城市)，lagged_correlations 的单个指数列
+    返回: (lags, best)；lags[i, j] > 0 表示城市i领先城市j，< 0 表示城市i滞后；
+          全部滞后都无有效值的城市对 lags 为0、best 为NaN
+    """
+    corr = np.asarray(corr)
+    max_lag = corr.shape[0] - 1
+    full = np.concatenate([np.swapaxes(corr[:0:-1], -1, -2), corr], axis=0)
+    filled = np.where(np.isnan(full), -np.inf, full)
+    position = filled.argmax(axis=0)
+    best = np.take_along_axis(full, position[None], axis=0)[0]
+    lags = np.where(np.isnan(best), 0, position - max_lag)
+    return lags, best
+
+
+def window_key(metrics, fixedbase, start_key, end_key, max_lag, min_periods):
+    """缓存的窗口键（参数的短哈希）"""
+    payload = json.dumps([list(metrics), fixedbase, start_key, end_key, max_lag, min_periods],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def get_corr_path(csv_path, sha, key):
+    return get_sidecar_path(csv_path, f'{CORR_SUFFIX}-{sha[:16]}-{key}.npz')
+
+
+def save_correlations(path, result):
+    """写入 .npz（先写临时文件再原子替换）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(
+        tmp_path,
+        version=np.int64(CORR_FORMAT_VERSION),
+        metrics=np.asarray(result['metrics'], dtype=str),
+        fixedbase=np.asarray(result['fixedbase'], dtype=str),
+        cities=np.asarray(result['cities'], dtype=str),
+        months=np.asarray(result['months'], dtype=np.int64),
+        lags=np.asarray(result['lags'], dtype=np.int64),
+        corr=np.asarray(result['corr'], dtype=np.float32),
+        counts=np.asarray(result['counts'], dtype=np.int32),
+    )
+    os.replace(tmp_path, path)
+
+
+def read_correlations(path):
+    """读取 .npz，文件缺失、损坏或版本不符时返回None"""
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            if int(npz['version']) != CORR_FORMAT_VERSION:
+                return None
+            return {
+                'metrics': npz['metrics'].tolist(),
+                'fixedbase': str(npz['fixedbase']),
+                'cities': npz['cities'].tolist(),
+                'months': npz['months'],
+                'lags': npz['lags'],
+                'corr': npz['corr'],
+                'counts': npz['counts'],
+            }
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _remove_stale_correlations(csv_path, sha):
+    """清理CSV内容变化前的相关矩阵缓存"""
+    cache_dir = get_cache_dir(csv_path)
+    prefix = os.path.basename(csv_path) + CORR_SUFFIX + '-'
+    current = f'{prefix}{sha[:16]}-'
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and not name.startswith(current) and name.endswith('.npz'):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def compute_correlations(csv_path, metrics=CORR_METRICS, fixedbase=CORR_FIXED_BASE, start_key=None,
+                         end_key=None, max_lag=CORR_MAX_LAG, min_periods=CORR_MIN_PERIODS):
+    """从三维数组取出窗口内的 (指数列, 城市, 月份) 矩阵并计算相关矩阵"""
+    from cube_70cityprice import load_cube, series_position
+
+    cube, labels = load_cube(csv_path)
+    series = [series_position(labels, metric, fixedbase) for metric in metrics]
+    months = np.asarray(labels['months'], dtype=np.int64)
+    in_window = np.ones(len(months), dtype=bool)
+    if start_key is not None:
+        in_window &= months >= start_key
+    if end_key is not None:
+        in_window &= months <= end_key
+    positions = np.flatnonzero(in_window)
+    if len(positions) == 0:
+        raise ValueError("所选区间内没有数据")
+    window = slice(positions[0], positions[-1] + 1)
+    # (城市, 月份, 指数列) -> (指数列, 城市, 月份)
+    values = np.moveaxis(np.asarray(cube[:, window][:, :, series], dtype=np.float64), -1, 0)
+    corr, counts = lagged_correlations(values, max_lag, min_periods)
+    return {
+        'metrics': list(metrics),
+        'fixedbase': fixedbase,
+        'cities': list(labels['cities']),
+        'months': months[window],
+        'lags': np.arange(max_lag + 1),
+        'corr': corr.astype(np.float32),
+        'counts': counts,
+    }
+
+
+def load_correlations(csv_path=None, metrics=CORR_METRICS, fixedbase=CORR_FIXED_BASE, start_key=None,
+                      end_key=None, max_lag=CORR_MAX_LAG, min_periods=CORR_MIN_PERIODS, rebuild=False):
+    """
+    加载相关矩阵: 同一CSV内容、同一窗口已计算过时直接读取缓存，否则计算并写入缓存
+    返回: dict{'metrics', 'fixedbase', 'cities', 'months', 'lags', 'corr', 'counts', 'cached'}
+    """
+    csv_path = csv_path or get_default_csv_path()
+    metrics = list(metrics)
+    key = window_key(metrics, fixedbase, start_key, end_key, max_lag, min_periods)
+    sha = source_sha(csv_path) if cache_enabled() else None
+    if sha is not None and not rebuild:
+        cached = read_correlations(get_corr_path(csv_path, sha, key))
+        if cached is not None:
+            cached['cached'] = True
+            return cached
+
+    result = compute_correlations(csv_path, metrics, fixedbase, start_key, end_key, max_lag, min_periods)
+    result['cached'] = False
+    if not cache_enabled():
+        return result
+    # 计算过程中可能刚建立列式缓存，重新取内容哈希
+    sha = source_sha(csv_path)
+    if sha is None:
+        return result
+    try:
+        save_correlations(get_corr_path(csv_path, sha, key), result)
+        _remove_stale_correlations(csv_path, sha)
+    except OSError as e:
+        print(f"警告: 无法写入相关矩阵缓存 ({e})")
+    return result
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+70城房价三维数组（城市 × 月份 × 指数序列）
+将长表（每行一个 DATE/CITY/FixedBase）一次性展开为稠密的 float32 数组，
+并保存为可内存映射的 .npy，分析时按城市或按月份切片都是零拷贝视图，无需每次 pivot
+
+数组轴:
+    0 城市    70城，按 CITY_ADCODE 的顺序
+    1 月份    数据中最早到最晚的连续月份（缺失的月份为NaN）
+    2 序列    12个指数列 × 3种指数类型（同比/环比/定基比），第 i 列指数的第 j 种类型位于 i*3 + j
+
+文件格式:
+    <前缀>.npy   float32 数组（C顺序: 单个城市的全部历史连续存放）
+    <前缀>.json  标签: cities / adcodes / months（月份键）/ dates / metrics / fixedbases / series，
+                 以及 shape 与生成时CSV的内容哈希 sha256
+    默认保存在 <CSV所在目录>/.cache/<CSV文件名>.cube.npy / .cube.json，CSV内容变化后自动重建
+
+使用方法:
+    python tools/cube_70cityprice.py                       # 生成/刷新缓存并显示概况
+    python tools/cube_70cityprice.py --output projects/cube  # 导出 projects/cube.npy 与 cube.json
+
+作为库调用:
+    from cube_70cityprice import load_cube, city_history, month_section, series_position
+    cube, labels = load_cube()                         # np.memmap，只读
+    beijing = city_history(cube, labels, '北京')        # (月份, 序列) 视图
+    j = series_position(labels, 'CommodityHouseIDX', '同比')
+    section = month_section(cube, labels, '202501')[:, j]   # 2025年1月 70城同比
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from storage_70cityprice import (
+    MONTH_KEY_COLUMN, NUMERIC_COLUMNS, cache_enabled, get_cache_dir, get_sidecar_path, load_typed_dataset,
+    parse_month_key, source_sha
+)
+
+CUBE_SUFFIX = '.cube'
+CUBE_FORMAT_VERSION = 1
+CUBE_DTYPE = np.float32
+CUBE_COLUMNS = ['DATE', 'CITY', 'FixedBase'] + NUMERIC_COLUMNS
+
+
+def get_default_csv_path():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), '70cityprice.csv')
+
+
+def series_labels():
+    """序列轴标签: 'CommodityHouseIDX|同比' 形式，按 指数列 × 指数类型 排列"""
+    from update_70cityprice import RECORD_FIXED_BASES
+    return [f'{metric}|{fixedbase}' for metric in NUMERIC_COLUMNS for fixedbase in RECORD_FIXED_BASES]
+
+
+def build_cube(df):
+    """
+    由类型化数据集构造三维数组
+
+    参数:
+        df: load_typed_dataset 的输出（需含 DATE、CITY、FixedBase、指数列与月份键列 MONTH_KEY）
+    返回: (cube, labels)；不在70城之列的城市、无法解析的日期和非法指数类型的行不计入，
+          同一格有多条记录时取最后一条
+    """
+    # 城市与指数类型的定义在更新脚本中（依赖pandas），只在构造数组时导入，读取缓存无需加载
+    from update_70cityprice import CITY_ADCODE, RECORD_FIXED_BASES, standardize_city_column
+    cube_cities = list(CITY_ADCODE)
+    city_lookup = {city: pos for pos, city in enumerate(cube_cities)}
+    fb_lookup = {fixedbase: pos for pos, fixedbase in enumerate(RECORD_FIXED_BASES)}
+    # 类别列只对不同取值查表一次，再按编码展开（编码 -1 为空值，对应末尾的 -1）
+    city_index = np.array(
+        [city_lookup.get(standardize_city_column(v), -1) for v in df['CITY'].cat.categories] + [-1],
+        dtype=np.int64,
+    )
+    fb_index = np.array(
+        [fb_lookup.get(str(v).strip(), -1) for v in df['FixedBase'].cat.categories] + [-1],
+        dtype=np.int64,
+    )
+
+    row_month = df[MONTH_KEY_COLUMN].to_numpy(dtype=np.int64)
+    row_city = city_index[df['CITY'].cat.codes.to_numpy()]
+    row_fb = fb_index[df['FixedBase'].cat.codes.to_numpy()]
+    rows = np.flatnonzero((row_month >= 0) & (row_city >= 0) & (row_fb >= 0))
+    skipped = len(row_month) - len(rows)
+    if skipped:
+        print(f"提示: {skipped} 行不在70城/有效日期/指数类型范围内，未计入三维数组")
+
+    if len(rows):
+        months = np.arange(row_month[rows].min(), row_month[rows].max() + 1)
+    else:
+        months = np.empty(0, dtype=np.int64)
+    n_fb = len(RECORD_FIXED_BASES)
+    cube = np.full((len(cube_cities), len(months), len(NUMERIC_COLUMNS) * n_fb), np.nan, dtype=CUBE_DTYPE)
+    city_pos = row_city[rows]
+    month_pos = row_month[rows] - (months[0] if len(months) else 0)
+    fb_pos = row_fb[rows]
+    # 指数列在类型化读取时已转换为 float32（每个不同字符串只转换一次）
+    for i, column in enumerate(NUMERIC_COLUMNS):
+        cube[city_pos, month_pos, i * n_fb + fb_pos] = df[column].to_numpy()[rows]
+
+    labels = {
+        'version': CUBE_FORMAT_VERSION,
+        'shape': list(cube.shape),
+        'cities': cube_cities,
+        'adcodes': [CITY_ADCODE[city] for city in cube_cities],
+        'months': [int(k) for k in months],
+        'dates': [f'{k // 12}/{k % 12 + 1}/1' for k in months.tolist()],
+        'metrics': list(NUMERIC_COLUMNS),
+        'fixedbases': list(RECORD_FIXED_BASES),
+        'series': series_labels(),
+    }
+    return cube, labels
+
+
+def save_cube(prefix, cube, labels):
+    """写入 <前缀>.npy 与 <前缀>.json（先写临时文件再原子替换，标签文件最后写入）"""
+    directory = os.path.dirname(os.path.abspath(prefix))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{prefix}.{os.getpid()}.tmp.npy'
+    np.save(tmp_path, np.ascontiguousarray(cube, dtype=CUBE_DTYPE))
+    os.replace(tmp_path, f'{prefix}.npy')
+    tmp_path = f'{prefix}.json.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(labels, f, ensure_ascii=False)
+    os.replace(tmp_path, f'{prefix}.json')
+
+
+def read_cube(prefix, mmap=True):
+    """
+    读取 <前缀>.npy 与 <前缀>.json
+    mmap=True 时返回只读 np.memmap，切片不会把整个数组读入内存
+    文件缺失、损坏或形状与标签不符时返回None
+    """
+    try:
+        with open(f'{prefix}.json', 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+        cube = np.load(f'{prefix}.npy', mmap_mode='r' if mmap else None, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if labels.get('version') != CUBE_FORMAT_VERSION or list(cube.shape) != labels.get('shape'):
+        return None
+    return cube, labels
+
+
+def get_cube_prefix(csv_path):
+    return get_sidecar_path(csv_path, CUBE_SUFFIX)
+
+
+def load_cube(csv_path=None, mmap=True, rebuild=False):
+    """
+    加载三维数组: 缓存与CSV内容一致时直接映射缓存文件，否则重建
+    返回: (cube, labels)；禁用缓存时返回内存中的数组
+    """
+    csv_path = csv_path or get_default_csv_path()
+    prefix = get_cube_prefix(csv_path)
+    if cache_enabled() and not rebuild:
+        sha = source_sha(csv_path)
+        cached = read_cube(prefix, mmap) if sha is not None else None
+        if cached is not None and cached[1].get('sha256') == sha:
+            return cached
+
+    cube, labels = build_cube(load_typed_dataset(csv_path, columns=CUBE_COLUMNS))
+    if not cache_enabled():
+        return cube, labels
+    labels['sha256'] = source_sha(csv_path)
+    try:
+        os.makedirs(get_cache_dir(csv_path), exist_ok=True)
+        save_cube(prefix, cube, labels)
+    except OSError as e:
+        print(f"警告: 无法写入三维数组缓存 ({e})")
+        return cube, labels
+    return read_cube(prefix, mmap) or (cube, labels)
+
+
+def series_position(labels, metric, fixedbase):
+    """(指数列, 指数类型) -> 序列轴位置"""
+    if metric not in labels['metrics']:
+        raise ValueError(f"未知的指数列: {metric}")
+    if fixedbase not in labels['fixedbases']:
+        raise ValueError(f"无效的指数类型: {fixedbase}")
+    return labels['metrics'].index(metric) * len(labels['fixedbases']) + labels['fixedbases'].index(fixedbase)
+
+
+def city_history(cube, labels, city):
+    """单个城市的全部历史: (月份, 序列) 视图"""
+    from update_70cityprice import standardize_city_column
+    name = standardize_city_column(city)
+    if name not in labels['cities']:
+        raise ValueError(f"未找到城市: {city}")
+    return cube[labels['cities'].index(name)]
+
+
+def month_section(cube, labels, month):
+    """单个月份的70城截面: (城市, 序列) 视图；month 为 'YYYYMM' / 'YYYY/M/D' / 月份键"""
+    if isinstance(month, (int, np.integer)):
+        key = int(month)
+    else:
+        text = str(month)
+        key = parse_month_key(text) if '/' in text else parse_month_key(f'{text[:4]}/{text[4:6]}')
+    months = labels['months']
+    if not months or not months[0] <= key <= months[-1]:
+        raise ValueError(f"月份不在数据范围内: {month}")
+    return cube[:, key - months[0]]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='70城房价三维数组（城市 × 月份 × 指数序列）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  %(prog)s                          # 生成/刷新缓存并显示概况
+  %(prog)s --output projects/cube   # 导出 projects/cube.npy 与 projects/cube.json
+        """
+    )
+    parser.add_argument('--output', '-o', help='导出文件前缀（生成 <前缀>.npy 与 <前缀>.json）')
+    parser.add_argument('--csv', default=get_default_csv_path(), help='CSV文件路径')
+    parser.add_argument('--rebuild', action='store_true', help='忽略缓存，重新生成')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        print(f"错误: CSV文件不存在: {args.csv}")
+        sys.exit(1)
+
+    cube, labels = load_cube(args.csv, rebuild=args.rebuild)
+    if args.output:
+        prefix = args.output[:-4] if args.output.endswith('.npy') else args.output
+        save_cube(prefix, cube, {k: v for k, v in labels.items() if k != 'sha256'})
+        print(f"已导出: {prefix}.npy / {prefix}.json")
+
+    dates = labels['dates']
+    filled = int(np.count_nonzero(~np.isnan(cube)))
+    print(f"形状: {tuple(cube.shape)}（城市 × 月份 × 序列），{cube.dtype}，{cube.nbytes / 1024 / 1024:.1f}MB")
+    if dates:
+        print(f"月份范围: {dates[0]} ~ {dates[-1]}")
+    print(f"非空单元: {filled} / {cube.size}")
+
+
+if __name__ == '__main__':
+    main()
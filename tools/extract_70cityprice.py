@@ -18,6 +18,19 @@
     
     # 列出数据日期范围
     python extract_70cityprice.py list-dates
+    
+    # 统计汇总（滚动均值/波动率、城市分组均值、跨城市分位数）
+    python extract_70cityprice.py agg <rolling|volatility|tier|percentile> [--metric 指数列] [--fixedbase 同比] [--window 12]
+
+    # 跨城市相关与领先-滞后矩阵（同一窗口重复查询读取缓存）
+    python extract_70cityprice.py corr [--metrics CommodityHouseIDX SecondHandIDX] [--fixedbase 环比] [--max-lag 6]
+
+    # 常驻查询服务（数据只加载一次，CSV变化时自动重新加载）
+    python extract_70cityprice.py serve [--host 127.0.0.1] [--port 8770] [--socket 路径] [--csv 文件]
+
+作为库调用（不打印、不写文件，同一进程内重复调用复用已加载的数据）:
+    from extract_70cityprice import query
+    df = query(cities=['成都', '重庆'], start='202401', end='202412', fixedbase='同比')
 
 示例:
     python extract_70cityprice.py month 202507 202511
@@ -28,18 +41,50 @@
     python extract_70cityprice.py filter --cities 成都 重庆 --start 202401 --end 202412 --fixedbase 同比,环比
     python extract_70cityprice.py list-cities
     python extract_70cityprice.py list-dates
+    python extract_70cityprice.py agg rolling --cities 北京 上海 --window 12
+    python extract_70cityprice.py agg tier --fixedbase 环比 --start 202301 --end 202512
+    python extract_70cityprice.py agg percentile --percentiles 10,50,90
+    python extract_70cityprice.py corr --start 201501 --end 202512 --max-lag 6 --top 10
+    python extract_70cityprice.py serve --port 8770
+    curl "http://127.0.0.1:8770/filter?cities=成都,重庆&start=202401&end=202412&fixedbase=同比&format=json"
 
 日期格式: YYYYMM (例如: 202507 表示2025年7月)
 指数类型: 同比 / 环比 / 定基比（支持逗号分隔多个）
 """
 
-import pandas as pd
+import numpy as np
 import os
 import sys
 import argparse
+import json
+import threading
 from datetime import datetime
 
+from storage_70cityprice import (
+    MONTH_KEY_COLUMN, cache_enabled, decode_rows, encoded_index, file_stat_key, load_dataset,
+    load_encoded, parse_month_key, read_summary, select_groups, select_month_range
+)
+
+# pandas、http.server 等较重的模块在实际需要时才导入，
+# 使 list-dates / list-cities 命中缓存元数据时无需导入pandas
+
 ALLOWED_FIXED_BASES = {'同比', '环比', '定基比'}
+SERVE_DEFAULT_HOST = '127.0.0.1'
+SERVE_DEFAULT_PORT = 8770
+SERVE_QUERY_KINDS = ('month', 'city', 'filter')
+SERVE_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+# agg 子命令: 统计类型、默认指数列、滚动窗口（月）与分位数
+AGG_STATS = ('rolling', 'volatility', 'tier', 'percentile')
+AGG_DEFAULT_METRIC = 'CommodityHouseIDX'
+AGG_DEFAULT_WINDOW = 12
+AGG_DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+# corr 子命令: 默认列出相关最强的领先-滞后城市对数量
+CORR_DEFAULT_TOP = 10
+# 加载时附加的整数月份键列 MONTH_KEY: 年*12 + (月-1)，无法解析的日期为 -1
+INTERNAL_COLUMNS = [MONTH_KEY_COLUMN]
 CITY_NAME_ALIASES = {
     '大理白族自治州': '大理',
     '大理自治州': '大理',
@@ -85,6 +130,37 @@ def date_to_comparable(date_str):
         return None
 
 
+def month_key(year, month):
+    """(year, month) -> 整数月份键"""
+    return year * 12 + (month - 1)
+
+
+def month_key_to_tuple(key):
+    """整数月份键 -> (year, month)"""
+    year, month_index = divmod(int(key), 12)
+    return (year, month_index + 1)
+
+
+def compute_month_keys(dates):
+    """
+    计算DATE列的整数月份键（每个不同的日期字符串只解析一次）
+    返回: int32数组，无法解析的日期为 -1
+    """
+    import pandas as pd
+    codes, uniques = pd.factorize(dates)
+    unique_keys = np.full(len(uniques) + 1, -1, dtype=np.int32)
+    for idx, date_str in enumerate(uniques):
+        unique_keys[idx] = parse_month_key(date_str)
+    return unique_keys[codes]
+
+
+def get_month_keys(df):
+    """取月份键（优先使用加载时预先计算的列）"""
+    if MONTH_KEY_COLUMN in df.columns:
+        return df[MONTH_KEY_COLUMN].to_numpy()
+    return compute_month_keys(df['DATE'])
+
+
 def get_repo_root():
     """获取仓库根目录（脚本所在目录的上级）"""
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -107,8 +183,14 @@ def get_output_path(filename):
     return os.path.join(projects_dir, filename)
 
 
-def load_data(csv_path=None):
-    """加载CSV数据"""
+def load_data(csv_path=None, with_index=False, mapped=False):
+    """
+    加载CSV数据
+    with_index=True 时返回 (df, index)，index 为主键索引（见 storage_70cityprice），
+    供 extract_by_* 以索引切片代替全表扫描
+    mapped=True（需同时 with_index=True）时使用内存映射读取，返回的 df 为 None，
+    各列以只读映射保存在 index['arrays'] 中，按索引取子集时才还原对应的行（见 load_indexed_dataset）
+    """
     if csv_path is None:
         csv_path = get_csv_path()
     
@@ -117,41 +199,130 @@ def load_data(csv_path=None):
         sys.exit(1)
     
     print(f"正在读取数据文件: {csv_path}")
-    df = pd.read_csv(csv_path, dtype=str)
-    print(f"总记录数: {len(df)}")
+    df, index = load_indexed_dataset(csv_path, mapped=mapped and with_index)
+    print(f"总记录数: {dataset_rows(df, index)}")
+    return (df, index) if with_index else df
+
+
+def load_indexed_dataset(csv_path, mapped=False):
+    """
+    加载数据并附加月份键列，返回 (df, index)，不打印信息
+
+    mapped=True 且缓存可用时不还原DataFrame: 返回 (None, index)，
+    index['arrays'] 为各列字典编码的只读 np.memmap（多个进程共享页缓存，加载为常数时间），
+    take_positions 只还原选中的行，materialize 还原全部行
+    """
+    if mapped and cache_enabled():
+        arrays = load_encoded(csv_path, with_index=True)
+        index = encoded_index(arrays)
+        if index is not None:
+            index['arrays'] = arrays
+            return None, index
+
+    df, index = load_dataset(csv_path, with_index=True)
+    if index is not None:
+        df[MONTH_KEY_COLUMN] = index['row_month']
+    else:
+        df[MONTH_KEY_COLUMN] = compute_month_keys(df['DATE'])
+    return df, index
+
+
+def dataset_rows(df, index):
+    """全量数据行数（df 为 None 时取自内存映射索引）"""
+    return index['rows'] if df is None else len(df)
+
+
+def dataset_month_keys(df, index):
+    """全量数据每行的月份键"""
+    return index['row_month'] if df is None else get_month_keys(df)
+
+
+def dataset_cities(df, index):
+    """全量数据中出现的城市名（排序）"""
+    if df is None:
+        present = np.diff(index['city_offsets'])[1:] > 0
+        return sorted(index['city_values'][present].tolist())
+    return sorted(df['CITY'].dropna().unique().tolist())
+
+
+def take_positions(df, index, positions):
+    """
+    按全量数据的行号取子集
+    df 须为 load_data 返回的数据（内存映射读取时为 None），或其保留原始行标签的子集
+    """
+    if df is None:
+        positions = np.asarray(positions, dtype=np.int64)
+        result = decode_rows(index['arrays'], positions)
+        result.index = positions
+        result[MONTH_KEY_COLUMN] = index['row_month'][positions]
+        return result
+    if len(df) == index['rows']:
+        return df.iloc[positions].copy()
+    return df[np.isin(df.index.to_numpy(), positions)].copy()
+
+
+def materialize(df, index):
+    """内存映射读取时还原全部行（df 不为 None 时原样返回）"""
+    if df is None:
+        return take_positions(None, index, np.arange(index['rows']))
     return df
 
 
 def save_data(df, output_path):
-    """保存数据到CSV"""
+    """保存数据到CSV（不含加载时附加的内部列）"""
+    df = df.drop(columns=[c for c in INTERNAL_COLUMNS if c in df.columns])
     df.to_csv(output_path, index=False, quoting=1)
     print(f"\n✅ 数据已保存到: {output_path}")
 
 
-def extract_by_month(df, start_year, start_month, end_year, end_month):
+def extract_by_month(df, start_year, start_month, end_year, end_month, index=None):
     """
     按月份范围提取数据
     """
-    start_tuple = (start_year, start_month)
-    end_tuple = (end_year, end_month)
-    
     print(f"提取范围: {start_year}年{start_month}月 至 {end_year}年{end_month}月")
+    return select_by_month(df, start_year, start_month, end_year, end_month, index)
+
+
+def select_by_month(df, start_year, start_month, end_year, end_month, index=None):
+    """
+    按月份范围筛选（不打印信息）
+    传入主键索引时按索引二分查找，不扫描全表
+    """
+    start_key = month_key(start_year, start_month)
+    end_key = month_key(end_year, end_month)
+    
+    if index is not None:
+        return take_positions(df, index, select_month_range(index, start_key, end_key))
     
-    def in_range(date_str):
-        date_tuple = date_to_comparable(date_str)
-        if date_tuple is None:
-            return False
-        return start_tuple <= date_tuple <= end_tuple
+    keys = get_month_keys(df)
+    if len(keys) > 0 and keys[0] >= 0 and np.all(keys[1:] >= keys[:-1]):
+        # 已按月份排序: 二分查找定位区间
+        lo = np.searchsorted(keys, start_key, side='left')
+        hi = np.searchsorted(keys, end_key, side='right')
+        return df.iloc[lo:hi].copy()
     
-    mask = df['DATE'].apply(in_range)
+    mask = (keys >= start_key) & (keys <= end_key)
     return df[mask].copy()
 
 
-def extract_by_city(df, cities):
+def extract_by_city(df, cities, index=None):
     """
     按城市提取数据
     """
     print(f"提取城市: {', '.join(cities)}")
+    extracted_df, used_fuzzy_fallback = select_by_city(df, cities, index)
+    if used_fuzzy_fallback:
+        print("提示: 已启用宽松匹配（忽略“市/自治州/地区/盟”等后缀）补充结果")
+    return extracted_df
+
+
+def select_by_city(df, cities, index=None):
+    """
+    按城市筛选（不打印信息）
+    城市名归一化只对去重后的城市名计算；传入主键索引时直接取对应城市的行号
+    返回: (DataFrame, 是否用到宽松匹配)
+    """
+    import pandas as pd
 
     def normalize_city_exact(name):
         """城市名精确归一化：仅清理空白和大小写"""
@@ -169,21 +340,32 @@ def extract_by_city(df, cities):
                 break
         return normalized
 
+    if index is not None:
+        # 字典值末位补一个空值，对应编码 -1
+        names = index['city_values'].tolist() + [np.nan]
+        offsets = index['city_offsets']
+        present = np.roll(np.diff(offsets) > 0, -1)
+    else:
+        codes, uniques = pd.factorize(df['CITY'], use_na_sentinel=False)
+        names = list(uniques)
+        present = np.ones(len(names), dtype=bool)
+
     # 先做精确匹配
     requested_exact = {normalize_city_exact(city) for city in cities}
-    city_exact = df['CITY'].apply(normalize_city_exact)
-    exact_mask = city_exact.isin(requested_exact)
+    exact_match = np.array([normalize_city_exact(name) in requested_exact for name in names], dtype=bool)
 
     # 再做宽松匹配（兼容“北京市”这类后缀写法）
     requested_fuzzy = {normalize_city_fuzzy(city) for city in cities}
-    city_fuzzy = df['CITY'].apply(normalize_city_fuzzy)
-    fuzzy_mask = city_fuzzy.isin(requested_fuzzy)
-    used_fuzzy_fallback = bool((~exact_mask & fuzzy_mask).any())
-    if used_fuzzy_fallback:
-        print("提示: 已启用宽松匹配（忽略“市/自治州/地区/盟”等后缀）补充结果")
+    fuzzy_match = np.array([normalize_city_fuzzy(name) in requested_fuzzy for name in names], dtype=bool)
+    used_fuzzy_fallback = bool((~exact_match & fuzzy_match & present).any())
 
-    combined_mask = exact_mask | fuzzy_mask
-    return df[combined_mask].copy()
+    combined_match = exact_match | fuzzy_match
+    if index is not None:
+        matched_codes = np.flatnonzero(combined_match)
+        matched_codes[matched_codes == len(names) - 1] = -1
+        positions = select_groups(index, 'city', matched_codes)
+        return take_positions(df, index, positions), used_fuzzy_fallback
+    return df[combined_match[codes]].copy(), used_fuzzy_fallback
 
 
 def parse_fixedbase_arg(fixedbase_arg):
@@ -207,13 +389,27 @@ def parse_fixedbase_arg(fixedbase_arg):
     return set(parts)
 
 
-def extract_by_fixedbase(df, fixedbases):
+def extract_by_fixedbase(df, fixedbases, index=None):
     """
     按指数类型提取数据
     """
     if not fixedbases:
         return df
     print(f"提取指数类型: {', '.join(sorted(fixedbases))}")
+    return select_by_fixedbase(df, fixedbases, index)
+
+
+def select_by_fixedbase(df, fixedbases, index=None):
+    """
+    按指数类型筛选（不打印信息）
+    传入主键索引时直接取对应指数类型的行号
+    """
+    if not fixedbases:
+        return df
+    if index is not None:
+        values = index['fixedbase_values'].tolist()
+        matched_codes = [code for code, value in enumerate(values) if value.strip() in fixedbases]
+        return take_positions(df, index, select_groups(index, 'fixedbase', matched_codes))
     mask = df['FixedBase'].astype(str).str.strip().isin(fixedbases)
     return df[mask].copy()
 
@@ -228,8 +424,8 @@ def print_extraction_stats(df, extracted_df):
         return
     
     # 统计提取的月份
-    months = extracted_df['DATE'].apply(date_to_comparable).dropna().unique()
-    months_sorted = sorted(months)
+    keys = np.unique(get_month_keys(extracted_df))
+    months_sorted = [month_key_to_tuple(k) for k in keys if k >= 0]
     print(f"提取的月份: {', '.join([f'{m[0]}/{m[1]}' for m in months_sorted])}")
     
     # 统计城市数量
@@ -256,9 +452,9 @@ def cmd_month(args):
         print(f"错误: {e}")
         sys.exit(1)
 
-    df = load_data()
-    extracted_df = extract_by_month(df, start_year, start_month, end_year, end_month)
-    extracted_df = extract_by_fixedbase(extracted_df, fixedbases)
+    df, index = load_data(with_index=True, mapped=True)
+    extracted_df = extract_by_month(df, start_year, start_month, end_year, end_month, index)
+    extracted_df = extract_by_fixedbase(extracted_df, fixedbases, index)
     print_extraction_stats(df, extracted_df)
     
     if len(extracted_df) > 0:
@@ -285,9 +481,9 @@ def cmd_city(args):
         print(f"错误: {e}")
         sys.exit(1)
 
-    df = load_data()
-    extracted_df = extract_by_city(df, args.cities)
-    extracted_df = extract_by_fixedbase(extracted_df, fixedbases)
+    df, index = load_data(with_index=True, mapped=True)
+    extracted_df = extract_by_city(df, args.cities, index)
+    extracted_df = extract_by_fixedbase(extracted_df, fixedbases, index)
     print_extraction_stats(df, extracted_df)
     
     if len(extracted_df) > 0:
@@ -303,7 +499,7 @@ def cmd_city(args):
         save_data(extracted_df, output_path)
     else:
         # 显示可用城市提示
-        all_cities = sorted(df['CITY'].unique())
+        all_cities = dataset_cities(df, index)
         print(f"\n可用城市列表 ({len(all_cities)}个):")
         # 分列显示
         cols = 5
@@ -316,8 +512,8 @@ def cmd_city(args):
 
 def cmd_filter(args):
     """组合过滤提取命令"""
-    df = load_data()
-    extracted_df = df.copy()
+    df, index = load_data(with_index=True, mapped=True)
+    extracted_df = df
 
     try:
         fixedbases = parse_fixedbase_arg(args.fixedbase)
@@ -327,7 +523,7 @@ def cmd_filter(args):
     
     # 按城市过滤
     if args.cities:
-        extracted_df = extract_by_city(extracted_df, args.cities)
+        extracted_df = extract_by_city(extracted_df, args.cities, index)
     
     # 按月份过滤
     if args.start and args.end:
@@ -342,10 +538,10 @@ def cmd_filter(args):
             print("错误: 起始月份不能晚于结束月份")
             sys.exit(1)
         
-        extracted_df = extract_by_month(extracted_df, start_year, start_month, end_year, end_month)
+        extracted_df = extract_by_month(extracted_df, start_year, start_month, end_year, end_month, index)
 
     # 按指数类型过滤
-    extracted_df = extract_by_fixedbase(extracted_df, fixedbases)
+    extracted_df = materialize(extract_by_fixedbase(extracted_df, fixedbases, index), index)
     
     print_extraction_stats(df, extracted_df)
     
@@ -361,10 +557,236 @@ def cmd_filter(args):
     return extracted_df
 
 
+def parse_percentiles_arg(text):
+    """'10,50,90' -> [10.0, 50.0, 90.0]"""
+    try:
+        values = [float(p) for p in str(text).split(',') if p.strip()]
+    except ValueError:
+        raise ValueError(f"无效的分位数: {text}，请使用逗号分隔的0-100数值（如10,50,90）")
+    if not values or any(not 0 <= v <= 100 for v in values):
+        raise ValueError(f"无效的分位数: {text}，请使用逗号分隔的0-100数值（如10,50,90）")
+    return values
+
+
+def aggregate_wide(wide, stat, window=AGG_DEFAULT_WINDOW, percentiles=AGG_DEFAULT_PERCENTILES, tiers=None):
+    """
+    对宽表（行: 月份，列: 城市）做统计汇总，所有城市一次性向量化计算
+
+    stat:
+        rolling     每个城市 window 个月的滚动均值（不足 window 个月为空）
+        volatility  每个城市 window 个月的滚动标准差
+        tier        每组城市的月度均值（tiers: {组名: 城市列表}），另附70城均值
+        percentile  每月跨城市的分位数（忽略空值），另附有数据的城市数
+    """
+    import pandas as pd
+    if stat == 'rolling':
+        return wide.rolling(window, min_periods=window).mean()
+    if stat == 'volatility':
+        return wide.rolling(window, min_periods=window).std()
+    if stat == 'tier':
+        columns = {name: wide[[c for c in cities if c in wide.columns]].mean(axis=1)
+                   for name, cities in (tiers or {}).items()}
+        columns['70城'] = wide.mean(axis=1)
+        return pd.DataFrame(columns, index=wide.index)
+    if stat == 'percentile':
+        quantiles = wide.quantile([p / 100 for p in percentiles], axis=1).T
+        quantiles.columns = [f'P{p:g}' for p in percentiles]
+        quantiles['城市数'] = wide.notna().sum(axis=1)
+        return quantiles
+    raise ValueError(f"无效的统计类型: {stat}，可选值为: {', '.join(AGG_STATS)}")
+
+
+def compute_aggregate(stat, metric=AGG_DEFAULT_METRIC, fixedbase='同比', window=AGG_DEFAULT_WINDOW,
+                      cities=None, percentiles=AGG_DEFAULT_PERCENTILES, start=None, end=None, csv_path=None):
+    """
+    统计汇总（不打印信息）: 从内存映射的 城市×月份×序列 数组取出 (指数列, 指数类型) 的宽表后计算
+
+    参数:
+        cities: 参与计算的城市（默认70城；tier 按固定分组，忽略此参数）
+        start, end: (year, month)，只截取输出区间，滚动窗口仍使用区间之前的数据
+    返回: DataFrame（行: DATE，YYYY/M/1 格式），全为空的月份已去除
+    """
+    import pandas as pd
+    from cube_70cityprice import load_cube, series_position
+    from update_70cityprice import CITY_TIERS, standardize_city_column
+
+    if stat not in AGG_STATS:
+        raise ValueError(f"无效的统计类型: {stat}，可选值为: {', '.join(AGG_STATS)}")
+    if fixedbase not in ALLOWED_FIXED_BASES:
+        raise ValueError(f"无效的指数类型: {fixedbase}，可选值为: {', '.join(sorted(ALLOWED_FIXED_BASES))}")
+    min_window = 2 if stat == 'volatility' else 1
+    if window < min_window:
+        raise ValueError(f"滚动窗口至少为 {min_window} 个月")
+    if (start is None) != (end is None):
+        raise ValueError("起始月份和结束月份需同时指定")
+
+    cube, labels = load_cube(csv_path or get_csv_path())
+    series = series_position(labels, metric, fixedbase)
+    all_cities = labels['cities']
+    if cities and stat != 'tier':
+        names = [standardize_city_column(c) for c in cities]
+        unknown = [c for c, name in zip(cities, names) if name not in all_cities]
+        if unknown:
+            raise ValueError(f"未找到城市: {', '.join(unknown)}")
+        positions = [all_cities.index(name) for name in dict.fromkeys(names)]
+    else:
+        positions = list(range(len(all_cities)))
+
+    wide = pd.DataFrame(
+        cube[positions, :, series].T.astype(np.float64),
+        index=pd.Index(labels['dates'], name='DATE'),
+        columns=[all_cities[p] for p in positions],
+    )
+    result = aggregate_wide(wide, stat, window, percentiles, CITY_TIERS)
+
+    if start is not None:
+        if tuple(start) > tuple(end):
+            raise ValueError("起始月份不能晚于结束月份")
+        months = np.asarray(labels['months'])
+        in_range = (months >= month_key(*start)) & (months <= month_key(*end))
+        result = result[in_range]
+    value_columns = [c for c in result.columns if c != '城市数']
+    return result[result[value_columns].notna().any(axis=1)]
+
+
+def cmd_agg(args):
+    """统计汇总命令"""
+    try:
+        percentiles = parse_percentiles_arg(args.percentiles)
+        start = parse_month_arg(args.start) if args.start else None
+        end = parse_month_arg(args.end) if args.end else None
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    csv_path = get_csv_path()
+    if not os.path.exists(csv_path):
+        print(f"错误: CSV文件不存在: {csv_path}")
+        sys.exit(1)
+
+    print(f"正在读取数据文件: {csv_path}")
+    window_text = f"，窗口 {args.window} 个月" if args.stat in ('rolling', 'volatility') else ''
+    print(f"统计: {args.stat}，指数列 {args.metric}，指数类型 {args.fixedbase}{window_text}")
+    try:
+        result = compute_aggregate(
+            args.stat, metric=args.metric, fixedbase=args.fixedbase, window=args.window,
+            cities=args.cities, percentiles=percentiles, start=start, end=end, csv_path=csv_path,
+        )
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    if len(result) == 0:
+        print("警告: 未找到符合条件的数据")
+        return result
+    print(f"结果: {len(result)} 个月份 × {len(result.columns)} 列（{result.index[0]} ~ {result.index[-1]}）")
+    print(result.tail(6).round(2).to_string())
+
+    output_filename = args.output or f"70cityprice_agg_{args.stat}_{args.metric}_{args.fixedbase}.csv"
+    output_path = get_output_path(output_filename)
+    result.to_csv(output_path, float_format='%.4f')
+    print(f"\n✅ 数据已保存到: {output_path}")
+    return result
+
+
+def cmd_corr(args):
+    """跨城市相关与领先-滞后矩阵命令"""
+    from corr_70cityprice import lead_lag, load_correlations, save_correlations
+
+    if args.max_lag < 0 or args.min_periods < 2 or args.top < 0:
+        print("错误: --max-lag 不能为负数，--min-periods 至少为2，--top 不能为负数")
+        sys.exit(1)
+    if args.fixedbase not in ALLOWED_FIXED_BASES:
+        print(f"错误: 无效的指数类型: {args.fixedbase}，可选值为: {', '.join(sorted(ALLOWED_FIXED_BASES))}")
+        sys.exit(1)
+    try:
+        start_key = month_key(*parse_month_arg(args.start)) if args.start else None
+        end_key = month_key(*parse_month_arg(args.end)) if args.end else None
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    csv_path = get_csv_path()
+    if not os.path.exists(csv_path):
+        print(f"错误: CSV文件不存在: {csv_path}")
+        sys.exit(1)
+
+    print(f"正在读取数据文件: {csv_path}")
+    try:
+        result = load_correlations(
+            csv_path, metrics=args.metrics, fixedbase=args.fixedbase, start_key=start_key, end_key=end_key,
+            max_lag=args.max_lag, min_periods=args.min_periods, rebuild=args.rebuild,
+        )
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    months = result['months']
+    cities = result['cities']
+    first_year, first_month = month_key_to_tuple(int(months[0]))
+    last_year, last_month = month_key_to_tuple(int(months[-1]))
+    first, last = f'{first_year}/{first_month}', f'{last_year}/{last_month}'
+    n_cities = len(cities)
+    print(f"窗口: {first} ~ {last}（{len(months)} 个月），{args.fixedbase}，"
+          f"{n_cities} 城 {n_cities * (n_cities - 1) // 2} 对，滞后 0~{args.max_lag} 个月"
+          f"{'（读取缓存）' if result['cached'] else ''}")
+
+    upper = np.triu_indices(n_cities, k=1)
+    for metric, corr in zip(result['metrics'], result['corr']):
+        same_month = corr[0][upper]
+        valid = same_month[~np.isnan(same_month)]
+        mean_text = f"{valid.mean():.3f}" if len(valid) else '-'
+        print(f"\n{metric}: 同月相关系数均值 {mean_text}（有效 {len(valid)} 对）")
+        if not args.top:
+            continue
+        lags, best = lead_lag(corr)
+        leading = np.flatnonzero(((lags > 0) & ~np.isnan(best)).ravel())
+        order = leading[np.argsort(-best.ravel()[leading], kind='stable')][:args.top]
+        if len(order) == 0:
+            print("  没有领先关系最强的城市对")
+            continue
+        print(f"  领先-滞后相关最强的 {len(order)} 对（前者领先）:")
+        for position in order:
+            i, j = divmod(int(position), n_cities)
+            print(f"  {cities[i]} → {cities[j]}  领先 {lags[i, j]} 个月  r = {best[i, j]:.3f}")
+
+    output_filename = args.output or (
+        f"70cityprice_corr_{args.fixedbase}_{first_year}{first_month:02d}_{last_year}{last_month:02d}.npz"
+    )
+    if not output_filename.endswith('.npz'):
+        output_filename += '.npz'
+    output_path = get_output_path(output_filename)
+    save_correlations(output_path, result)
+    print(f"\n✅ 相关矩阵已保存到: {output_path}")
+    return result
+
+
+def load_summary(csv_path=None):
+    """
+    从缓存元数据读取行数、月份键和城市列表（不导入pandas）
+    元数据缺失或已过期时加载数据计算
+    返回: {'rows', 'months', 'cities'}
+    """
+    if csv_path is None:
+        csv_path = get_csv_path()
+    summary = read_summary(csv_path) if os.path.exists(csv_path) else None
+    if summary is not None:
+        print(f"正在读取数据文件: {csv_path}")
+        print(f"总记录数: {summary['rows']}")
+        return summary
+
+    df = load_data(csv_path)
+    keys = np.unique(get_month_keys(df))
+    return {
+        'rows': len(df),
+        'months': [int(k) for k in keys if k >= 0],
+        'cities': sorted(df['CITY'].dropna().unique()),
+    }
+
+
 def cmd_list_cities(args):
     """列出所有可用城市"""
-    df = load_data()
-    all_cities = sorted(df['CITY'].unique())
+    all_cities = load_summary()['cities']
     
     print(f"\n📍 可用城市列表 ({len(all_cities)}个):\n")
     
@@ -382,10 +804,7 @@ def cmd_list_cities(args):
 
 def cmd_list_dates(args):
     """列出数据日期范围"""
-    df = load_data()
-    
-    all_dates = df['DATE'].apply(date_to_comparable).dropna()
-    unique_dates = sorted(set(all_dates))
+    unique_dates = [month_key_to_tuple(k) for k in load_summary()['months']]
     
     if len(unique_dates) == 0:
         print("未找到有效日期数据")
@@ -408,6 +827,261 @@ def cmd_list_dates(args):
         print(f"   {year}年: {year_counts[year]} 个月")
 
 
+def _param_value(params, name):
+    """取查询参数的单个值（重复出现时取最后一个）"""
+    values = params.get(name)
+    return values[-1].strip() if values else None
+
+
+def _param_list(params, *names):
+    """取列表型查询参数，支持重复参数与逗号分隔"""
+    items = []
+    for name in names:
+        for value in params.get(name, []):
+            items.extend(part.strip() for part in value.split(',') if part.strip())
+    return items
+
+
+def run_query(df, index, kind, params):
+    """
+    执行一次服务查询（不打印信息）
+    kind: month / city / filter；params: parse_qs 解析后的查询参数
+    返回: 筛选结果DataFrame，参数错误时抛出 ValueError
+    """
+    cities = _param_list(params, 'cities', 'city')
+    start = _param_value(params, 'start')
+    end = _param_value(params, 'end')
+    fixedbases = parse_fixedbase_arg(_param_value(params, 'fixedbase'))
+
+    if kind == 'month' and not (start and end):
+        raise ValueError("month 查询需要 start 和 end 参数")
+    if kind == 'city' and not cities:
+        raise ValueError("city 查询需要 cities 参数")
+    if bool(start) != bool(end):
+        raise ValueError("start 和 end 参数需同时指定")
+
+    return filter_dataset(
+        df, index,
+        cities=cities if kind != 'month' else None,
+        start=parse_month_arg(start) if start and kind != 'city' else None,
+        end=parse_month_arg(end) if end and kind != 'city' else None,
+        fixedbases=fixedbases,
+    )
+
+
+def filter_dataset(df, index, cities=None, start=None, end=None, fixedbases=None):
+    """
+    组合筛选（不打印信息）
+    start / end 为 (year, month)，需同时指定；fixedbases 为指数类型集合
+    """
+    if (start is None) != (end is None):
+        raise ValueError("起始月份和结束月份需同时指定")
+    result = df
+    if cities:
+        result, _ = select_by_city(result, cities, index)
+    if start is not None:
+        if tuple(start) > tuple(end):
+            raise ValueError("起始月份不能晚于结束月份")
+        result = select_by_month(result, start[0], start[1], end[0], end[1], index)
+    return materialize(select_by_fixedbase(result, fixedbases, index), index)
+
+
+def format_result(df, fmt):
+    """将查询结果序列化为 CSV（与 save_data 格式一致）或 JSON 记录数组"""
+    if fmt not in SERVE_FORMATS:
+        raise ValueError(f"无效的输出格式: {fmt}，可选值为: {', '.join(SERVE_FORMATS)}")
+    df = df.drop(columns=[c for c in INTERNAL_COLUMNS if c in df.columns])
+    if fmt == 'json':
+        body = df.to_json(orient='records', force_ascii=False)
+    else:
+        body = df.to_csv(index=False, quoting=1)
+    return body.encode('utf-8'), SERVE_FORMATS[fmt]
+
+
+def _current_dataset(holder):
+    """
+    返回当前数据 (stat_key, df, index)
+    CSV的大小或mtime变化时重新加载；重新加载失败时继续使用旧数据
+    """
+    dataset = holder['dataset']
+    try:
+        stat_key = file_stat_key(holder['csv_path'])
+    except OSError:
+        return dataset
+    if dataset is not None and dataset[0] == stat_key:
+        return dataset
+
+    with holder['lock']:
+        dataset = holder['dataset']
+        if dataset is None or dataset[0] != stat_key:
+            try:
+                df, index = load_indexed_dataset(holder['csv_path'], mapped=holder.get('mapped', False))
+            except Exception as e:
+                if dataset is None:
+                    raise
+                print(f"警告: 重新加载数据失败，继续使用旧数据 ({e})")
+            else:
+                if dataset is not None:
+                    print(f"[{datetime.now():%H:%M:%S}] 数据文件已变化，已重新加载: {dataset_rows(df, index)} 条记录")
+                dataset = (stat_key, df, index)
+                holder['dataset'] = dataset
+    return dataset
+
+
+def decode_request_path(raw_path):
+    """
+    还原请求路径中的原始UTF-8字符
+    http.server 按 latin-1 解码请求行，未经百分号编码的中文（如 curl 直接发送的 cities=成都）
+    需要重新按UTF-8解码；百分号编码的路径只含ASCII，不受影响
+    """
+    try:
+        return raw_path.encode('latin-1').decode('utf-8')
+    except UnicodeError:
+        raise ValueError("请求路径不是有效的UTF-8")
+
+
+def _make_query_handler(holder):
+    """创建绑定到数据的HTTP请求处理类"""
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qs, urlparse
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self._send(status, body, SERVE_FORMATS['json'])
+
+        def do_GET(self):
+            try:
+                parsed = urlparse(decode_request_path(self.path))
+                kind = parsed.path.strip('/')
+                params = parse_qs(parsed.query)
+                _, df, index = _current_dataset(holder)
+                if kind == 'dates':
+                    keys = np.unique(dataset_month_keys(df, index))
+                    months = [f'{y}{m:02d}' for y, m in (month_key_to_tuple(k) for k in keys if k >= 0)]
+                    self._send_json(200, months)
+                elif kind == 'cities':
+                    self._send_json(200, dataset_cities(df, index))
+                elif kind in SERVE_QUERY_KINDS:
+                    result = run_query(df, index, kind, params)
+                    body, content_type = format_result(result, _param_value(params, 'format') or 'csv')
+                    self._send(200, body, content_type)
+                else:
+                    self._send_json(404, {'error': f"未知的查询: /{kind}，可用: month, city, filter, dates, cities"})
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            # 高频小查询，不逐条输出访问日志
+            pass
+
+    return QueryHandler
+
+
+_query_holders = {}
+_query_holders_lock = threading.Lock()
+
+
+def _as_month_tuple(value):
+    """库接口的月份参数: 'YYYYMM' / 'YYYY-MM' / 整数 202401 / (year, month)"""
+    if value is None:
+        return None
+    if isinstance(value, (tuple, list)):
+        year, month = int(value[0]), int(value[1])
+        if month < 1 or month > 12:
+            raise ValueError(f"无效的月份: {month}")
+        return year, month
+    return parse_month_arg(str(value))
+
+
+def query(cities=None, start=None, end=None, fixedbase=None, csv_path=None):
+    """
+    库调用接口: 按城市 / 月份范围 / 指数类型筛选数据，不打印、不写文件
+
+    参数:
+        cities: 城市名列表（同 city 子命令的匹配规则）
+        start, end: 起止月份，'YYYYMM' / 整数 / (year, month)，需同时指定
+        fixedbase: 指数类型，'同比,环比' 形式的字符串或集合
+        csv_path: 数据文件路径（默认仓库根目录的70cityprice.csv）
+
+    数据按文件缓存在进程内，CSV变化后下次调用自动重新加载。
+    返回: DataFrame（列与CSV一致，保留在全量数据中的行标签）
+    """
+    csv_path = os.path.abspath(csv_path or get_csv_path())
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV文件不存在: {csv_path}")
+    if isinstance(cities, str):
+        cities = [cities]
+    if fixedbase is not None and not isinstance(fixedbase, str):
+        fixedbase = ','.join(fixedbase)
+
+    with _query_holders_lock:
+        holder = _query_holders.setdefault(
+            csv_path, {'csv_path': csv_path, 'lock': threading.Lock(), 'dataset': None, 'mapped': True}
+        )
+    _, df, index = _current_dataset(holder)
+    result = filter_dataset(
+        df, index,
+        cities=cities,
+        start=_as_month_tuple(start),
+        end=_as_month_tuple(end),
+        fixedbases=parse_fixedbase_arg(fixedbase),
+    )
+    return result.drop(columns=[c for c in INTERNAL_COLUMNS if c in result.columns])
+
+
+def cmd_serve(args):
+    """常驻查询服务命令"""
+    csv_path = args.csv or get_csv_path()
+    if not os.path.exists(csv_path):
+        print(f"错误: CSV文件不存在: {csv_path}")
+        sys.exit(1)
+
+    import socketserver
+    from http.server import ThreadingHTTPServer
+
+    holder = {'csv_path': csv_path, 'lock': threading.Lock(), 'dataset': None, 'mapped': True}
+    print(f"正在读取数据文件: {csv_path}")
+    _, df, index = _current_dataset(holder)
+    print(f"总记录数: {dataset_rows(df, index)}")
+
+    handler = _make_query_handler(holder)
+    if args.socket:
+        if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+            print("错误: 当前平台不支持Unix套接字")
+            sys.exit(1)
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = socketserver.ThreadingUnixStreamServer(args.socket, handler)
+        location = f"unix:{args.socket}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), handler)
+        location = f"http://{args.host}:{args.port}"
+    server.daemon_threads = True
+
+    print(f"\n🚀 查询服务已启动: {location}")
+    print("   查询: /month /city /filter（参数 cities, start, end, fixedbase, format=csv|json）")
+    print("   列表: /dates /cities")
+    print("   按 Ctrl+C 停止")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='70城房价数据提取工具',
@@ -422,6 +1096,10 @@ def main():
   %(prog)s filter --cities 成都 重庆 --start 202401 --end 202412 --fixedbase 同比,环比  # 组合过滤
   %(prog)s list-cities                            # 列出所有城市
   %(prog)s list-dates                             # 列出日期范围
+  %(prog)s agg rolling --cities 北京 上海 --window 12  # 12个月滚动均值
+  %(prog)s agg tier --fixedbase 环比               # 一线/35个大中城市/35个其他城市均值
+  %(prog)s corr --start 201501 --max-lag 6         # 70城环比相关与领先-滞后矩阵
+  %(prog)s serve --port 8770                      # 启动常驻查询服务
         """
     )
     
@@ -459,6 +1137,46 @@ def main():
     list_dates_parser = subparsers.add_parser('list-dates', help='列出数据日期范围')
     list_dates_parser.set_defaults(func=cmd_list_dates)
     
+    # agg 子命令
+    agg_parser = subparsers.add_parser('agg', help='统计汇总（滚动均值/波动率、城市分组均值、跨城市分位数）')
+    agg_parser.add_argument('stat', choices=AGG_STATS,
+                            help='rolling 滚动均值 / volatility 滚动标准差 / tier 城市分组均值 / percentile 跨城市分位数')
+    agg_parser.add_argument('--metric', '-m', default=AGG_DEFAULT_METRIC, help=f'指数列 (默认: {AGG_DEFAULT_METRIC})')
+    agg_parser.add_argument('--fixedbase', '-f', default='同比', help='指数类型 (同比/环比/定基比，默认: 同比)')
+    agg_parser.add_argument('--window', '-w', type=int, default=AGG_DEFAULT_WINDOW,
+                            help=f'滚动窗口月数 (默认: {AGG_DEFAULT_WINDOW})')
+    agg_parser.add_argument('--cities', '-c', nargs='+', help='参与计算的城市 (默认: 70城)')
+    agg_parser.add_argument('--percentiles', '-p', default=','.join(str(p) for p in AGG_DEFAULT_PERCENTILES),
+                            help='分位数，逗号分隔 (默认: 10,25,50,75,90)')
+    agg_parser.add_argument('--start', '-s', help='起始月份 (格式: YYYYMM)')
+    agg_parser.add_argument('--end', '-e', help='结束月份 (格式: YYYYMM)')
+    agg_parser.add_argument('--output', '-o', help='输出文件名')
+    agg_parser.set_defaults(func=cmd_agg)
+    
+    # corr 子命令
+    corr_parser = subparsers.add_parser('corr', help='跨城市相关与领先-滞后矩阵')
+    corr_parser.add_argument('--metrics', '-m', nargs='+', default=['CommodityHouseIDX', 'SecondHandIDX'],
+                             help='指数列 (默认: CommodityHouseIDX SecondHandIDX)')
+    corr_parser.add_argument('--fixedbase', '-f', default='环比', help='指数类型 (默认: 环比)')
+    corr_parser.add_argument('--start', '-s', help='起始月份 (格式: YYYYMM)')
+    corr_parser.add_argument('--end', '-e', help='结束月份 (格式: YYYYMM)')
+    corr_parser.add_argument('--max-lag', '-l', type=int, default=6, help='最大滞后月数 (默认: 6)')
+    corr_parser.add_argument('--min-periods', type=int, default=12,
+                             help='每对城市至少需要的有效月份数 (默认: 12)')
+    corr_parser.add_argument('--top', '-t', type=int, default=CORR_DEFAULT_TOP,
+                             help=f'列出领先-滞后相关最强的城市对数量 (默认: {CORR_DEFAULT_TOP})')
+    corr_parser.add_argument('--output', '-o', help='输出文件名 (.npz)')
+    corr_parser.add_argument('--rebuild', action='store_true', help='忽略缓存，重新计算')
+    corr_parser.set_defaults(func=cmd_corr)
+    
+    # serve 子命令
+    serve_parser = subparsers.add_parser('serve', help='启动常驻查询服务（HTTP或Unix套接字）')
+    serve_parser.add_argument('--host', default=SERVE_DEFAULT_HOST, help=f'监听地址 (默认: {SERVE_DEFAULT_HOST})')
+    serve_parser.add_argument('--port', type=int, default=SERVE_DEFAULT_PORT, help=f'监听端口 (默认: {SERVE_DEFAULT_PORT})')
+    serve_parser.add_argument('--socket', help='改为监听Unix套接字路径')
+    serve_parser.add_argument('--csv', help='数据文件路径 (默认: 仓库根目录的70cityprice.csv)')
+    serve_parser.set_defaults(func=cmd_serve)
+    
     args = parser.parse_args()
     
     if args.command is None:
@@ -1,71 +1,557 @@
 #!/usr/bin/env python3
-"""生成北上广深近10年房价走势图"""
+"""
+生成房价走势图
+默认生成北上广深近10年房价走势图（assets/price_trend.png）；
+批量模式按图表清单（JSON）一次加载数据，由多个进程并行渲染 PNG/SVG；
+--backend svg 使用纯Python的SVG/HTML后端（chart_svg），不导入matplotlib与pandas
 
-import pandas as pd
-import matplotlib.pyplot as plt
+使用方法:
+    python tools/generate_chart.py                                  # 北上广深走势图
+    python tools/generate_chart.py --backend svg --format svg html  # 轻量SVG与HTML看板页面
+    python tools/generate_chart.py --spec tools/charts_all.json     # 按清单批量生成
+    python tools/generate_chart.py --spec charts.json --jobs 8 --format png svg
+
+图表清单格式:
+    {
+      "output_dir": "assets/charts",          # 相对路径以仓库根目录为准
+      "formats": ["png"],                     # matplotlib: png / svg；svg 后端: svg / html
+      "defaults": {"start": "201501", "dpi": 100},
+      "charts": [
+        {"name": "bsgs", "cities": ["北京", "上海", "广州", "深圳"], "metric": "CommodityHouseIDX", "fixedbase": "同比"},
+        {"name": "{city}_{metric}_{fixedbase}", "each_city": "*",
+         "metric": ["CommodityHouseIDX", "SecondHandIDX"], "fixedbase": ["同比", "环比", "定基比"]}
+      ]
+    }
+    metric / fixedbase 为列表时按组合展开；each_city 为城市列表或 "*"（70城），每个城市一张图；
+    name / title 中可使用 {city} {metric} {fixedbase} 占位符。
+    其余可选字段: end、title、ylabel、ylim、baseline、figsize、dpi、colors、source、
+    tight（默认true；false 时使用固定边距，批量生成快一倍以上）、backend（matplotlib / svg）
+
+增量生成:
+    每张图的指纹 = 图表参数 + 图中各城市的有效数据点（月份与数值）+ 渲染版本的哈希，
+    记录在输出目录的 chart_manifest.json 中；指纹未变且文件都在的图表直接跳过，
+    因此追加一个月的数据后，只有区间覆盖该月、且该月有数据的图表会重新生成。
+    --force 全部重新生成，--prune 删除清单中已不存在的图表文件。
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import PackageNotFoundError, version
 from pathlib import Path
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['PingFang SC', 'Heiti SC', 'SimHei', 'Arial Unicode MS']
-plt.rcParams['axes.unicode_minus'] = False
+import numpy as np
+
+from cube_70cityprice import get_cube_prefix, load_cube, read_cube, series_position
+from storage_70cityprice import NUMERIC_COLUMNS, cache_enabled
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CHART_BACKENDS = ('matplotlib', 'svg')
+# 各后端支持的格式，第一个为默认格式
+BACKEND_FORMATS = {'matplotlib': ('png', 'svg'), 'svg': ('svg', 'html')}
+CHART_FORMATS = ('png', 'svg', 'html')
+CHART_MANIFEST = 'chart_manifest.json'
+# 绘图代码改变输出效果时加1，使全部图表的指纹失效
+CHART_RENDER_VERSION = 2
+
+METRIC_LABELS = {
+    'HouseIDX': '住宅',
+    'ResidentIDX': '住宅',
+    'CommodityHouseIDX': '新建商品住宅',
+    'SecondHandIDX': '二手住宅',
+    'ResidentBelow90IDX': '住宅90m²以下',
+    'CommonResidentBelow90IDX': '普通住宅90m²以下',
+    'CommodityBelow90IDX': '新建商品住宅90m²以下',
+    'Commodity144IDX': '新建商品住宅90-144m²',
+    'CommodityAbove144IDX': '新建商品住宅144m²以上',
+    'SecondHandBelow90IDX': '二手住宅90m²以下',
+    'SecondHand144IDX': '二手住宅90-144m²',
+    'SecondHandAbove144IDX': '二手住宅144m²以上',
+}
+YLABELS = {
+    '同比': '价格指数（上年同期=100）',
+    '环比': '价格指数（上月=100）',
+    '定基比': '价格指数（基期=100）',
+}
+CITY_COLORS = {
+    '北京': '#E53935',
+    '上海': '#1E88E5',
+    '广州': '#43A047',
+    '深圳': '#FB8C00'
+}
+# tight=false 时使用的固定边距（省去 tight_layout 与 bbox_inches='tight' 的两次额外排版）
+FIXED_MARGINS = {'left': 0.08, 'right': 0.98, 'top': 0.9, 'bottom': 0.08}
+PALETTE = ['#E53935', '#1E88E5', '#43A047', '#FB8C00', '#8E24AA', '#00897B', '#6D4C41', '#546E7A']
+
+CHART_DEFAULTS = {
+    'metric': 'CommodityHouseIDX',
+    'fixedbase': '同比',
+    'start': None,
+    'end': None,
+    'title': None,
+    'ylabel': None,
+    'ylim': None,
+    'baseline': 100,
+    'figsize': [12, 6],
+    'dpi': 150,
+    'colors': {},
+    'source': '数据来源：国家统计局',
+    'tight': True,
+    'backend': 'matplotlib',
+}
+
+# 默认图表：2015年至今，北上广深，同比数据
+DEFAULT_CHART = {
+    'name': 'price_trend',
+    'cities': ['北京', '上海', '广州', '深圳'],
+    'metric': 'CommodityHouseIDX',
+    'fixedbase': '同比',
+    'start': '201501',
+    'title': '北上广深新建商品住宅价格指数（同比）',
+    'ylim': [85, 170],
+}
+
+
+def _load_matplotlib():
+    """首次使用matplotlib后端时才导入（Agg，无需图形界面），并设置中文字体"""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    # 设置中文字体
+    matplotlib.rcParams['font.sans-serif'] = ['PingFang SC', 'Heiti SC', 'SimHei', 'Arial Unicode MS']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return Figure
+
+
+def renderer_version(backend):
+    """渲染器版本（计入图表指纹）；不导入matplotlib本身"""
+    if backend == 'svg':
+        from chart_svg import SVG_RENDER_VERSION
+        return f'svg-{SVG_RENDER_VERSION}'
+    try:
+        return f'matplotlib-{version("matplotlib")}'
+    except PackageNotFoundError:
+        return 'matplotlib'
+
+
+def resolve_path(path):
+    """相对路径以仓库根目录为准"""
+    path = Path(path)
+    return path if path.is_absolute() else REPO_ROOT / path
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _month_key_or_none(value):
+    from extract_70cityprice import month_key, parse_month_arg
+    return month_key(*parse_month_arg(str(value))) if value else None
+
+
+def expand_chart(entry, defaults=None, all_cities=None, overrides=None):
+    """
+    将清单中的一项展开为若干张图（metric / fixedbase 列表与 each_city 的组合）
+    参数:
+        all_cities: each_city 为 "*" 时使用的城市列表（三维数组的城市轴）
+        overrides: 覆盖清单的参数（如命令行指定的 backend）
+    返回: 完整参数的图表列表
+    """
+    chart = {**CHART_DEFAULTS, **(defaults or {}), **entry, **(overrides or {})}
+    if 'name' not in chart:
+        raise ValueError(f"图表缺少 name 字段: {entry}")
+    if chart['backend'] not in CHART_BACKENDS:
+        raise ValueError(f"无效的绘图后端: {chart['backend']}，可选值为: {', '.join(CHART_BACKENDS)}")
+    each_city = chart.pop('each_city', None)
+    if each_city == '*' and all_cities is None:
+        raise ValueError("each_city 为 \"*\" 时需要提供城市列表")
+    if each_city is not None:
+        city_groups = [[city] for city in (all_cities if each_city == '*' else _as_list(each_city))]
+    elif chart.get('cities'):
+        city_groups = [_as_list(chart['cities'])]
+    else:
+        raise ValueError(f"图表 {chart['name']} 需要 cities 或 each_city 字段")
+
+    charts = []
+    for cities, metric, fixedbase in itertools.product(
+            city_groups, _as_list(chart['metric']), _as_list(chart['fixedbase'])):
+        if metric not in NUMERIC_COLUMNS:
+            raise ValueError(f"未知的指数列: {metric}")
+        if fixedbase not in YLABELS:
+            raise ValueError(f"无效的指数类型: {fixedbase}，可选值为: {', '.join(YLABELS)}")
+        fields = {'city': '、'.join(cities), 'metric': metric, 'fixedbase': fixedbase}
+        title = chart['title'] or '{city}' + METRIC_LABELS[metric] + '价格指数（{fixedbase}）'
+        charts.append({
+            **chart,
+            'name': chart['name'].format(**fields),
+            'title': title.format(**fields),
+            'cities': cities,
+            'metric': metric,
+            'fixedbase': fixedbase,
+            'ylabel': chart['ylabel'] or YLABELS[fixedbase],
+            'start_key': _month_key_or_none(chart['start']),
+            'end_key': _month_key_or_none(chart['end']),
+        })
+    return charts
+
+
+def check_formats(chart, formats):
+    supported = BACKEND_FORMATS[chart['backend']]
+    invalid = [fmt for fmt in formats if fmt not in supported]
+    if invalid:
+        raise ValueError(f"{chart['backend']} 后端不支持 {', '.join(invalid)} 格式，可选值为: {', '.join(supported)}")
+
+
+def load_spec(spec_path, output_dir=None, formats=None, all_cities=None, overrides=None):
+    """
+    读取图表清单，展开为渲染任务
+    返回: (charts, output_dir)；charts 每项为图表参数加 outputs（各格式的输出路径）
+    """
+    with open(spec_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        spec = {'charts': spec}
+    output_dir = resolve_path(output_dir or spec.get('output_dir', 'assets/charts'))
+    formats = _as_list(formats or spec.get('formats', ['png']))
+    invalid = sorted(set(formats) - set(CHART_FORMATS))
+    if invalid:
+        raise ValueError(f"不支持的图片格式: {', '.join(invalid)}，可选值为: {', '.join(CHART_FORMATS)}")
+
+    jobs = []
+    seen = set()
+    for entry in spec.get('charts', []):
+        for chart in expand_chart(entry, spec.get('defaults'), all_cities, overrides):
+            check_formats(chart, formats)
+            if chart['name'] in seen:
+                raise ValueError(f"图表名称重复: {chart['name']}")
+            seen.add(chart['name'])
+            chart['outputs'] = [str(output_dir / f"{chart['name']}.{fmt}") for fmt in formats]
+            jobs.append(chart)
+    return jobs, output_dir
+
+
+def chart_range(chart, labels):
+    """图表区间内的月份掩码"""
+    months = np.asarray(labels['months'])
+    in_range = np.ones(len(months), dtype=bool)
+    if chart['start_key'] is not None:
+        in_range &= months >= chart['start_key']
+    if chart['end_key'] is not None:
+        in_range &= months <= chart['end_key']
+    return in_range
+
+
+def chart_fingerprint(chart, cube, labels):
+    """
+    图表指纹: 图表参数（不含输出路径）、各城市区间内的有效数据点和渲染版本的哈希
+    只计入有数据的月份，其他城市新增的月份不影响本图
+    """
+    params = {k: v for k, v in chart.items() if k != 'outputs'}
+    digest = hashlib.sha256(json.dumps(
+        [CHART_RENDER_VERSION, renderer_version(chart['backend']), params], sort_keys=True, ensure_ascii=False
+    ).encode('utf-8'))
+    months = np.asarray(labels['months'], dtype=np.int64)
+    in_range = chart_range(chart, labels)
+    series = series_position(labels, chart['metric'], chart['fixedbase'])
+    for city in chart['cities']:
+        if city not in labels['cities']:
+            raise ValueError(f"未找到城市: {city}")
+        values = np.asarray(cube[labels['cities'].index(city), in_range, series])
+        has_value = ~np.isnan(values)
+        digest.update(city.encode('utf-8'))
+        digest.update(np.ascontiguousarray(months[in_range][has_value]).tobytes())
+        digest.update(np.ascontiguousarray(values[has_value]).tobytes())
+    return digest.hexdigest()
+
+
+def read_manifest(output_dir):
+    """读取输出目录的图表清单记录，不存在或损坏时返回空记录"""
+    try:
+        with open(Path(output_dir) / CHART_MANIFEST, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != CHART_RENDER_VERSION:
+        return {}
+    return manifest.get('charts', {})
+
+
+def write_manifest(output_dir, entries):
+    """写入图表清单记录（先写临时文件再原子替换）"""
+    path = Path(output_dir) / CHART_MANIFEST
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': CHART_RENDER_VERSION, 'charts': dict(sorted(entries.items()))},
+                  f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def chart_lines(chart, cube, labels):
+    """
+    图中每个城市的折线数据
+    返回: [(城市, 颜色, 月份位置数组, 数值数组)]，只含区间内有数据的月份
+    """
+    in_range = np.flatnonzero(chart_range(chart, labels))
+    series = series_position(labels, chart['metric'], chart['fixedbase'])
+    colors = {**CITY_COLORS, **chart['colors']}
+    lines = []
+    for position, city in enumerate(chart['cities']):
+        if city not in labels['cities']:
+            raise ValueError(f"未找到城市: {city}")
+        values = cube[labels['cities'].index(city), in_range, series]
+        has_value = ~np.isnan(values)
+        color = colors.get(city, PALETTE[position % len(PALETTE)])
+        lines.append((city, color, in_range[has_value], exact_values(values[has_value])))
+    return lines
+
+
+def exact_values(values):
+    """
+    三维数组的 float32 值 -> 原始字符串对应的 float64（如 101.2 而不是 101.19999694）
+    float32 的最短十进制表示与原文一致（数据均为不超过7位有效数字的小数），据此还原后绘图，
+    与直接解析CSV字符串的结果相同
+    """
+    values = np.asarray(values, dtype=np.float32)
+    return np.array([float(np.format_float_positional(v, trim='-')) for v in values], dtype=np.float64)
+
+
+def chart_dates(labels):
+    """横轴日期（matplotlib后端使用）"""
+    import pandas as pd
+    return pd.to_datetime(labels['dates'], format='%Y/%m/%d')
+
+
+def render_chart(chart, cube, labels, dates=None):
+    """按图表参数绘制并保存到 chart['outputs'] 中的每个路径"""
+    if chart['backend'] == 'svg':
+        return render_svg_chart(chart, cube, labels)
+    if dates is None:
+        dates = chart_dates(labels)
+    Figure = _load_matplotlib()
 
-def main():
-    # 读取数据
-    script_dir = Path(__file__).parent
-    csv_path = script_dir.parent / '70cityprice.csv'
-    df = pd.read_csv(csv_path)
-    
-    # 转换日期
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    
-    # 筛选条件：2015年至今，北上广深，同比数据
-    cities = ['北京', '上海', '广州', '深圳']
-    start_date = '2015-01-01'
-    
-    mask = (
-        (df['CITY'].isin(cities)) & 
-        (df['FixedBase'] == '同比') & 
-        (df['DATE'] >= start_date)
-    )
-    data = df[mask].copy()
-    
     # 创建图表
-    fig, ax = plt.subplots(figsize=(12, 6), dpi=150)
-    
-    colors = {
-        '北京': '#E53935',
-        '上海': '#1E88E5',
-        '广州': '#43A047',
-        '深圳': '#FB8C00'
-    }
-    
-    for city in cities:
-        city_data = data[data['CITY'] == city].sort_values('DATE')
-        ax.plot(city_data['DATE'], city_data['CommodityHouseIDX'], 
-                label=city, color=colors[city], linewidth=1.5)
-    
-    # 添加基准线（100 = 与上年同期持平）
-    ax.axhline(y=100, color='gray', linestyle='--', alpha=0.5, linewidth=1)
-    
+    fig = Figure(figsize=tuple(chart['figsize']), dpi=chart['dpi'])
+    ax = fig.subplots()
+
+    for city, color, positions, values in chart_lines(chart, cube, labels):
+        ax.plot(dates[positions], values,
+                label=city, color=color, linewidth=1.5)
+
+    # 添加基准线（100 = 与基期持平）
+    if chart['baseline'] is not None:
+        ax.axhline(y=chart['baseline'], color='gray', linestyle='--', alpha=0.5, linewidth=1)
+
     # 美化图表
-    ax.set_title('北上广深新建商品住宅价格指数（同比）', fontsize=16, fontweight='bold', pad=15)
+    ax.set_title(chart['title'], fontsize=16, fontweight='bold', pad=15)
     ax.set_xlabel('')
-    ax.set_ylabel('价格指数（上年同期=100）', fontsize=11)
+    ax.set_ylabel(chart['ylabel'], fontsize=11)
     ax.legend(loc='upper right', framealpha=0.9)
     ax.grid(True, alpha=0.3)
-    ax.set_ylim(85, 170)
-    
+    if chart['ylim']:
+        ax.set_ylim(*chart['ylim'])
+
     # 添加数据来源
-    ax.text(0.02, 0.02, '数据来源：国家统计局', transform=ax.transAxes, 
-            fontsize=9, color='gray', alpha=0.7)
-    
-    plt.tight_layout()
-    
+    if chart['source']:
+        ax.text(0.02, 0.02, chart['source'], transform=ax.transAxes,
+                fontsize=9, color='gray', alpha=0.7)
+
+    if chart['tight']:
+        fig.tight_layout()
+    else:
+        fig.subplots_adjust(**FIXED_MARGINS)
+
     # 保存图片
-    output_path = script_dir.parent / 'assets' / 'price_trend.png'
-    output_path.parent.mkdir(exist_ok=True)
-    plt.savefig(output_path, bbox_inches='tight', facecolor='white')
-    print(f'图表已保存至: {output_path}')
+    for output in chart['outputs']:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        fig.savefig(output, bbox_inches='tight' if chart['tight'] else None, facecolor='white')
+    return chart['outputs']
+
+
+def render_svg_chart(chart, cube, labels):
+    """SVG/HTML后端: 纯Python生成，图表尺寸按 figsize × 80 像素"""
+    from chart_svg import chart_html, line_chart_svg
+
+    months = labels['months']
+    lines = [
+        {'label': city, 'color': color, 'months': [months[p] for p in positions.tolist()],
+         'values': values.tolist()}
+        for city, color, positions, values in chart_lines(chart, cube, labels)
+    ]
+    width, height = (int(size * 80) for size in chart['figsize'])
+    svg = line_chart_svg(lines, chart['title'], chart['ylabel'], chart['baseline'], chart['ylim'],
+                         chart['source'], width, height)
+    for output in chart['outputs']:
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        content = chart_html(lines, chart['title'], svg, chart['baseline']) if output.endswith('.html') else svg
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(content)
+    return chart['outputs']
+
+
+_worker_data = {}
+
+
+def _init_worker(prefix, csv_path, cube, labels):
+    """子进程初始化: 映射同一份三维数组缓存（页缓存在进程间共享），缓存无法读取时由同一CSV重新加载"""
+    if prefix is not None:
+        cube, labels = read_cube(prefix) or load_cube(csv_path)
+    _worker_data['cube'] = cube
+    _worker_data['labels'] = labels
+    _worker_data['dates'] = None
+
+
+def _render_job(chart):
+    # 日期只解析一次，且只在matplotlib后端需要时解析
+    if chart['backend'] != 'svg' and _worker_data['dates'] is None:
+        _worker_data['dates'] = chart_dates(_worker_data['labels'])
+    return render_chart(chart, _worker_data['cube'], _worker_data['labels'], _worker_data['dates'])
+
+
+def render_batch(charts, csv_path, jobs=None, cube=None, labels=None):
+    """
+    批量渲染: 主进程加载（必要时生成）三维数组缓存，子进程各自内存映射后并行绘图
+    返回: 生成的文件路径列表
+    """
+    if cube is None:
+        cube, labels = load_cube(str(csv_path))
+    if not charts:
+        return []
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(charts)))
+    if jobs == 1:
+        _init_worker(None, csv_path, cube, labels)
+        return [path for chart in charts for path in _render_job(chart)]
+
+    # 有缓存文件时只传递路径，否则把数组随初始化参数传给子进程
+    prefix = get_cube_prefix(str(csv_path)) if isinstance(cube, np.memmap) and cache_enabled() else None
+    initargs = (prefix, str(csv_path), None, None) if prefix else (None, str(csv_path), np.asarray(cube), labels)
+    chunksize = max(1, len(charts) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as executor:
+        results = executor.map(_render_job, charts, chunksize=chunksize)
+        return [path for outputs in results for path in outputs]
+
+
+def update_charts(charts, csv_path, output_dir, jobs=None, force=False, prune=False, cube=None, labels=None):
+    """
+    增量生成: 只渲染指纹变化或文件缺失的图表，并更新输出目录的 chart_manifest.json
+    返回: (rendered, skipped, removed) 重新生成的图表、跳过的图表与删除的文件
+    """
+    if cube is None:
+        cube, labels = load_cube(str(csv_path))
+    output_dir = Path(output_dir)
+    manifest = read_manifest(output_dir)
+
+    pending = []
+    skipped = []
+    entries = {}
+    for chart in charts:
+        fingerprint = chart_fingerprint(chart, cube, labels)
+        outputs = [Path(p).relative_to(output_dir).as_posix() for p in chart['outputs']]
+        entries[chart['name']] = {'fingerprint': fingerprint, 'outputs': outputs}
+        previous = manifest.get(chart['name'], {})
+        unchanged = (previous.get('fingerprint') == fingerprint and previous.get('outputs') == outputs
+                     and all(os.path.exists(p) for p in chart['outputs']))
+        if unchanged and not force:
+            skipped.append(chart)
+        else:
+            pending.append(chart)
+
+    render_batch(pending, csv_path, jobs, cube, labels)
+
+    removed = []
+    for name, entry in manifest.items():
+        if name in entries:
+            continue
+        if not prune:
+            entries[name] = entry
+            continue
+        for output in entry.get('outputs', []):
+            path = output_dir / output
+            if path.exists():
+                path.unlink()
+                removed.append(str(path))
+    if pending or removed or entries != manifest:
+        write_manifest(output_dir, entries)
+    return pending, skipped, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='生成房价走势图（默认北上广深走势图，--spec 按清单批量生成）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  %(prog)s                                     # 生成 assets/price_trend.png
+  %(prog)s --spec tools/charts_all.json        # 70城 × 2个指数列 × 3种指数类型
+  %(prog)s --spec charts.json --jobs 4 --format png svg
+  %(prog)s --backend svg --format svg html     # 不依赖matplotlib的SVG与HTML页面
+        """
+    )
+    parser.add_argument('--spec', help='图表清单（JSON）')
+    parser.add_argument('--jobs', '-j', type=int, help='并行进程数 (默认: CPU核数)')
+    parser.add_argument('--output-dir', help='输出目录（覆盖清单中的 output_dir）')
+    parser.add_argument('--format', nargs='+', choices=CHART_FORMATS, help='图片格式（覆盖清单中的 formats）')
+    parser.add_argument('--backend', choices=CHART_BACKENDS,
+                        help='绘图后端（覆盖清单中的 backend；默认 matplotlib）')
+    parser.add_argument('--force', action='store_true', help='忽略指纹，全部重新生成')
+    parser.add_argument('--prune', action='store_true', help='删除清单中已不存在的图表文件')
+    args = parser.parse_args()
+
+    if args.jobs is not None and args.jobs <= 0:
+        print("错误: --jobs 必须为正整数")
+        sys.exit(1)
+
+    # 读取数据
+    csv_path = REPO_ROOT / '70cityprice.csv'
+    if not csv_path.exists():
+        print(f"错误: CSV文件不存在: {csv_path}")
+        sys.exit(1)
+
+    # 内存映射的 城市×月份×序列 数组，数据只加载一次
+    cube, labels = load_cube(str(csv_path))
+    overrides = {'backend': args.backend} if args.backend else None
+    try:
+        if args.spec:
+            charts, output_dir = load_spec(args.spec, args.output_dir, args.format, labels['cities'], overrides)
+        else:
+            charts = expand_chart(DEFAULT_CHART, overrides=overrides)
+            output_dir = resolve_path(args.output_dir or 'assets')
+            formats = args.format or BACKEND_FORMATS[charts[0]['backend']][:1]
+            check_formats(charts[0], formats)
+            charts[0]['outputs'] = [str(output_dir / f"{charts[0]['name']}.{fmt}") for fmt in formats]
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    if not charts:
+        print("警告: 清单中没有图表")
+        return
+
+    try:
+        rendered, skipped, removed = update_charts(
+            charts, csv_path, output_dir, args.jobs, force=args.force, prune=args.prune, cube=cube, labels=labels
+        )
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    if len(charts) == 1 and rendered:
+        for output in rendered[0]['outputs']:
+            print(f'图表已保存至: {output}')
+    elif len(charts) == 1:
+        print(f"图表数据未变化，跳过: {', '.join(charts[0]['outputs'])}")
+    else:
+        n_files = sum(len(chart['outputs']) for chart in rendered)
+        print(f'已生成 {len(rendered)} 张图表（{n_files} 个文件），跳过 {len(skipped)} 张未变化的图表，'
+              f'保存至: {output_dir}')
+    if removed:
+        print(f'已删除 {len(removed)} 个不在清单中的文件')
+
 
 if __name__ == '__main__':
     main()
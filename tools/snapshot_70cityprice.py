@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价发布页面快照缓存
+按内容哈希（SHA256）在本地缓存发布页面的原始HTML及解析后的表格列表，
+使重复运行、CI和解析器回归测试无需联网，HTML未变化时也无需重新调用lxml解析
+
+缓存目录（默认 <仓库根目录>/.cache/snapshots，可用环境变量 CITYPRICE_SNAPSHOT_DIR 指定）:
+    index.json                 URL -> 内容哈希
+    raw/<sha256>.html          原始HTML
+    tables/<sha256>.v1.pkl     pd.read_html 解析结果（DataFrame列表）
+
+缓存总大小超过上限（默认256MB，可用环境变量 CITYPRICE_SNAPSHOT_MAX_MB 指定）时，
+按最近使用时间淘汰最旧的文件（LRU，命中时刷新文件mtime）。
+
+使用方法:
+    python tools/snapshot_70cityprice.py list     # 列出已缓存的页面
+    python tools/snapshot_70cityprice.py prune    # 按大小上限清理缓存
+    python tools/snapshot_70cityprice.py clear    # 清空缓存
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+import threading
+import urllib.request
+from datetime import datetime
+
+import pandas as pd
+
+from storage_70cityprice import cache_enabled
+
+SNAPSHOT_DIR_ENV = 'CITYPRICE_SNAPSHOT_DIR'
+SNAPSHOT_MAX_MB_ENV = 'CITYPRICE_SNAPSHOT_MAX_MB'
+DEFAULT_MAX_MB = 256
+TABLES_FORMAT_VERSION = 1
+REQUEST_TIMEOUT = 30
+USER_AGENT = 'Mozilla/5.0 (compatible; 70cityprice-updater)'
+
+_index_lock = threading.Lock()
+
+
+def get_snapshot_dir():
+    """获取快照缓存目录"""
+    custom = os.environ.get(SNAPSHOT_DIR_ENV)
+    if custom:
+        return custom
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(os.path.dirname(script_dir), '.cache', 'snapshots')
+
+
+def get_max_bytes():
+    """获取缓存大小上限（字节）"""
+    try:
+        max_mb = float(os.environ.get(SNAPSHOT_MAX_MB_ENV, DEFAULT_MAX_MB))
+    except ValueError:
+        max_mb = DEFAULT_MAX_MB
+    return int(max_mb * 1024 * 1024)
+
+
+def _raw_path(digest):
+    return os.path.join(get_snapshot_dir(), 'raw', f'{digest}.html')
+
+
+def _tables_path(digest):
+    return os.path.join(get_snapshot_dir(), 'tables', f'{digest}.v{TABLES_FORMAT_VERSION}.pkl')
+
+
+def _index_path():
+    return os.path.join(get_snapshot_dir(), 'index.json')
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def load_index():
+    """读取 URL -> 内容哈希 索引"""
+    try:
+        with open(_index_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _record_url(url, digest):
+    with _index_lock:
+        index = load_index()
+        index[url] = {'sha256': digest, 'fetched_at': datetime.now().isoformat(timespec='seconds')}
+        payload = json.dumps(index, ensure_ascii=False, indent=1).encode('utf-8')
+        _write_atomic(_index_path(), payload)
+
+
+def download_html(url):
+    """下载发布页面原始HTML"""
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return response.read()
+
+
+def fetch_html(url, refresh=False, offline=False):
+    """
+    获取发布页面原始HTML（本地文件直接读取）
+    返回: (raw_bytes, sha256, from_cache)
+
+    参数:
+        refresh: 忽略缓存，重新下载
+        offline: 只使用缓存，未命中时报错
+    """
+    if os.path.isfile(url):
+        with open(url, 'rb') as f:
+            raw = f.read()
+        return raw, hashlib.sha256(raw).hexdigest(), True
+
+    if not refresh:
+        entry = load_index().get(url)
+        if entry:
+            raw_path = _raw_path(entry['sha256'])
+            if os.path.exists(raw_path):
+                with open(raw_path, 'rb') as f:
+                    raw = f.read()
+                _touch(raw_path)
+                return raw, entry['sha256'], True
+
+    if offline:
+        raise ValueError(f"离线模式下未找到页面快照: {url}")
+
+    raw = download_html(url)
+    digest = hashlib.sha256(raw).hexdigest()
+    _write_atomic(_raw_path(digest), raw)
+    _record_url(url, digest)
+    prune_cache()
+    return raw, digest, False
+
+
+def read_tables(url, refresh=False, offline=False):
+    """
+    读取发布页面的全部表格（带快照缓存）
+    HTML内容未变化时直接加载已解析的表格，跳过lxml解析
+    """
+    if not cache_enabled():
+        if offline:
+            raise ValueError("缓存已禁用，无法使用离线模式")
+        return pd.read_html(url)
+
+    raw, digest, _ = fetch_html(url, refresh=refresh, offline=offline)
+    tables_path = _tables_path(digest)
+    if os.path.exists(tables_path):
+        try:
+            with open(tables_path, 'rb') as f:
+                tables = pickle.load(f)
+            _touch(tables_path)
+            return tables
+        except Exception:
+            # 缓存损坏或pandas版本不兼容: 重新解析
+            pass
+
+    tables = pd.read_html(io.BytesIO(raw))
+    try:
+        _write_atomic(tables_path, pickle.dumps(tables, protocol=pickle.HIGHEST_PROTOCOL))
+        prune_cache()
+    except OSError as e:
+        print(f"警告: 无法写入表格快照 ({e})")
+    return tables
+
+
+def list_cache_files():
+    """列出缓存文件: [(路径, 大小, mtime)]"""
+    files = []
+    for sub in ('raw', 'tables'):
+        folder = os.path.join(get_snapshot_dir(), sub)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(folder, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, st.st_size, st.st_mtime))
+    return files
+
+
+def prune_cache(max_bytes=None):
+    """按LRU淘汰缓存文件，直到总大小不超过上限；返回删除的文件数"""
+    if max_bytes is None:
+        max_bytes = get_max_bytes()
+    files = sorted(list_cache_files(), key=lambda item: item[2])
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for path, size, _ in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+
+    if removed:
+        with _index_lock:
+            index = load_index()
+            kept = {url: entry for url, entry in index.items()
+                    if os.path.exists(_raw_path(entry['sha256']))}
+            if len(kept) != len(index):
+                payload = json.dumps(kept, ensure_ascii=False, indent=1).encode('utf-8')
+                _write_atomic(_index_path(), payload)
+    return removed
+
+
+def cmd_list(args):
+    index = load_index()
+    files = list_cache_files()
+    total = sum(size for _, size, _ in files)
+    print(f"快照目录: {get_snapshot_dir()}")
+    print(f"已缓存页面: {len(index)} 个，文件 {len(files)} 个，"
+          f"共 {total / 1024 / 1024:.1f}MB（上限 {get_max_bytes() / 1024 / 1024:.0f}MB）")
+    for url, entry in sorted(index.items(), key=lambda item: item[1].get('fetched_at', '')):
+        parsed = '已解析' if os.path.exists(_tables_path(entry['sha256'])) else '未解析'
+        print(f"  {entry.get('fetched_at', '')}  {entry['sha256'][:12]}  {parsed}  {url}")
+
+
+def cmd_prune(args):
+    removed = prune_cache()
+    print(f"已清理 {removed} 个缓存文件")
+
+
+def cmd_clear(args):
+    removed = prune_cache(max_bytes=0)
+    print(f"已删除 {removed} 个缓存文件")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='70城房价发布页面快照缓存')
+    subparsers = parser.add_subparsers(dest='command', help='子命令')
+    subparsers.add_parser('list', help='列出已缓存的页面').set_defaults(func=cmd_list)
+    subparsers.add_parser('prune', help='按大小上限清理缓存').set_defaults(func=cmd_prune)
+    subparsers.add_parser('clear', help='清空缓存').set_defaults(func=cmd_clear)
+    args = parser.parse_args()
+
+    if args.command is None:
+        parser.print_help()
+        return 0
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
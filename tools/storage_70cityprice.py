@@ -0,0 +1,861 @@
+# -*- coding: utf-8 -*-
+"""
+70城房价数据存储层
+在 70cityprice.csv 旁维护一份列式二进制缓存，供各工具脚本共享
+
+缓存格式:
+    <CSV所在目录>/.cache/<CSV文件名>.arrays-<SHA256前16位>/  列式数据目录，每个数组一个 .npy 文件
+                                                          （每列 = <列名>.values 字典值 + <列名>.codes 整数编码）
+    <CSV所在目录>/.cache/<CSV文件名>.meta.json            缓存键（文件大小、mtime、内容哈希、追加分段、数组目录名）
+
+数组以 numpy.memmap 只读映射: 加载是常数时间的映射而不是解析，
+多个进程同时读取时共享操作系统的页缓存，只有实际访问的页才会读入内存。
+数组目录按内容哈希命名，写入时先写临时目录再整体改名，旧目录在缓存键切换后清理。
+
+读取流程:
+    1. 文件大小与mtime均未变化 -> 直接加载缓存
+    2. mtime变化但内容SHA256未变（如 git checkout） -> 刷新缓存键后加载缓存
+    3. 内容已变化或缓存损坏 -> 重新解析CSV并重建缓存
+
+每列按字典编码存储（去重后的字符串 + int16/int32编码，-1表示空值），
+还原后与 pd.read_csv(csv_path, dtype=str) 的结果一致。
+设置环境变量 CITYPRICE_NO_CACHE=1 可禁用缓存。
+缓存键文件同时记录月份列表与城市列表，read_summary 可在不导入pandas的情况下直接读取。
+
+追加写入（append_dataset）只把新增行写到CSV末尾，并将新增行合并进已有缓存，
+写入成本只与新增行数相关；追加后的文件不再保持规范排序，需要时可重写整理。
+内容哈希按追加分段链式计算: 未经追加的文件即整个文件的SHA256，每次追加为 sha256(上一哈希 + 新增字节)，
+缓存键的 segments 记录各段结束位置，追加时只需读取新增部分。新增月份晚于已有数据时（按月发布的常规情况），
+各列编码与月份索引直接在原数组文件末尾追加，字典值与按分组排列的城市/指数类型索引合并后重写，
+数组目录随后改名为新的内容哈希；否则整体重写缓存。
+
+缓存中同时保存主键 (DATE, CITY, FixedBase) 的索引（__index__.* 数组）:
+    row_month                每行的整数月份键（年*12 + 月-1，无法解析为 -1）
+    month_order / month_keys 按 (月份, 城市, 指数类型) 排序的行号及对应月份键，月份区间查询用二分查找
+    city_order / city_offsets        按城市分组的行号及分组偏移表（CSR）
+    fixedbase_order / fixedbase_offsets 按指数类型分组的行号及分组偏移表
+偏移表按 编码+1 分组（第0组为空值），第 c 个字典值的行号为 order[offsets[c+1]:offsets[c+2]]。
+
+类型化读取（load_typed_dataset）直接由字典编码构造紧凑的DataFrame:
+DATE/ADCODE/CITY/FixedBase 为 category，12个指数列为 float32（空值为NaN），另附 int32 月份键列 MONTH_KEY；
+数值只对去重后的字符串转换一次。write_typed_dataset 将其按规范格式（如 103.5、100.0）写回 QUOTE_ALL CSV。
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+
+# pandas 在首次需要时才导入，使只读取缓存元数据的调用（read_summary）保持轻量
+CSV_COLUMNS = [
+    'DATE', 'ADCODE', 'CITY', 'FixedBase', 'HouseIDX', 'ResidentIDX',
+    'CommodityHouseIDX', 'SecondHandIDX', 'ResidentBelow90IDX',
+    'CommonResidentBelow90IDX', 'CommodityBelow90IDX', 'Commodity144IDX',
+    'CommodityAbove144IDX', 'SecondHandBelow90IDX', 'SecondHand144IDX',
+    'SecondHandAbove144IDX'
+]
+
+NUMERIC_COLUMNS = CSV_COLUMNS[4:]
+CATEGORY_COLUMNS = ['DATE', 'ADCODE', 'CITY', 'FixedBase']
+MONTH_KEY_COLUMN = 'MONTH_KEY'
+
+CACHE_DIR_NAME = '.cache'
+CACHE_FORMAT_VERSION = 3
+ARRAYS_DIR_SUFFIX = '.arrays'
+NO_CACHE_ENV = 'CITYPRICE_NO_CACHE'
+INDEX_PREFIX = '__index__.'
+INDEX_GROUP_COLUMNS = {'city': 'CITY', 'fixedbase': 'FixedBase'}
+
+
+def string_dtype():
+    """read_csv(dtype=str) 得到的列类型（pandas 3 为 str，之前版本为 object）"""
+    import pandas as pd
+    return pd.Series([], dtype=str).dtype
+
+
+def get_cache_dir(csv_path):
+    """获取缓存目录（CSV所在目录下的 .cache/）"""
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME)
+
+
+def get_sidecar_path(csv_path, suffix):
+    """获取CSV对应的旁路文件路径，例如 .cache/70cityprice.csv.meta.json"""
+    return os.path.join(get_cache_dir(csv_path), os.path.basename(csv_path) + suffix)
+
+
+def cache_enabled():
+    """是否启用缓存"""
+    return os.environ.get(NO_CACHE_ENV, '').strip() not in ('1', 'true', 'yes')
+
+
+def file_stat_key(csv_path):
+    """文件大小与mtime（纳秒），用于快速判断文件是否变化"""
+    st = os.stat(csv_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def file_content_hash(csv_path, segments=None):
+    """
+    计算文件内容哈希
+    未经追加的文件为整个文件的SHA256；segments 为追加写入形成的各段结束位置，
+    按段链式计算（见 extend_content_hash），与逐次追加时增量得到的哈希一致
+    """
+    boundaries = list(segments[:-1]) if segments else []
+    digest = hashlib.sha256()
+    position = 0
+    with open(csv_path, 'rb') as f:
+        for boundary in boundaries + [None]:
+            while boundary is None or position < boundary:
+                size = 1 << 20 if boundary is None else min(1 << 20, boundary - position)
+                block = f.read(size)
+                if not block:
+                    break
+                digest.update(block)
+                position += len(block)
+            if boundary is not None:
+                digest = hashlib.sha256(digest.hexdigest().encode('ascii'))
+    return digest.hexdigest()
+
+
+def extend_content_hash(content_hash, tail):
+    """追加写入后的内容哈希: sha256(上一哈希 + 新增字节)，只需读取新增部分"""
+    return hashlib.sha256(content_hash.encode('ascii') + tail).hexdigest()
+
+
+def _write_json(path, payload):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_sidecar_json(csv_path, suffix):
+    """读取CSV旁路JSON文件（如 .validate.json），不存在或损坏时返回None"""
+    return _read_json(get_sidecar_path(csv_path, suffix))
+
+
+def write_sidecar_json(csv_path, suffix, payload):
+    """原子写入CSV旁路JSON文件"""
+    os.makedirs(get_cache_dir(csv_path), exist_ok=True)
+    _write_json(get_sidecar_path(csv_path, suffix), payload)
+
+
+def encode_frame(df):
+    """
+    将字符串DataFrame按列做字典编码
+    返回: dict{数组名: ndarray}，每列生成 <列名>.values 与 <列名>.codes 两个数组
+    """
+    import pandas as pd
+    arrays = {}
+    for column in df.columns:
+        codes, uniques = pd.factorize(df[column])
+        values = np.asarray([str(v) for v in uniques], dtype=str)
+        code_dtype = np.int16 if len(values) < np.iinfo(np.int16).max else np.int32
+        arrays[f'{column}.values'] = values
+        arrays[f'{column}.codes'] = codes.astype(code_dtype)
+    return arrays
+
+
+def decode_column(values, codes):
+    """还原单列: 编码 -1 对应空值(NaN)"""
+    lookup = np.empty(len(values) + 1, dtype=object)
+    lookup[:len(values)] = values.tolist()
+    lookup[len(values)] = np.nan
+    return lookup[codes]
+
+
+def decode_frame(arrays, columns):
+    """将字典编码的数组还原为与 read_csv(dtype=str) 一致的DataFrame"""
+    import pandas as pd
+    dtype = string_dtype()
+    data = {}
+    for column in columns:
+        values = decode_column(arrays[f'{column}.values'], arrays[f'{column}.codes'])
+        if dtype != object:
+            values = pd.Series(values, dtype=dtype)
+        data[column] = values
+    return pd.DataFrame(data, columns=columns)
+
+
+def parse_month_key(date_str):
+    """'YYYY/M/D' -> 整数月份键（年*12 + 月-1），无法解析时返回 -1"""
+    try:
+        parts = str(date_str).split('/')
+        year = int(parts[0])
+        month = int(parts[1])
+    except (ValueError, IndexError):
+        return -1
+    if not 1 <= month <= 12:
+        return -1
+    return year * 12 + (month - 1)
+
+
+def _group_offsets(codes, n_values):
+    """按 编码+1 统计分组偏移（第0组为空值）"""
+    counts = np.bincount(codes.astype(np.int64) + 1, minlength=n_values + 1)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def build_index(arrays):
+    """
+    由字典编码数组构建主键 (DATE, CITY, FixedBase) 索引
+    返回: dict{索引数组名: ndarray}，缺少主键列时返回空dict
+    """
+    try:
+        date_values = arrays['DATE.values']
+        date_codes = arrays['DATE.codes'].astype(np.int64)
+        city_codes = arrays['CITY.codes'].astype(np.int64)
+        fb_codes = arrays['FixedBase.codes'].astype(np.int64)
+    except KeyError:
+        return {}
+
+    # 月份键只对去重后的日期字符串解析一次，末位对应空值
+    date_keys = np.full(len(date_values) + 1, -1, dtype=np.int32)
+    for idx, date_str in enumerate(date_values.tolist()):
+        date_keys[idx] = parse_month_key(date_str)
+    row_month = date_keys[date_codes]
+
+    position_dtype = np.int32 if len(row_month) < np.iinfo(np.int32).max else np.int64
+    month_order = np.lexsort((fb_codes, city_codes, row_month))
+    city_order = np.lexsort((fb_codes, row_month, city_codes))
+    fb_order = np.lexsort((city_codes, row_month, fb_codes))
+    return {
+        f'{INDEX_PREFIX}row_month': row_month,
+        f'{INDEX_PREFIX}month_order': month_order.astype(position_dtype),
+        f'{INDEX_PREFIX}month_keys': row_month[month_order],
+        f'{INDEX_PREFIX}city_order': city_order.astype(position_dtype),
+        f'{INDEX_PREFIX}city_offsets': _group_offsets(city_codes, len(arrays['CITY.values'])),
+        f'{INDEX_PREFIX}fixedbase_order': fb_order.astype(position_dtype),
+        f'{INDEX_PREFIX}fixedbase_offsets': _group_offsets(fb_codes, len(arrays['FixedBase.values'])),
+    }
+
+
+def _index_from_arrays(arrays, index_arrays):
+    """整理为对外使用的索引dict（附带分组列的字典值）"""
+    if not index_arrays:
+        return None
+    index = {name[len(INDEX_PREFIX):]: array for name, array in index_arrays.items()}
+    index['rows'] = len(index['row_month'])
+    for group, column in INDEX_GROUP_COLUMNS.items():
+        index[f'{group}_values'] = arrays[f'{column}.values']
+    return index
+
+
+def select_month_range(index, start_key, end_key):
+    """索引查询: 月份键在 [start_key, end_key] 内的行号（按行号升序）"""
+    keys = index['month_keys']
+    lo = np.searchsorted(keys, start_key, side='left')
+    hi = np.searchsorted(keys, end_key, side='right')
+    return np.sort(index['month_order'][lo:hi])
+
+
+def select_groups(index, group, value_codes):
+    """索引查询: 分组列（city / fixedbase）取指定字典编码的行号（按行号升序）"""
+    order = index[f'{group}_order']
+    offsets = index[f'{group}_offsets']
+    parts = [order[offsets[code + 1]:offsets[code + 2]] for code in value_codes]
+    if not parts:
+        return np.empty(0, dtype=order.dtype)
+    return np.sort(np.concatenate(parts))
+
+
+def _summarize(arrays):
+    """从编码数组汇总月份键列表与城市列表（写入缓存键文件）"""
+    summary = {}
+    row_month = arrays.get(f'{INDEX_PREFIX}row_month')
+    if row_month is not None:
+        summary['months'] = [int(k) for k in np.unique(row_month) if k >= 0]
+    if 'CITY.codes' in arrays:
+        present = np.unique(arrays['CITY.codes'])
+        values = arrays['CITY.values']
+        summary['cities'] = sorted(str(values[code]) for code in present if code >= 0)
+    return summary
+
+
+def read_summary(csv_path):
+    """
+    读取缓存键文件中的汇总信息（不导入pandas）
+    返回: {'rows', 'months'（月份键列表）, 'cities'}；缓存禁用、缺失或与CSV不一致时返回None
+    """
+    if not cache_enabled():
+        return None
+    meta = read_cache_meta(csv_path)
+    if meta is None or 'months' not in meta or 'cities' not in meta:
+        return None
+    try:
+        stat_key = file_stat_key(csv_path)
+    except OSError:
+        return None
+    if meta.get('size') != stat_key['size'] or meta.get('mtime_ns') != stat_key['mtime_ns']:
+        return None
+    return {'rows': meta['rows'], 'months': meta['months'], 'cities': meta['cities']}
+
+
+def source_sha(csv_path):
+    """缓存键记录的CSV内容哈希（缓存键与当前文件大小、mtime一致时），否则返回None；供派生缓存判断是否过期"""
+    meta = read_cache_meta(csv_path)
+    if meta is None:
+        return None
+    try:
+        stat_key = file_stat_key(csv_path)
+    except OSError:
+        return None
+    if meta.get('size') != stat_key['size'] or meta.get('mtime_ns') != stat_key['mtime_ns']:
+        return None
+    return meta.get('sha256')
+
+
+def get_arrays_dir(csv_path, content_hash):
+    """数组目录路径: .cache/<CSV文件名>.arrays-<SHA256前16位>"""
+    return get_sidecar_path(csv_path, f'{ARRAYS_DIR_SUFFIX}-{content_hash[:16]}')
+
+
+def _write_arrays_dir(path, arrays):
+    """每个数组写一个 .npy 文件（先写临时目录再整体改名；同名目录已存在时说明其他进程已写入相同内容）"""
+    if os.path.isdir(path):
+        return
+    tmp_dir = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+        os.rename(tmp_dir, path)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+
+def _remove_stale_arrays(csv_path, keep_dir):
+    """清理旧的数组目录（正在使用旧目录的进程已映射的数据不受影响；无法删除时忽略）"""
+    cache_dir = get_cache_dir(csv_path)
+    prefix = os.path.basename(csv_path) + ARRAYS_DIR_SUFFIX + '-'
+    legacy_npz = get_sidecar_path(csv_path, '.npz')
+    if os.path.exists(legacy_npz):
+        try:
+            os.remove(legacy_npz)
+        except OSError:
+            pass
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name != keep_dir and not name.endswith('.tmp'):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def _save_encoded(csv_path, arrays, columns, rows, stat_key=None, content_hash=None,
+                  index_arrays=None, segments=None):
+    """写入数组目录（含主键索引）与缓存键（缓存键最后原子替换，支持多进程并发）"""
+    cache_dir = get_cache_dir(csv_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    if stat_key is None:
+        stat_key = file_stat_key(csv_path)
+        content_hash = file_content_hash(csv_path)
+        segments = None
+    arrays = dict(arrays)
+    if index_arrays is None:
+        index_arrays = build_index(arrays)
+    arrays.update(index_arrays)
+    arrays['__columns__'] = np.asarray(list(columns), dtype=str)
+    arrays['__sha256__'] = np.asarray([content_hash], dtype=str)
+
+    arrays_dir = get_arrays_dir(csv_path, content_hash)
+    _write_arrays_dir(arrays_dir, arrays)
+
+    meta = {
+        'version': CACHE_FORMAT_VERSION,
+        'sha256': content_hash,
+        'rows': int(rows),
+        'arrays': os.path.basename(arrays_dir),
+        **stat_key,
+        'segments': list(segments or [stat_key['size']]),
+        **_summarize(arrays),
+    }
+    _write_json(get_sidecar_path(csv_path, '.meta.json'), meta)
+    _remove_stale_arrays(csv_path, meta['arrays'])
+    return meta
+
+
+def _map_array(path):
+    """只读映射单个 .npy（空数组无法映射，直接读取）"""
+    try:
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    except ValueError:
+        return np.load(path, allow_pickle=False)
+
+
+def _load_cache_arrays(csv_path, meta, columns=None, with_index=False):
+    """映射数组目录中的数组（可只取指定列及主键索引），校验内容哈希与缓存键一致"""
+    arrays_dir = os.path.join(get_cache_dir(csv_path), os.path.basename(str(meta.get('arrays', ''))))
+    try:
+        sha = np.load(os.path.join(arrays_dir, '__sha256__.npy'), allow_pickle=False)
+        if len(sha) != 1 or str(sha[0]) != meta.get('sha256'):
+            return None
+        all_columns = np.load(os.path.join(arrays_dir, '__columns__.npy'), allow_pickle=False).tolist()
+        wanted = all_columns if columns is None else list(columns)
+        names = []
+        for column in wanted:
+            names += [f'{column}.values', f'{column}.codes']
+        if with_index:
+            names += [f'{c}.values' for c in INDEX_GROUP_COLUMNS.values()]
+            names += sorted(f[:-len('.npy')] for f in os.listdir(arrays_dir)
+                            if f.startswith(INDEX_PREFIX) and f.endswith('.npy'))
+        arrays = {'__columns__': np.asarray(wanted, dtype=str)}
+        for name in names:
+            if name not in arrays:
+                arrays[name] = _map_array(os.path.join(arrays_dir, f'{name}.npy'))
+    except (OSError, ValueError):
+        return None
+    return arrays
+
+
+def read_cache_meta(csv_path):
+    """读取缓存键，格式版本不符时返回None"""
+    meta = _read_json(get_sidecar_path(csv_path, '.meta.json'))
+    if not meta or meta.get('version') != CACHE_FORMAT_VERSION:
+        return None
+    return meta
+
+
+def _build_cache(csv_path):
+    """解析CSV并重建缓存，返回 (字符串DataFrame, 编码数组含索引)"""
+    # 先记录缓存键再解析: 解析期间文件若被改写，下次读取会因哈希不符而重建
+    stat_key = file_stat_key(csv_path)
+    content_hash = file_content_hash(csv_path)
+    import pandas as pd
+    df = pd.read_csv(csv_path, dtype=str)
+    arrays = encode_frame(df)
+    index_arrays = build_index(arrays)
+    if cache_enabled():
+        try:
+            _save_encoded(csv_path, arrays, df.columns, len(df), stat_key, content_hash,
+                          index_arrays=index_arrays)
+        except OSError as e:
+            print(f"警告: 无法写入缓存 ({e})，本次直接读取CSV")
+    arrays.update(index_arrays)
+    return df, arrays
+
+
+def build_cache(csv_path):
+    """解析CSV并重建缓存，返回字符串DataFrame"""
+    return _build_cache(csv_path)[0]
+
+
+def _load_valid_arrays(csv_path, columns=None, with_index=False):
+    """返回与当前CSV内容一致的缓存数组，缓存失效时返回None"""
+    meta = read_cache_meta(csv_path)
+    if meta is None:
+        return None
+
+    stat_key = file_stat_key(csv_path)
+    if meta.get('size') == stat_key['size'] and meta.get('mtime_ns') == stat_key['mtime_ns']:
+        return _load_cache_arrays(csv_path, meta, columns, with_index)
+
+    # mtime或大小变化: 以内容哈希为准
+    if meta.get('size') != stat_key['size']:
+        return None
+    if file_content_hash(csv_path, meta.get('segments')) != meta.get('sha256'):
+        return None
+    arrays = _load_cache_arrays(csv_path, meta, columns, with_index)
+    if arrays is not None:
+        try:
+            _write_json(get_sidecar_path(csv_path, '.meta.json'), {**meta, **stat_key})
+        except OSError:
+            pass
+    return arrays
+
+
+def load_dataset(csv_path, columns=None, with_index=False):
+    """
+    加载数据集（所有列为字符串，与 pd.read_csv(csv_path, dtype=str) 一致）
+
+    参数:
+        columns: 只还原指定列（默认全部列）
+        with_index: 同时返回主键索引，返回值为 (df, index)；
+                    index 的行号对应返回的 df 的行位置（见 select_month_range / select_groups）
+    """
+    import pandas as pd
+    if not cache_enabled():
+        df = pd.read_csv(csv_path, dtype=str)
+        if with_index:
+            arrays = encode_frame(df[list(INDEX_GROUP_COLUMNS.values()) + ['DATE']])
+            index = _index_from_arrays(arrays, build_index(arrays))
+        df = df[columns] if columns is not None else df
+        return (df, index) if with_index else df
+
+    arrays = _load_valid_arrays(csv_path, columns, with_index)
+    if arrays is None:
+        df, arrays = _build_cache(csv_path)
+        df = df[columns] if columns is not None else df
+    else:
+        df = decode_frame(arrays, arrays['__columns__'].tolist())
+
+    if not with_index:
+        return df
+    index_arrays = {name: array for name, array in arrays.items() if name.startswith(INDEX_PREFIX)}
+    return df, _index_from_arrays(arrays, index_arrays)
+
+
+def load_encoded(csv_path, columns=None, with_index=False):
+    """
+    读取字典编码数组（缓存失效时重建，禁用缓存时直接编码CSV）
+    缓存有效时各数组为只读 np.memmap: 读取是常数时间的映射，多进程共享页缓存
+
+    参数:
+        columns: 只取指定列（默认全部列）
+        with_index: 同时包含主键索引数组（__index__.*，可用 encoded_index 整理）
+    返回: dict{数组名: ndarray}，含 __columns__ 与每列的 <列名>.values / <列名>.codes
+    """
+    if not cache_enabled():
+        import pandas as pd
+        df = pd.read_csv(csv_path, dtype=str)
+        arrays = encode_frame(df)
+        if with_index:
+            arrays.update(build_index(arrays))
+        if columns is not None:
+            keep = {f'{c}.{part}' for c in columns for part in ('values', 'codes')}
+            if with_index:
+                keep |= {f'{c}.values' for c in INDEX_GROUP_COLUMNS.values()}
+            arrays = {name: array for name, array in arrays.items()
+                      if name in keep or name.startswith(INDEX_PREFIX)}
+        arrays['__columns__'] = np.asarray(list(columns) if columns is not None else list(df.columns), dtype=str)
+        return arrays
+
+    arrays = _load_valid_arrays(csv_path, columns, with_index)
+    if arrays is None:
+        df, arrays = _build_cache(csv_path)
+        arrays['__columns__'] = np.asarray(list(columns) if columns is not None else list(df.columns), dtype=str)
+    return arrays
+
+
+def encoded_index(arrays):
+    """load_encoded(with_index=True) 的数组 -> 主键索引dict（同 load_dataset(with_index=True)），缺少索引时返回None"""
+    return _index_from_arrays(arrays, {name: array for name, array in arrays.items() if name.startswith(INDEX_PREFIX)})
+
+
+def decode_rows(arrays, positions, columns=None):
+    """只还原指定行（行号数组）的字符串DataFrame"""
+    if columns is None:
+        columns = arrays['__columns__'].tolist()
+    subset = {}
+    for column in columns:
+        subset[f'{column}.values'] = arrays[f'{column}.values']
+        subset[f'{column}.codes'] = arrays[f'{column}.codes'][positions]
+    return decode_frame(subset, columns)
+
+
+def format_index_values(values):
+    """数值 -> 规范字符串（float32最短表示，至少保留一位小数，如 103.5 / 100.0）"""
+    return [np.format_float_positional(np.float32(v), trim='0') for v in values]
+
+
+def _typed_numeric_column(column, values, codes):
+    """字典值转换为float32后按编码展开；写法不规范或非数值的值给出提示"""
+    import pandas as pd
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float32)
+    valid = ~np.isnan(numbers)
+    canonical = np.asarray(format_index_values(numbers[valid]), dtype=str)
+    mismatched = int((~valid).sum() + (canonical != values[valid]).sum())
+    if mismatched:
+        print(f"警告: 列{column}有{mismatched}个取值不是规范数值写法，类型化读取后写回时将按规范格式输出")
+    lookup = np.append(numbers, np.float32(np.nan))
+    return lookup[codes]
+
+
+def load_typed_dataset(csv_path, columns=None):
+    """
+    加载类型化数据集: 类别列为 category，指数列为 float32，DATE 存在时附加 int32 月份键列 MONTH_KEY
+
+    参数:
+        columns: 只加载指定列（默认全部列）
+    """
+    import pandas as pd
+    arrays = load_encoded(csv_path, columns)
+    columns = arrays['__columns__'].tolist()
+
+    data = {}
+    for column in columns:
+        values = arrays[f'{column}.values']
+        codes = arrays[f'{column}.codes'].astype(np.int64)
+        if column in NUMERIC_COLUMNS:
+            data[column] = _typed_numeric_column(column, values, codes)
+        else:
+            data[column] = pd.Categorical.from_codes(codes, categories=pd.Index(values.tolist(), dtype=object))
+
+    df = pd.DataFrame(data, columns=columns)
+    if 'DATE' in columns:
+        date_keys = np.full(len(arrays['DATE.values']) + 1, -1, dtype=np.int32)
+        for idx, date_str in enumerate(arrays['DATE.values'].tolist()):
+            date_keys[idx] = parse_month_key(date_str)
+        df[MONTH_KEY_COLUMN] = date_keys[arrays['DATE.codes'].astype(np.int64)]
+    return df
+
+
+def to_string_frame(df):
+    """类型化DataFrame -> 与 read_csv(dtype=str) 一致的字符串DataFrame（去掉月份键列）"""
+    import pandas as pd
+    dtype = string_dtype()
+    data = {}
+    columns = [c for c in df.columns if c != MONTH_KEY_COLUMN]
+    for column in columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = np.asarray([str(v) for v in series.cat.categories], dtype=str)
+            codes = series.cat.codes.to_numpy()
+        elif pd.api.types.is_float_dtype(series.dtype):
+            codes, uniques = pd.factorize(series)
+            values = np.asarray(format_index_values(uniques), dtype=str)
+        else:
+            data[column] = series.to_numpy()
+            continue
+        decoded = decode_column(values, codes)
+        data[column] = pd.Series(decoded, dtype=dtype) if dtype != object else decoded
+    return pd.DataFrame(data, columns=columns)
+
+
+def write_typed_dataset(df, csv_path):
+    """将类型化数据集写回CSV（QUOTE_ALL），并同步刷新缓存"""
+    write_dataset(to_string_frame(df), csv_path)
+
+
+def write_dataset(df, csv_path):
+    """
+    保存数据集到CSV（QUOTE_ALL，与原始格式一致），并同步刷新缓存
+    """
+    df.to_csv(csv_path, index=False, quoting=1)  # quoting=1 是 csv.QUOTE_ALL
+    if cache_enabled():
+        build_cache(csv_path)
+
+
+def _merge_dictionary(old_values, seg_values, seg_codes):
+    """
+    将追加段的字典并入已有字典（新值按出现顺序排在末尾，与整体编码一致）
+    返回: (合并后的字典值列表, 追加段按新字典的编码 int64)
+    """
+    lookup = {value: idx for idx, value in enumerate(old_values.tolist())}
+    values = old_values.tolist()
+    remap = np.empty(len(seg_values), dtype=np.int64)
+    for idx, value in enumerate(seg_values.tolist()):
+        if value not in lookup:
+            lookup[value] = len(values)
+            values.append(value)
+        remap[idx] = lookup[value]
+    seg_codes = np.asarray(seg_codes, dtype=np.int64)
+    new_codes = np.where(seg_codes >= 0, remap[np.maximum(seg_codes, 0)], -1) if len(remap) else seg_codes
+    return values, new_codes
+
+
+def _code_dtype(n_values):
+    return np.int16 if n_values < np.iinfo(np.int16).max else np.int32
+
+
+def _merge_encoded(arrays, segment_arrays, columns):
+    """将追加段的字典编码合并到已有缓存数组中"""
+    merged = {}
+    for column in columns:
+        values, new_codes = _merge_dictionary(arrays[f'{column}.values'], segment_arrays[f'{column}.values'],
+                                              segment_arrays[f'{column}.codes'])
+        codes = np.concatenate([arrays[f'{column}.codes'].astype(np.int64), new_codes])
+        merged[f'{column}.values'] = np.asarray(values, dtype=str)
+        merged[f'{column}.codes'] = codes.astype(_code_dtype(len(values)))
+    return merged
+
+
+def _merge_groups(order, offsets, codes, n_values, sort_keys, first_row):
+    """
+    把新增行插入按分组排列的行号表（CSR，见 build_index）
+    新增行的月份晚于已有数据时，各组内的已有行仍在前，新增行按 sort_keys 排在组末；
+    只做一次线性插入，不重新排序已有行
+    """
+    seg_order = np.lexsort(tuple(sort_keys) + (codes,))
+    extended = np.concatenate([offsets, np.full(n_values + 2 - len(offsets), offsets[-1])])
+    insert_at = extended[codes[seg_order] + 2]
+    new_order = np.insert(np.asarray(order), insert_at, (seg_order + first_row).astype(order.dtype))
+    counts = np.bincount(codes + 1, minlength=n_values + 1)
+    new_offsets = extended + np.concatenate([[0], np.cumsum(counts)])
+    return new_order, new_offsets.astype(np.int64)
+
+
+def _append_npy(path, tail):
+    """
+    在一维 .npy 文件末尾追加元素，只改写文件头中的形状
+    dtype 不一致或文件头长度会变化时返回False（由调用方整体重写）
+    """
+    tail = np.ascontiguousarray(tail)
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        header_length = f.tell()
+        if len(shape) != 1 or fortran_order or dtype != tail.dtype:
+            return False
+        header = io.BytesIO()
+        fields = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                  'shape': (shape[0] + len(tail),)}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(header, fields)
+        else:
+            np.lib.format.write_array_header_2_0(header, fields)
+        if len(header.getvalue()) != header_length:
+            return False
+        # 先写数据再写文件头: 中途失败时文件头仍是旧形状
+        f.seek(0, os.SEEK_END)
+        f.write(tail.tobytes())
+        f.flush()
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+
+def _rewrite_npy(path, array):
+    """整体重写单个 .npy（先写临时文件再替换，已映射旧文件的进程不受影响）"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _append_cache_arrays(csv_path, meta, arrays, segment_arrays, columns, content_hash, stat_key, segments):
+    """
+    原地追加缓存: 各列编码、row_month 与月份索引追加到原数组文件末尾，字典值与城市/指数类型分组索引合并后重写，
+    最后把数组目录改名为新的内容哈希并写入缓存键
+    只处理新增月份都晚于已有数据的常规追加；其他情况返回None，由调用方整体重写
+    返回: 追加后的总行数
+    """
+    month_order_name = f'{INDEX_PREFIX}month_order'
+    if month_order_name not in arrays or 'DATE.codes' not in arrays:
+        return None
+    old_rows = int(meta['rows'])
+    n_new = len(segment_arrays[f'{columns[0]}.codes'])
+    position_dtype = arrays[month_order_name].dtype
+    if old_rows + n_new >= np.iinfo(position_dtype).max:
+        return None
+
+    rewrites = {}
+    appends = {}
+    new_values = {}
+    new_codes = {}
+    for column in columns:
+        old_values = arrays[f'{column}.values']
+        old_codes = arrays[f'{column}.codes']
+        values, codes = _merge_dictionary(old_values, segment_arrays[f'{column}.values'],
+                                          segment_arrays[f'{column}.codes'])
+        if _code_dtype(len(values)) != old_codes.dtype:
+            return None
+        if len(values) != len(old_values):
+            rewrites[f'{column}.values'] = np.asarray(values, dtype=str)
+        appends[f'{column}.codes'] = codes.astype(old_codes.dtype)
+        new_values[column] = values
+        new_codes[column] = codes
+
+    # 新增行的月份键（只解析追加段的日期字典）
+    seg_dates = segment_arrays['DATE.values'].tolist()
+    seg_keys = np.array([parse_month_key(v) for v in seg_dates] + [-1], dtype=np.int32)
+    row_month = seg_keys[segment_arrays['DATE.codes'].astype(np.int64)]
+    known_months = meta.get('months') or []
+    if n_new and ((row_month < 0).any() or (known_months and row_month.min() <= known_months[-1])):
+        return None
+
+    city_codes = new_codes['CITY']
+    fb_codes = new_codes['FixedBase']
+    month_order = np.lexsort((fb_codes, city_codes, row_month))
+    appends[f'{INDEX_PREFIX}row_month'] = row_month
+    appends[month_order_name] = (month_order + old_rows).astype(position_dtype)
+    appends[f'{INDEX_PREFIX}month_keys'] = row_month[month_order]
+    for group, codes, sort_keys in (('city', city_codes, (fb_codes, row_month)),
+                                    ('fixedbase', fb_codes, (city_codes, row_month))):
+        column = INDEX_GROUP_COLUMNS[group]
+        order, offsets = _merge_groups(arrays[f'{INDEX_PREFIX}{group}_order'],
+                                       arrays[f'{INDEX_PREFIX}{group}_offsets'],
+                                       codes, len(new_values[column]), sort_keys, old_rows)
+        rewrites[f'{INDEX_PREFIX}{group}_order'] = order
+        rewrites[f'{INDEX_PREFIX}{group}_offsets'] = offsets
+
+    # 字典值先于编码写入: 正在读取的进程不会遇到超出字典范围的编码
+    arrays_dir = os.path.join(get_cache_dir(csv_path), os.path.basename(str(meta['arrays'])))
+    for name, array in rewrites.items():
+        _rewrite_npy(os.path.join(arrays_dir, f'{name}.npy'), array)
+    for name, tail in appends.items():
+        path = os.path.join(arrays_dir, f'{name}.npy')
+        if not _append_npy(path, tail):
+            _rewrite_npy(path, np.concatenate([np.asarray(arrays[name]), tail]))
+    _rewrite_npy(os.path.join(arrays_dir, '__sha256__.npy'), np.asarray([content_hash], dtype=str))
+
+    new_dir = get_arrays_dir(csv_path, content_hash)
+    if os.path.abspath(new_dir) != os.path.abspath(arrays_dir):
+        shutil.rmtree(new_dir, ignore_errors=True)
+        os.rename(arrays_dir, new_dir)
+
+    seg_cities = [new_values['CITY'][code] for code in np.unique(city_codes) if code >= 0]
+    new_meta = {
+        'version': CACHE_FORMAT_VERSION,
+        'sha256': content_hash,
+        'rows': old_rows + n_new,
+        'arrays': os.path.basename(new_dir),
+        **stat_key,
+        'segments': list(segments),
+        'months': known_months + [int(k) for k in np.unique(row_month)],
+        'cities': sorted(set(meta.get('cities') or []) | set(seg_cities)),
+    }
+    _write_json(get_sidecar_path(csv_path, '.meta.json'), new_meta)
+    _remove_stale_arrays(csv_path, new_meta['arrays'])
+    return new_meta['rows']
+
+
+def append_dataset(df, csv_path):
+    """
+    将新增行追加到CSV末尾（QUOTE_ALL，不写表头），并把新增行合并进缓存
+
+    缓存有效时只解析、哈希新增的行，并在原数组文件末尾追加（见模块说明）；
+    缓存失效时不做处理，下次读取时自动重建。
+    返回: 追加后的总行数（缓存无效时返回None）
+    """
+    columns = list(df.columns)
+    arrays = _load_valid_arrays(csv_path, with_index=True) if cache_enabled() else None
+    if arrays is not None and arrays['__columns__'].tolist() != columns:
+        arrays = None
+    meta = read_cache_meta(csv_path) if arrays is not None else None
+
+    text = df.to_csv(index=False, header=False, quoting=1)
+    with open(csv_path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                text = '\n' + text
+        tail = text.encode('utf-8')
+        f.write(tail)
+
+    if arrays is None or meta is None:
+        return None
+
+    import pandas as pd
+    segment = pd.read_csv(io.StringIO(text), dtype=str, header=None, names=columns)
+    segment_arrays = encode_frame(segment)
+    stat_key = file_stat_key(csv_path)
+    content_hash = extend_content_hash(meta['sha256'], tail)
+    segments = list(meta.get('segments') or [meta['size']]) + [stat_key['size']]
+    try:
+        total_rows = _append_cache_arrays(csv_path, meta, arrays, segment_arrays, columns, content_hash,
+                                          stat_key, segments)
+        if total_rows is None:
+            merged = _merge_encoded(arrays, segment_arrays, columns)
+            total_rows = len(merged[f'{columns[0]}.codes'])
+            _save_encoded(csv_path, merged, columns, total_rows, stat_key, content_hash, segments=segments)
+    except OSError as e:
+        print(f"警告: 无法写入缓存 ({e})，下次读取时将重建")
+        return None
+    return total_rows
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+70城房价多分辨率数据切片（供网页前端缩放浏览）
+按 城市 × 指数列 预先计算月度、季度、年度三级数据，季度和年度给出均值及最低/最高包络，
+前端先加载年度概览，放大时再按需加载季度、月度切片，无需读取完整CSV或向服务器请求原始行
+
+数据来源与 generate_chart 相同: 内存映射的 城市×月份×序列 三维数组（cube_70cityprice）
+
+输出目录结构:
+    index.json                      切片说明: 分辨率、各级的期间标签、城市（名称与ADCODE）、指数列、
+                                    指数类型、统计量、首尾不完整期间与各指数列有数据的城市
+    <分辨率>/<ADCODE>_<指数列>.bin   二进制切片: 小端 float32，形状 (指数类型, 期间, 统计量)，缺失为NaN；
+                                    浏览器端 new Float32Array(await (await fetch(url)).arrayBuffer())
+    <分辨率>/<ADCODE>_<指数列>.json  JSON切片: {"同比": {"mean": [...], "min": [...], "max": [...]}, ...}，缺失为null
+    分辨率: month（统计量 value）、quarter 与 year（统计量 mean / min / max / count）
+    count 为期内有数据的月份数，区间首尾只覆盖部分月份的期间（如 --start 201103 时的2011Q1、
+    尚未结束的当年）在 index.json 的 partial 中列出，其均值与包络只代表已有月份
+    全部为空的切片不输出；内容未变化的文件不重写，增量更新后只有新数据涉及的切片会改变；
+    不再属于本次导出（变为全空或不在所选城市、指数列之内）的旧切片文件会被删除
+
+使用方法:
+    python tools/tiles_70cityprice.py                                    # 输出到 projects/tiles（二进制）
+    python tools/tiles_70cityprice.py --format json --output projects/tiles_json
+    python tools/tiles_70cityprice.py --metrics CommodityHouseIDX SecondHandIDX --start 201101
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from cube_70cityprice import get_default_csv_path, load_cube, series_position
+
+TILES_FORMAT_VERSION = 2
+TILE_FORMATS = ('bin', 'json')
+# 分辨率: (名称, 每期月数)
+TILE_RESOLUTIONS = (('month', 1), ('quarter', 3), ('year', 12))
+TILE_STATS = {1: ['value'], 3: ['mean', 'min', 'max', 'count'], 12: ['mean', 'min', 'max', 'count']}
+JSON_DECIMALS = 3
+
+
+def period_label(period, months_per_period):
+    """期间序号 -> 标签: 2025-01 / 2025Q1 / 2025"""
+    if months_per_period == 1:
+        return f'{period // 12}-{period % 12 + 1:02d}'
+    if months_per_period == 3:
+        return f'{period // 4}Q{period % 4 + 1}'
+    return str(period)
+
+
+def aggregate_periods(values, first_key, months_per_period):
+    """
+    沿最后一个轴（连续月份）按期间汇总，忽略NaN
+
+    参数:
+        values: (..., 月份) 数组，first_key 为第一个月的月份键
+    返回: (periods, stats, partial)；periods 为期间序号（月份键 // 每期月数），
+          stats 形状 (..., 期间, 统计量)，统计量见 TILE_STATS；
+          partial 为区间首尾只覆盖部分月份的期间序号
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if months_per_period == 1:
+        return np.arange(first_key, first_key + values.shape[-1]), values[..., None], []
+
+    n_months = values.shape[-1]
+    first_period = first_key // months_per_period
+    last_period = (first_key + n_months - 1) // months_per_period
+    n_periods = last_period - first_period + 1
+    # 前后补NaN到整期，再整形为 (..., 期间, 期内月份)
+    left = first_key - first_period * months_per_period
+    right = n_periods * months_per_period - n_months - left
+    partial = []
+    if left:
+        partial.append(first_period)
+    if right and last_period not in partial:
+        partial.append(last_period)
+    padded = np.pad(values, [(0, 0)] * (values.ndim - 1) + [(left, right)], constant_values=np.nan)
+    blocks = padded.reshape(values.shape[:-1] + (n_periods, months_per_period))
+
+    valid = ~np.isnan(blocks)
+    count = valid.sum(axis=-1)
+    total = np.where(valid, blocks, 0.0).sum(axis=-1)
+    mean = np.divide(total, count, out=np.full(total.shape, np.nan), where=count > 0)
+    # fmin/fmax 忽略NaN，全为NaN时结果为NaN
+    low = np.fmin.reduce(blocks, axis=-1)
+    high = np.fmax.reduce(blocks, axis=-1)
+    stats = np.stack([mean, low, high, count.astype(np.float64)], axis=-1)
+    return np.arange(first_period, last_period + 1), stats, partial
+
+
+def _json_values(array):
+    return [None if np.isnan(v) else round(v, JSON_DECIMALS) for v in array.tolist()]
+
+
+def tile_payload(tile, fmt, fixedbases, stats):
+    """单个切片的文件内容；tile 形状 (指数类型, 期间, 统计量)"""
+    if fmt == 'bin':
+        return np.ascontiguousarray(tile, dtype='<f4').tobytes()
+    payload = {
+        fixedbase: {stat: tile[i, :, j].astype(int).tolist() if stat == 'count' else _json_values(tile[i, :, j])
+                    for j, stat in enumerate(stats)}
+        for i, fixedbase in enumerate(fixedbases)
+    }
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _write_if_changed(path, content):
+    """内容与现有文件相同时不重写，返回是否写入"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return True
+
+
+def _remove_stale_tiles(directory, keep):
+    """删除目录中不在 keep 之内的切片文件（两种格式），返回删除的文件数"""
+    removed = 0
+    suffixes = tuple(f'.{fmt}' for fmt in TILE_FORMATS)
+    for name in os.listdir(directory):
+        if name.endswith(suffixes) and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def export_tiles(cube, labels, output_dir, fmt='bin', metrics=None, cities=None, start_key=None, end_key=None):
+    """
+    生成全部切片与 index.json
+
+    参数:
+        metrics, cities: 默认全部指数列、70城
+        start_key, end_key: 月份键范围（默认全部月份）
+    返回: (written, unchanged, removed) 写入、未变化与删除的旧切片文件数
+    """
+    if fmt not in TILE_FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}，可选值为: {', '.join(TILE_FORMATS)}")
+    metrics = list(metrics or labels['metrics'])
+    all_cities = labels['cities']
+    cities = list(cities or all_cities)
+    unknown = [city for city in cities if city not in all_cities]
+    if unknown:
+        raise ValueError(f"未找到城市: {', '.join(unknown)}")
+    fixedbases = labels['fixedbases']
+
+    months = np.asarray(labels['months'], dtype=np.int64)
+    in_range = np.ones(len(months), dtype=bool)
+    if start_key is not None:
+        in_range &= months >= start_key
+    if end_key is not None:
+        in_range &= months <= end_key
+    positions = np.flatnonzero(in_range)
+    if len(positions) == 0:
+        raise ValueError("所选区间内没有数据")
+    window = slice(positions[0], positions[-1] + 1)
+    first_key = int(months[positions[0]])
+
+    # (城市, 月份, 指数列×指数类型) -> (城市, 指数列, 指数类型, 月份)
+    city_positions = [all_cities.index(city) for city in cities]
+    series = [series_position(labels, metric, fixedbase) for metric in metrics for fixedbase in fixedbases]
+    values = np.asarray(cube[city_positions, window][:, :, series], dtype=np.float64)
+    values = np.moveaxis(values, 1, -1).reshape(len(cities), len(metrics), len(fixedbases), -1)
+    has_data = ~np.isnan(values).all(axis=(2, 3))
+
+    adcodes = dict(zip(all_cities, labels['adcodes']))
+    written = unchanged = removed = 0
+    resolutions = {}
+    for name, months_per_period in TILE_RESOLUTIONS:
+        periods, stats, partial = aggregate_periods(values, first_key, months_per_period)
+        resolutions[name] = {
+            'months_per_period': months_per_period,
+            'stats': TILE_STATS[months_per_period],
+            'periods': [period_label(int(p), months_per_period) for p in periods],
+            'partial': [period_label(int(p), months_per_period) for p in partial],
+        }
+        directory = os.path.join(output_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        keep = set()
+        for i, city in enumerate(cities):
+            for j, metric in enumerate(metrics):
+                if not has_data[i, j]:
+                    continue
+                content = tile_payload(stats[i, j], fmt, fixedbases, TILE_STATS[months_per_period])
+                filename = f'{adcodes[city]}_{metric}.{fmt}'
+                keep.add(filename)
+                if _write_if_changed(os.path.join(directory, filename), content):
+                    written += 1
+                else:
+                    unchanged += 1
+        removed += _remove_stale_tiles(directory, keep)
+
+    index = {
+        'version': TILES_FORMAT_VERSION,
+        'format': fmt,
+        'dtype': '<f4' if fmt == 'bin' else None,
+        'layout': ['fixedbase', 'period', 'stat'],
+        'tile_path': '{resolution}/{adcode}_{metric}.' + fmt,
+        'resolutions': resolutions,
+        'cities': [{'name': city, 'adcode': adcodes[city]} for city in cities],
+        'metrics': metrics,
+        'fixedbases': fixedbases,
+        'available': {metric: [adcodes[city] for i, city in enumerate(cities) if has_data[i, j]]
+                      for j, metric in enumerate(metrics)},
+    }
+    content = json.dumps(index, ensure_ascii=False, indent=1).encode('utf-8')
+    if _write_if_changed(os.path.join(output_dir, 'index.json'), content):
+        written += 1
+    else:
+        unchanged += 1
+    return written, unchanged, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='70城房价多分辨率数据切片（月度/季度/年度，含最低/最高包络）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  %(prog)s                                         # projects/tiles，二进制 float32
+  %(prog)s --format json --output projects/tiles_json
+  %(prog)s --metrics CommodityHouseIDX SecondHandIDX --cities 北京 上海 --start 201101
+        """
+    )
+    parser.add_argument('--output', '-o', default='projects/tiles', help='输出目录（相对路径以仓库根目录为准）')
+    parser.add_argument('--format', '-f', choices=TILE_FORMATS, default='bin', help='切片格式 (默认: bin)')
+    parser.add_argument('--metrics', '-m', nargs='+', help='指数列（默认全部）')
+    parser.add_argument('--cities', '-c', nargs='+', help='城市（默认70城）')
+    parser.add_argument('--start', '-s', help='起始月份 (格式: YYYYMM)')
+    parser.add_argument('--end', '-e', help='结束月份 (格式: YYYYMM)')
+    parser.add_argument('--csv', default=get_default_csv_path(), help='CSV文件路径')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        print(f"错误: CSV文件不存在: {args.csv}")
+        sys.exit(1)
+
+    from extract_70cityprice import get_repo_root, month_key, parse_month_arg
+    output_dir = args.output if os.path.isabs(args.output) else os.path.join(get_repo_root(), args.output)
+    try:
+        start_key = month_key(*parse_month_arg(args.start)) if args.start else None
+        end_key = month_key(*parse_month_arg(args.end)) if args.end else None
+        cities = None
+        if args.cities:
+            from update_70cityprice import standardize_city_column
+            cities = [standardize_city_column(c) for c in args.cities]
+        cube, labels = load_cube(args.csv)
+        written, unchanged, removed = export_tiles(cube, labels, output_dir, args.format, args.metrics, cities,
+                                                   start_key, end_key)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    print(f"已生成数据切片: {output_dir}（写入 {written} 个文件，{unchanged} 个未变化，删除 {removed} 个旧切片）")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,17 +4,41 @@
 用于将国家统计局发布的70城房价数据追加到现有CSV数据表中
 
 使用方法:
-    python update_70cityprice.py <URL>
+    python update_70cityprice.py <URL> [--incremental]
+    python update_70cityprice.py --batch <URL或HTML文件> [<URL或HTML文件> ...] [--jobs N]
+    python update_70cityprice.py compact
+    python update_70cityprice.py <URL> --offline   # 只使用本地页面快照
     
 例如:
     python update_70cityprice.py "https://www.stats.gov.cn/sj/zxfb/202601/t20260119_1962319.html"
+
+增量模式 (--incremental):
+    新月份的记录直接追加到CSV末尾，不读取/重排/重写历史数据；
+    若该月份已存在，则回退为全量重写以替换旧数据。
+    追加后的CSV不再按 CITY/DATE/FixedBase 排序，可随时运行 compact 恢复规范顺序。
+
+批量回填模式 (--batch):
+    并发抓取/解析多个发布页面（URL或已保存的HTML文件），逐月校验解析结果，
+    全部通过后一次性合并写入CSV；任一月份校验失败则不写入任何数据。
 """
 
+import argparse
+import numpy as np
 import pandas as pd
 import os
 import re
 import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+
+from chain_70cityprice import extend_chain
+from snapshot_70cityprice import read_tables
+from storage_70cityprice import (
+    CSV_COLUMNS, append_dataset, decode_rows, load_dataset, load_encoded, parse_month_key, source_sha,
+    write_dataset
+)
 
 # 70个城市的ADCODE映射
 CITY_ADCODE = {
@@ -39,6 +63,16 @@ CITY_ADCODE = {
     '南充': '511300', '遵义': '520300', '大理': '532900'
 }
 
+# 城市分组（与 CITY_ADCODE 的排列一致: 前35个为直辖市及省会城市，其后35个为其他城市）
+FIRST_TIER_CITIES = ['北京', '上海', '广州', '深圳']
+MAJOR_CITIES = list(CITY_ADCODE)[:35]
+OTHER_CITIES = list(CITY_ADCODE)[35:]
+CITY_TIERS = {
+    '一线城市': FIRST_TIER_CITIES,
+    '35个大中城市': MAJOR_CITIES,
+    '35个其他城市': OTHER_CITIES,
+}
+
 # 城市名称别名（用于统一解析）
 CITY_NAME_ALIASES = {
     '大理白族自治州': '大理',
@@ -62,26 +96,44 @@ def normalize_city_name(name):
         name = name[:-1]
     return name
 
-def get_city_adcode(city_name):
-    """获取城市的ADCODE"""
+# 预先计算的城市写法索引: 原始写法 -> 标准城市名（CITY_ADCODE的键）
+# 覆盖标准名、带"市"后缀的写法与已知别名，未收录的写法由 resolve_city_key 模糊匹配后缓存
+CITY_SPELLING_INDEX = {
+    **{city: city for city in CITY_ADCODE},
+    **{f'{city}市': city for city in CITY_ADCODE},
+    **CITY_NAME_ALIASES,
+}
+
+@lru_cache(maxsize=4096)
+def resolve_city_key(city_name):
+    """
+    将任意城市写法解析为 CITY_ADCODE 中的标准城市名，未命中时返回None
+    结果按原始写法缓存（LRU），同一写法只做一次模糊匹配
+    """
+    if city_name in CITY_SPELLING_INDEX:
+        return CITY_SPELLING_INDEX[city_name]
     normalized = normalize_city_name(city_name)
     if normalized in CITY_ADCODE:
-        return CITY_ADCODE[normalized]
+        return normalized
     # 尝试模糊匹配
     for key in CITY_ADCODE:
         if normalized in key or key in normalized:
-            return CITY_ADCODE[key]
+            return key
+    return None
+
+def get_city_adcode(city_name):
+    """获取城市的ADCODE"""
+    key = resolve_city_key(city_name)
+    if key is not None:
+        return CITY_ADCODE[key]
     print(f"警告: 未找到城市 '{city_name}' 的ADCODE")
     return None
 
 def get_standard_city_name(city_name, warn_if_missing=False):
     """获取标准输出城市名"""
-    normalized = normalize_city_name(city_name)
-    if normalized in CITY_STANDARD_NAME:
-        return CITY_STANDARD_NAME[normalized]
-    for key in CITY_STANDARD_NAME:
-        if normalized in key or key in normalized:
-            return CITY_STANDARD_NAME[key]
+    key = resolve_city_key(city_name)
+    if key is not None:
+        return CITY_STANDARD_NAME[key]
     if warn_if_missing:
         print(f"警告: 未找到城市 '{city_name}' 的标准名称")
     return None
@@ -95,6 +147,28 @@ def standardize_city_column(city_name):
         return standard_name
     return str(city_name).strip()
 
+def resolve(series):
+    """
+    整列解析城市名: 每个不同写法只解析一次，再按编码广播回所有行
+    返回: DataFrame[CITY, ADCODE]，CITY 与 series.apply(standardize_city_column) 一致，
+          无法识别的城市 ADCODE 为None
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    names = np.empty(len(uniques), dtype=object)
+    adcodes = np.empty(len(uniques), dtype=object)
+    for idx, value in enumerate(uniques):
+        names[idx] = standardize_city_column(value)
+        key = None if pd.isna(value) else resolve_city_key(str(value))
+        adcodes[idx] = CITY_ADCODE[key] if key is not None else None
+    return pd.DataFrame({
+        'CITY': pd.Series(names[codes], index=series.index),
+        'ADCODE': pd.Series(adcodes[codes], index=series.index, dtype=object),
+    })
+
+def standardize_city_series(series):
+    """整列标准化CITY，等价于 series.apply(standardize_city_column)"""
+    return resolve(series)['CITY'].rename(series.name)
+
 def parse_date_from_url(url):
     """从URL中解析日期"""
     # 尝试从URL中提取日期 (格式: t20250715 或 202507)
@@ -139,77 +213,147 @@ def extract_cities_from_table(table, start_row, end_row, city_col=0):
                 cities.append(normalized)
     return cities
 
-def fetch_data_from_url(url):
-    """从URL抓取数据"""
-    print(f"正在从以下链接抓取数据: {url}")
-    tables = pd.read_html(url)
-    print(f"成功读取 {len(tables)} 个表格")
+def fetch_data_from_url(url, refresh=False, offline=False, log=print):
+    """
+    从URL（或已保存的HTML文件）抓取数据
+    原始HTML与解析结果缓存在本地快照中，重复运行无需联网
+
+    参数:
+        refresh: 忽略快照，重新下载
+        offline: 只使用快照，未命中时报错
+        log: 进度信息的输出函数（默认直接打印）
+    """
+    if os.path.isfile(url):
+        log(f"正在读取本地HTML文件: {url}")
+    else:
+        log(f"正在从以下链接抓取数据: {url}")
+    tables = read_tables(url, refresh=refresh, offline=offline)
+    log(f"成功读取 {len(tables)} 个表格")
     return tables
 
-def parse_main_index_table(table, start_row=2, end_row=37, is_january=False):
+# 主指数表格的三种指数类型（按表格列顺序）
+TABLE_FIXED_BASES = ['环比', '同比', '定基比']
+# 写入CSV的指数类型顺序
+RECORD_FIXED_BASES = ['同比', '环比', '定基比']
+# 分类指数的面积段（按表格列顺序）
+SIZE_GROUPS = ['Below90', '144', 'Above144']
+# (表格, 面积段) -> CSV列名
+MAIN_INDEX_COLUMNS = {
+    'commodity': 'CommodityHouseIDX',
+    'secondhand': 'SecondHandIDX',
+}
+SIZE_INDEX_COLUMNS = {
+    ('commodity', 'Below90'): 'CommodityBelow90IDX',
+    ('commodity', '144'): 'Commodity144IDX',
+    ('commodity', 'Above144'): 'CommodityAbove144IDX',
+    ('secondhand', 'Below90'): 'SecondHandBelow90IDX',
+    ('secondhand', '144'): 'SecondHand144IDX',
+    ('secondhand', 'Above144'): 'SecondHandAbove144IDX',
+}
+
+def _table_block(table, start_row, end_row):
+    """取表格数据区域为二维object数组"""
+    return table.iloc[start_row:end_row].to_numpy(dtype=object)
+
+def _block_column(block, position):
+    """取数据区域的第position列（空值为None），列不存在时返回全None列"""
+    if position < block.shape[1]:
+        column = block[:, position]
+        return np.where(pd.isna(column), None, column)
+    return np.full(len(block), None, dtype=object)
+
+def _normalize_cities(column):
+    """整列城市名标准化（每个不同写法只计算一次）"""
+    raw = column.astype(str)
+    mapping = {name: normalize_city_name(name) for name in np.unique(raw)}
+    return np.array([mapping[name] for name in raw], dtype=object)
+
+def _keep_last_city(cities):
+    """有效城市中同名只保留最后出现的一行，返回行号（按原顺序）"""
+    valid = np.flatnonzero((cities != '') & (cities != 'nan'))
+    if len(valid) == 0:
+        return valid
+    reversed_cities = cities[valid][::-1].astype(str)
+    _, first_in_reversed = np.unique(reversed_cities, return_index=True)
+    return np.sort(valid[len(valid) - 1 - first_in_reversed])
+
+def _truthy_mask(values):
+    """与 if value: 相同的判定（None/空字符串/0 视为无数据）"""
+    values = np.asarray(values, dtype=object)
+    return ~pd.isna(values) & (values != '') & (values != 0)
+
+def _main_index_arrays(table, start_row=2, end_row=37, is_january=False):
     """
-    解析主指数表格 (表1和表2)
-    返回: dict{城市: {类型: 值}}
-    
-    参数:
-        is_january: 是否为1月份数据，1月份没有年度平均列
+    将主指数表格整表重排: 左右两半各取 城市|环比|同比[|年度平均] 后上下交错拼接
+    返回: (城市数组, 值数组[行, 环比/同比/定基比])，同一城市保留最后出现的一行
     """
-    data = {}
-    
     # 检测表格列数来判断是否有年度平均列
     # 1月份: 城市 | 环比 | 同比 | 城市 | 环比 | 同比 (6列或更少)
     # 其他月份: 城市 | 环比 | 同比 | 年度平均 | 城市 | 环比 | 同比 | 年度平均 (8列)
-    
-    sample_row = table.iloc[start_row] if len(table) > start_row else None
-    if sample_row is not None:
-        num_cols = len(sample_row)
+    if len(table) > start_row:
+        num_cols = table.shape[1]
         # 如果每侧只有3列（城市+环比+同比），则没有年度平均
         has_avg = num_cols > 6 or (not is_january and num_cols > 4)
     else:
         has_avg = not is_january
+
+    block = _table_block(table, start_row, end_row)
+    right_start = 4 if has_avg else 3
+    offsets = [0, right_start] if block.shape[1] > right_start else [0]
+
+    cities = np.empty((len(block), len(offsets)), dtype=object)
+    values = np.empty((len(block), len(offsets), len(TABLE_FIXED_BASES)), dtype=object)
+    for side, offset in enumerate(offsets):
+        cities[:, side] = _normalize_cities(block[:, offset])
+        values[:, side, 0] = _block_column(block, offset + 1)
+        values[:, side, 1] = _block_column(block, offset + 2)
+        # 无年度平均列（1月份）: 定基比=同比
+        values[:, side, 2] = _block_column(block, offset + 3) if has_avg else values[:, side, 1]
+
+    # 按 行1左, 行1右, 行2左 ... 的顺序展开
+    cities = cities.reshape(-1)
+    values = values.reshape(-1, len(TABLE_FIXED_BASES))
+    keep = _keep_last_city(cities)
+    return cities[keep], values[keep]
+
+def _size_index_arrays(table, start_row=3, end_row=38, is_january=False):
+    """
+    将分类指数表格整表重排
+    返回: (城市数组, 值数组[行, 面积段, 环比/同比/定基比])，同一城市保留最后出现的一行
+    """
+    # 检测表格列数来判断是否有年度平均列
+    # 1月份: 城市 | 90m²以下(环比|同比) | 90-144m²(环比|同比) | 144m²以上(环比|同比) = 7列
+    # 其他月份: 城市 | 90m²以下(环比|同比|年度平均) | ... = 10列
+    if len(table) > start_row:
+        # 如果总列数少于10列，则没有年度平均
+        has_avg = table.shape[1] >= 10
+    else:
+        has_avg = not is_january
+
+    block = _table_block(table, start_row, end_row)
+    width = 3 if has_avg else 2
+    cities = _normalize_cities(block[:, 0])
+    values = np.empty((len(block), len(SIZE_GROUPS), len(TABLE_FIXED_BASES)), dtype=object)
+    for group_idx in range(len(SIZE_GROUPS)):
+        first = 1 + group_idx * width
+        values[:, group_idx, 0] = _block_column(block, first)
+        values[:, group_idx, 1] = _block_column(block, first + 1)
+        # 无年度平均列（1月份）: 定基比=同比
+        values[:, group_idx, 2] = _block_column(block, first + 2) if has_avg else values[:, group_idx, 1]
+
+    keep = _keep_last_city(cities)
+    return cities[keep], values[keep]
+
+def parse_main_index_table(table, start_row=2, end_row=37, is_january=False):
+    """
+    解析主指数表格 (表1和表2)
+    返回: dict{城市: {类型: 值}}
     
-    for i in range(start_row, min(end_row, len(table))):
-        row = table.iloc[i]
-        
-        # 左侧城市
-        city1 = normalize_city_name(str(row.iloc[0]))
-        if city1 and city1 != 'nan':
-            if has_avg:
-                # 有年度平均列: 城市 | 环比 | 同比 | 年度平均
-                data[city1] = {
-                    '环比': row.iloc[1] if pd.notna(row.iloc[1]) else None,
-                    '同比': row.iloc[2] if pd.notna(row.iloc[2]) else None,
-                    '定基比': row.iloc[3] if pd.notna(row.iloc[3]) else None
-                }
-            else:
-                # 无年度平均列（1月份）: 城市 | 环比 | 同比，定基比=同比
-                tongbi_val = row.iloc[2] if pd.notna(row.iloc[2]) else None
-                data[city1] = {
-                    '环比': row.iloc[1] if pd.notna(row.iloc[1]) else None,
-                    '同比': tongbi_val,
-                    '定基比': tongbi_val  # 1月份定基比等于同比
-                }
-        
-        # 右侧城市 (如果存在)
-        right_start = 4 if has_avg else 3
-        if len(row) > right_start:
-            city2 = normalize_city_name(str(row.iloc[right_start]))
-            if city2 and city2 != 'nan':
-                if has_avg:
-                    data[city2] = {
-                        '环比': row.iloc[right_start + 1] if pd.notna(row.iloc[right_start + 1]) else None,
-                        '同比': row.iloc[right_start + 2] if pd.notna(row.iloc[right_start + 2]) else None,
-                        '定基比': row.iloc[right_start + 3] if len(row) > right_start + 3 and pd.notna(row.iloc[right_start + 3]) else None
-                    }
-                else:
-                    tongbi_val = row.iloc[right_start + 2] if len(row) > right_start + 2 and pd.notna(row.iloc[right_start + 2]) else None
-                    data[city2] = {
-                        '环比': row.iloc[right_start + 1] if len(row) > right_start + 1 and pd.notna(row.iloc[right_start + 1]) else None,
-                        '同比': tongbi_val,
-                        '定基比': tongbi_val  # 1月份定基比等于同比
-                    }
-    
-    return data
+    参数:
+        is_january: 是否为1月份数据，1月份没有年度平均列
+    """
+    cities, values = _main_index_arrays(table, start_row, end_row, is_january)
+    return {city: dict(zip(TABLE_FIXED_BASES, row)) for city, row in zip(cities, values)}
 
 def parse_size_index_table(table, start_row=3, end_row=38, is_january=False):
     """
@@ -219,69 +363,56 @@ def parse_size_index_table(table, start_row=3, end_row=38, is_january=False):
     参数:
         is_january: 是否为1月份数据，1月份没有年度平均列
     """
-    data = {}
-    
-    # 检测表格列数来判断是否有年度平均列
-    # 1月份: 城市 | 90m²以下(环比|同比) | 90-144m²(环比|同比) | 144m²以上(环比|同比) = 7列
-    # 其他月份: 城市 | 90m²以下(环比|同比|年度平均) | ... = 10列
+    cities, values = _size_index_arrays(table, start_row, end_row, is_january)
+    return {
+        city: {size: dict(zip(TABLE_FIXED_BASES, group)) for size, group in zip(SIZE_GROUPS, row)}
+        for city, row in zip(cities, values)
+    }
+
+def process_tables_long(tables, is_january=False):
+    """
+    处理所有表格，整体输出长表
+    返回: DataFrame[CITY, FixedBase, COLUMN, VALUE]（VALUE为None表示该项无数据）
     
-    sample_row = table.iloc[start_row] if len(table) > start_row else None
-    if sample_row is not None:
-        num_cols = len(sample_row)
-        # 如果总列数少于10列，则没有年度平均
-        has_avg = num_cols >= 10
-    else:
-        has_avg = not is_january
+    参数:
+        is_january: 是否为1月份数据，1月份没有年度平均列
+    """
+    if len(tables) < 6:
+        raise ValueError(f"预期至少6个表格，实际只有 {len(tables)} 个")
     
-    for i in range(start_row, min(end_row, len(table))):
-        row = table.iloc[i]
-        
-        city = normalize_city_name(str(row.iloc[0]))
-        if city and city != 'nan':
-            if has_avg:
-                # 有年度平均列: 城市 | 90m²以下(环比|同比|年度平均) | 90-144m²(环比|同比|年度平均) | 144m²以上(环比|同比|年度平均)
-                data[city] = {
-                    'Below90': {
-                        '环比': row.iloc[1] if pd.notna(row.iloc[1]) else None,
-                        '同比': row.iloc[2] if pd.notna(row.iloc[2]) else None,
-                        '定基比': row.iloc[3] if pd.notna(row.iloc[3]) else None
-                    },
-                    '144': {
-                        '环比': row.iloc[4] if pd.notna(row.iloc[4]) else None,
-                        '同比': row.iloc[5] if pd.notna(row.iloc[5]) else None,
-                        '定基比': row.iloc[6] if pd.notna(row.iloc[6]) else None
-                    },
-                    'Above144': {
-                        '环比': row.iloc[7] if pd.notna(row.iloc[7]) else None,
-                        '同比': row.iloc[8] if pd.notna(row.iloc[8]) else None,
-                        '定基比': row.iloc[9] if pd.notna(row.iloc[9]) else None
-                    }
-                }
-            else:
-                # 无年度平均列（1月份）: 城市 | 90m²以下(环比|同比) | 90-144m²(环比|同比) | 144m²以上(环比|同比)
-                tongbi_90 = row.iloc[2] if len(row) > 2 and pd.notna(row.iloc[2]) else None
-                tongbi_144 = row.iloc[4] if len(row) > 4 and pd.notna(row.iloc[4]) else None
-                tongbi_above = row.iloc[6] if len(row) > 6 and pd.notna(row.iloc[6]) else None
-                
-                data[city] = {
-                    'Below90': {
-                        '环比': row.iloc[1] if len(row) > 1 and pd.notna(row.iloc[1]) else None,
-                        '同比': tongbi_90,
-                        '定基比': tongbi_90  # 1月份定基比等于同比
-                    },
-                    '144': {
-                        '环比': row.iloc[3] if len(row) > 3 and pd.notna(row.iloc[3]) else None,
-                        '同比': tongbi_144,
-                        '定基比': tongbi_144  # 1月份定基比等于同比
-                    },
-                    'Above144': {
-                        '环比': row.iloc[5] if len(row) > 5 and pd.notna(row.iloc[5]) else None,
-                        '同比': tongbi_above,
-                        '定基比': tongbi_above  # 1月份定基比等于同比
-                    }
-                }
-    
-    return data
+    parts = []
+    
+    def add_part(cities, values, columns):
+        # values: [行, 列组, 指数类型]，columns: 每个列组对应的CSV列名
+        values = values.reshape(len(cities), len(columns), len(TABLE_FIXED_BASES))
+        n_groups, n_bases = len(columns), len(TABLE_FIXED_BASES)
+        parts.append((
+            np.repeat(cities, n_groups * n_bases),
+            np.tile(TABLE_FIXED_BASES, len(cities) * n_groups),
+            np.tile(np.repeat(columns, n_bases), len(cities)),
+            values.reshape(-1),
+        ))
+    
+    # 表1: 新建商品住宅销售价格指数；表2: 二手住宅销售价格指数
+    for table_name, idx in [('commodity', 0), ('secondhand', 1)]:
+        cities, values = _main_index_arrays(tables[idx], is_january=is_january)
+        add_part(cities, values, [MAIN_INDEX_COLUMNS[table_name]])
+    
+    # 表3(一)(二): 新建商品住宅分类指数；表4(一)(二): 二手住宅分类指数
+    for table_name, first, second in [('commodity', 2, 3), ('secondhand', 4, 5)]:
+        cities_1, values_1 = _size_index_arrays(tables[first], is_january=is_january)
+        cities_2, values_2 = _size_index_arrays(tables[second], is_january=is_january)
+        cities = np.concatenate([cities_1, cities_2])
+        values = np.concatenate([values_1, values_2])
+        # 表(二)中的城市覆盖表(一)中的同名城市
+        keep = _keep_last_city(cities)
+        add_part(cities[keep], values[keep],
+                 [SIZE_INDEX_COLUMNS[(table_name, size)] for size in SIZE_GROUPS])
+    
+    return pd.DataFrame({
+        name: np.concatenate([part[i] for part in parts]).astype(object)
+        for i, name in enumerate(['CITY', 'FixedBase', 'COLUMN', 'VALUE'])
+    })
 
 def process_tables(tables, is_january=False):
     """
@@ -311,131 +442,339 @@ def process_tables(tables, is_january=False):
     
     return commodity_main, secondhand_main, commodity_size, secondhand_size
 
+def create_records_frame(date_str, long_df):
+    """
+    由长表生成CSV记录
+    返回: DataFrame（列顺序与CSV一致，空值为''），只保留有数据的记录
+    """
+    # 每个不同的城市写法只解析一次ADCODE和标准名
+    city_codes, cities = pd.factorize(long_df['CITY'])
+    adcodes = np.array([get_city_adcode(city) for city in cities], dtype=object)
+    names = np.array([get_standard_city_name(city, warn_if_missing=False) or city for city in cities],
+                     dtype=object)
+    
+    value_columns = CSV_COLUMNS[4:]
+    base_codes = pd.Index(RECORD_FIXED_BASES).get_indexer(long_df['FixedBase'])
+    column_codes = pd.Index(value_columns).get_indexer(long_df['COLUMN'])
+    values = long_df['VALUE'].to_numpy(dtype=object)
+    mask = _truthy_mask(values) & (base_codes >= 0) & (column_codes >= 0)
+    
+    # (城市, 指数类型) x 数值列 的网格，一次性填入所有取值
+    n_bases = len(RECORD_FIXED_BASES)
+    grid = np.full((len(cities) * n_bases, len(value_columns)), '', dtype=object)
+    grid[city_codes[mask] * n_bases + base_codes[mask], column_codes[mask]] = values[mask]
+    
+    # 只保留能匹配ADCODE且有数据的记录
+    row_city = np.repeat(np.arange(len(cities)), n_bases)
+    keep = np.flatnonzero((grid != '').any(axis=1) & pd.notna(adcodes[row_city]))
+    
+    frame = pd.DataFrame(grid[keep], columns=value_columns, dtype=object)
+    frame.insert(0, 'FixedBase', np.tile(RECORD_FIXED_BASES, len(cities))[keep])
+    frame.insert(0, 'CITY', names[row_city[keep]])
+    frame.insert(0, 'ADCODE', adcodes[row_city[keep]])
+    frame.insert(0, 'DATE', date_str)
+    return frame
+
+def _dicts_to_long(commodity_main, secondhand_main, commodity_size, secondhand_size):
+    """将 process_tables 的字典结果转换为长表"""
+    rows = []
+    for table_name, data in [('commodity', commodity_main), ('secondhand', secondhand_main)]:
+        for city, values in data.items():
+            for base in TABLE_FIXED_BASES:
+                rows.append((city, base, MAIN_INDEX_COLUMNS[table_name], values.get(base)))
+    for table_name, data in [('commodity', commodity_size), ('secondhand', secondhand_size)]:
+        for city, sizes in data.items():
+            for size, values in sizes.items():
+                for base in TABLE_FIXED_BASES:
+                    rows.append((city, base, SIZE_INDEX_COLUMNS[(table_name, size)], values.get(base)))
+    return pd.DataFrame(rows, columns=['CITY', 'FixedBase', 'COLUMN', 'VALUE'])
+
 def create_records(date_str, commodity_main, secondhand_main, commodity_size, secondhand_size):
     """创建CSV记录"""
-    records = []
-    
-    # 获取所有城市
-    all_cities = set(commodity_main.keys()) | set(secondhand_main.keys()) | \
-                 set(commodity_size.keys()) | set(secondhand_size.keys())
-    
-    for city in all_cities:
-        adcode = get_city_adcode(city)
-        if not adcode:
-            continue
-        
-        city_name = get_standard_city_name(city, warn_if_missing=False) or city
-        
-        # 为每种指数类型创建记录
-        for idx_type in ['同比', '环比', '定基比']:
-            record = {
-                'DATE': date_str,
-                'ADCODE': adcode,
-                'CITY': city_name,
-                'FixedBase': idx_type,
-                'HouseIDX': '',
-                'ResidentIDX': '',
-                'CommodityHouseIDX': '',
-                'SecondHandIDX': '',
-                'ResidentBelow90IDX': '',
-                'CommonResidentBelow90IDX': '',
-                'CommodityBelow90IDX': '',
-                'Commodity144IDX': '',
-                'CommodityAbove144IDX': '',
-                'SecondHandBelow90IDX': '',
-                'SecondHand144IDX': '',
-                'SecondHandAbove144IDX': ''
-            }
-            
-            # 填充主指数
-            if city in commodity_main and commodity_main[city].get(idx_type):
-                record['CommodityHouseIDX'] = commodity_main[city][idx_type]
-            
-            if city in secondhand_main and secondhand_main[city].get(idx_type):
-                record['SecondHandIDX'] = secondhand_main[city][idx_type]
-            
-            # 填充分类指数
-            if city in commodity_size:
-                size_data = commodity_size[city]
-                if size_data.get('Below90', {}).get(idx_type):
-                    record['CommodityBelow90IDX'] = size_data['Below90'][idx_type]
-                if size_data.get('144', {}).get(idx_type):
-                    record['Commodity144IDX'] = size_data['144'][idx_type]
-                if size_data.get('Above144', {}).get(idx_type):
-                    record['CommodityAbove144IDX'] = size_data['Above144'][idx_type]
-            
-            if city in secondhand_size:
-                size_data = secondhand_size[city]
-                if size_data.get('Below90', {}).get(idx_type):
-                    record['SecondHandBelow90IDX'] = size_data['Below90'][idx_type]
-                if size_data.get('144', {}).get(idx_type):
-                    record['SecondHand144IDX'] = size_data['144'][idx_type]
-                if size_data.get('Above144', {}).get(idx_type):
-                    record['SecondHandAbove144IDX'] = size_data['Above144'][idx_type]
-            
-            # 只添加有数据的记录
-            has_data = any([
-                record['CommodityHouseIDX'], record['SecondHandIDX'],
-                record['CommodityBelow90IDX'], record['Commodity144IDX'],
-                record['CommodityAbove144IDX'], record['SecondHandBelow90IDX'],
-                record['SecondHand144IDX'], record['SecondHandAbove144IDX']
-            ])
-            
-            if has_data:
-                records.append(record)
-    
-    return records
-
-def update_csv(csv_path, new_records):
+    long_df = _dicts_to_long(commodity_main, secondhand_main, commodity_size, secondhand_size)
+    return create_records_frame(date_str, long_df).to_dict('records')
+
+def sort_canonical(df):
+    """按规范顺序排序（CITY, DATE, FixedBase）"""
+    df = df.copy()
+    df['DATE_SORT'] = pd.to_datetime(df['DATE'], format='%Y/%m/%d', errors='coerce')
+    df = df.sort_values(['CITY', 'DATE_SORT', 'FixedBase'])
+    return df.drop('DATE_SORT', axis=1)
+
+def update_csv(csv_path, new_records, incremental=False):
     """更新CSV文件"""
+    if incremental and append_csv(csv_path, new_records):
+        return
+
     # 读取现有CSV
-    existing_df = pd.read_csv(csv_path, dtype=str)
-    existing_df['CITY'] = existing_df['CITY'].apply(standardize_city_column)
+    existing_df = load_dataset(csv_path)
+    previous_sha = source_sha(csv_path)
+    standard_cities = standardize_city_series(existing_df['CITY'])
+    renamed = bool((standard_cities.fillna('') != existing_df['CITY'].fillna('')).any())
+    existing_df['CITY'] = standard_cities
     print(f"现有数据: {len(existing_df)} 条记录")
     
     # 创建新数据DataFrame
     new_df = pd.DataFrame(new_records)
     if 'CITY' in new_df.columns:
-        new_df['CITY'] = new_df['CITY'].apply(standardize_city_column)
+        new_df['CITY'] = standardize_city_series(new_df['CITY'])
     
-    # 获取新数据的日期
+    # 获取新数据的日期（批量模式下可包含多个月份）
+    replaced_dates = []
     if len(new_records) > 0:
-        new_date = new_records[0]['DATE']
+        new_dates = list(dict.fromkeys(record['DATE'] for record in new_records))
         
         # 检查是否已存在该月份的数据
-        existing_dates = existing_df['DATE'].unique()
-        if new_date in existing_dates:
+        existing_dates = set(existing_df['DATE'].unique())
+        replaced_dates = [d for d in new_dates if d in existing_dates]
+        for new_date in replaced_dates:
             print(f"警告: {new_date} 的数据已存在，将替换现有数据")
-            existing_df = existing_df[existing_df['DATE'] != new_date]
+        if replaced_dates:
+            existing_df = existing_df[~existing_df['DATE'].isin(replaced_dates)]
     
     # 合并数据
     combined_df = pd.concat([existing_df, new_df], ignore_index=True)
     
     # 确保列顺序一致
-    columns = ['DATE', 'ADCODE', 'CITY', 'FixedBase', 'HouseIDX', 'ResidentIDX',
-               'CommodityHouseIDX', 'SecondHandIDX', 'ResidentBelow90IDX',
-               'CommonResidentBelow90IDX', 'CommodityBelow90IDX', 'Commodity144IDX',
-               'CommodityAbove144IDX', 'SecondHandBelow90IDX', 'SecondHand144IDX',
-               'SecondHandAbove144IDX']
-    combined_df = combined_df[columns]
+    combined_df = combined_df[CSV_COLUMNS]
     
     # 排序
-    combined_df['DATE_SORT'] = pd.to_datetime(combined_df['DATE'], format='%Y/%m/%d', errors='coerce')
-    combined_df = combined_df.sort_values(['CITY', 'DATE_SORT', 'FixedBase'])
-    combined_df = combined_df.drop('DATE_SORT', axis=1)
+    combined_df = sort_canonical(combined_df)
     
-    # 保存（使用引号包裹所有字段，与原始格式一致）
-    combined_df.to_csv(csv_path, index=False, quoting=1)  # quoting=1 是 csv.QUOTE_ALL
+    # 保存（使用引号包裹所有字段，与原始格式一致），并刷新列式缓存
+    write_dataset(combined_df, csv_path)
     print(f"更新后数据: {len(combined_df)} 条记录")
     print(f"新增 {len(new_records)} 条记录")
 
+    # 历史数据未变化（只新增月份）时，价格水平缓存只需计算新月份
+    if not replaced_dates and not renamed and extend_chain(csv_path, new_df, previous_sha):
+        print("价格水平缓存已增量更新")
+
+def append_csv(csv_path, new_records):
+    """
+    增量更新: 只把新月份的记录追加到CSV末尾
+    返回: 是否已完成追加（该月份已存在时返回False，由调用方回退为全量重写）
+    """
+    if len(new_records) == 0:
+        print("新增 0 条记录")
+        return True
+
+    new_dates = list(dict.fromkeys(record['DATE'] for record in new_records))
+    existing_dates = set(load_dataset(csv_path, columns=['DATE'])['DATE'].dropna())
+    replaced_dates = [d for d in new_dates if d in existing_dates]
+    if replaced_dates:
+        print(f"提示: {', '.join(replaced_dates)} 的数据已存在，增量模式无法原地替换，回退为全量重写")
+        return False
+
+    new_df = pd.DataFrame(new_records)
+    new_df['CITY'] = standardize_city_series(new_df['CITY'])
+    new_df = sort_canonical(new_df[CSV_COLUMNS])
+
+    previous_sha = source_sha(csv_path)
+    total_rows = append_dataset(new_df, csv_path)
+    if total_rows is not None:
+        print(f"更新后数据: {total_rows} 条记录")
+    print(f"追加 {len(new_df)} 条记录（增量模式，运行 compact 可恢复规范排序）")
+    if extend_chain(csv_path, new_df, previous_sha):
+        print("价格水平缓存已增量更新")
+    return True
+
+def _sorted_dictionary(values, codes, standardize=None):
+    """
+    字典编码列按不同取值排序（可先标准化）
+    返回: (排序后的字典值, 新编码, 每行的排序秩)；空值编码为 -1，秩最大
+    """
+    categories = pd.Series(values.tolist(), dtype=object)
+    if standardize is not None:
+        categories = standardize(categories)
+    remap, sorted_values = pd.factorize(categories, sort=True)
+    codes = np.asarray(codes, dtype=np.int64)
+    new_codes = np.where(codes >= 0, remap[np.maximum(codes, 0)], -1) if len(remap) else codes
+    ranks = np.where(new_codes >= 0, new_codes, len(sorted_values))
+    return np.asarray(sorted_values, dtype=str), new_codes, ranks
+
+def compact_csv(csv_path):
+    """
+    整理CSV: 统一城市名并按 CITY/DATE/FixedBase 规范顺序重写全文件
+    直接对字典编码的字符串数据排序: 城市名与指数类型只对不同取值处理一次，日期按整数月份键排序；
+    除城市名标准化外，所有单元格按原文写回
+    """
+    arrays = dict(load_encoded(csv_path, columns=CSV_COLUMNS))
+    city_values, city_codes, city_rank = _sorted_dictionary(
+        arrays['CITY.values'], arrays['CITY.codes'], standardize_city_series)
+    arrays['CITY.values'] = city_values
+    arrays['CITY.codes'] = city_codes
+    _, _, fixedbase_rank = _sorted_dictionary(arrays['FixedBase.values'], arrays['FixedBase.codes'])
+    # 月份键只对不同日期解析一次；无法解析的日期排在该城市最后（与按日期排序时空值在后一致）
+    date_keys = np.array([parse_month_key(v) for v in arrays['DATE.values'].tolist()] + [-1], dtype=np.int64)
+    month_keys = date_keys[arrays['DATE.codes'].astype(np.int64)]
+    month_rank = np.where(month_keys >= 0, month_keys, np.iinfo(np.int64).max)
+    order = np.lexsort((fixedbase_rank, month_rank, city_rank))
+    df = decode_rows(arrays, order, CSV_COLUMNS)
+    write_dataset(df, csv_path)
+    print(f"整理完成: {len(df)} 条记录已按 CITY/DATE/FixedBase 排序")
+
+def prepare_month_records(url, refresh=False, offline=False):
+    """
+    抓取并解析单个发布页面（URL或已保存的HTML文件）
+    不直接打印，进度信息随结果返回，由调用方按顺序输出（批量模式在线程池中运行）
+    返回: (date_str, records, messages)
+    """
+    messages = []
+    # 抓取数据
+    tables = fetch_data_from_url(url, refresh=refresh, offline=offline, log=messages.append)
+    
+    # 解析日期
+    year, month = parse_date_from_url(url)
+    if not year:
+        year, month = parse_date_from_title(tables)
+    
+    if not year:
+        raise ValueError(f"无法从URL或表格中解析日期，请检查URL格式是否正确: {url}")
+    
+    # 数据日期通常是URL发布月份的上一个月
+    # 例如: 202507发布的是2025年6月的数据
+    data_month = month - 1
+    data_year = year
+    if data_month == 0:
+        data_month = 12
+        data_year -= 1
+    
+    date_str = f"{data_year}/{data_month}/1"
+    messages.append(f"数据日期: {date_str}")
+    
+    # 检查是否为1月份数据
+    is_january = (data_month == 1)
+    if is_january:
+        messages.append("提示: 1月份数据，定基比将使用同比数据")
+    
+    # 处理表格（整表向量化重排为长表）
+    long_df = process_tables_long(tables, is_january=is_january)
+    
+    main_cities = long_df.drop_duplicates(['COLUMN', 'CITY'])['COLUMN'].value_counts()
+    messages.append(f"解析到 {main_cities.get('CommodityHouseIDX', 0)} 个城市的新建商品住宅数据")
+    messages.append(f"解析到 {main_cities.get('SecondHandIDX', 0)} 个城市的二手住宅数据")
+    
+    # 创建记录
+    records = create_records_frame(date_str, long_df).to_dict('records')
+    
+    messages.append(f"生成 {len(records)} 条新记录")
+    return date_str, records, messages
+
+def validate_month_records(date_str, records):
+    """
+    校验单个月份的解析结果
+    返回: 问题列表（为空表示通过）
+    """
+    problems = []
+    if not records:
+        return ['未生成任何记录']
+
+    other_dates = sorted({r['DATE'] for r in records} - {date_str})
+    if other_dates:
+        problems.append(f"记录中混入其他月份: {', '.join(other_dates)}")
+
+    keys = [(r['CITY'], r['FixedBase']) for r in records]
+    duplicated = sorted(f'{c}|{b}' for (c, b), n in Counter(keys).items() if n > 1)
+    if duplicated:
+        problems.append(f"存在重复的(城市,指数类型): {', '.join(duplicated)}")
+
+    bases_by_city = {}
+    for city, fixed_base in keys:
+        bases_by_city.setdefault(city, set()).add(fixed_base)
+    missing_cities = sorted(set(CITY_STANDARD_NAME.values()) - set(bases_by_city))
+    if missing_cities:
+        problems.append(f"缺少{len(missing_cities)}个城市: {', '.join(missing_cities)}")
+    incomplete = sorted(c for c, bases in bases_by_city.items() if not {'同比', '环比'}.issubset(bases))
+    if incomplete:
+        problems.append(f"缺少同比或环比的城市: {', '.join(incomplete)}")
+
+    bad_values = []
+    for record in records:
+        for column in CSV_COLUMNS[4:]:
+            value = record.get(column, '')
+            if value == '' or value is None:
+                continue
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                bad_values.append(f"{record['CITY']}|{column}={value}")
+    if bad_values:
+        problems.append(f"存在非数值内容: {', '.join(bad_values[:8])}")
+
+    return problems
+
+def run_batch(csv_path, urls, jobs=4, incremental=False, refresh=False, offline=False):
+    """
+    批量回填: 并发抓取/解析多个月份，逐月校验后一次性合并写入CSV
+    返回: 退出码（0 成功，1 失败）
+    """
+    print(f"批量模式: 共 {len(urls)} 个数据源，并发数 {jobs}")
+    results = {}
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {
+            url: executor.submit(prepare_month_records, url, refresh=refresh, offline=offline)
+            for url in urls
+        }
+        for url, future in futures.items():
+            try:
+                results[url] = future.result()
+            except Exception as e:
+                failures.append(f"{url}: {e}")
+
+    months = {}
+    for url in urls:
+        if url not in results:
+            continue
+        date_str, records, messages = results[url]
+        for text in messages:
+            print(text)
+        problems = validate_month_records(date_str, records)
+        if date_str in months:
+            problems.append(f"与 {months[date_str][0]} 的数据月份重复")
+        if problems:
+            failures.append(f"{url} ({date_str}): {'; '.join(problems)}")
+            continue
+        months[date_str] = (url, records)
+        print(f"校验通过: {date_str} ({len(records)} 条记录)")
+
+    if failures:
+        print(f"\n错误: {len(failures)} 个数据源抓取或校验失败，未写入任何数据")
+        for text in failures:
+            print(f"  - {text}")
+        return 1
+
+    all_records = [record for _, records in months.values() for record in records]
+    print(f"\n合并 {len(months)} 个月份，共 {len(all_records)} 条记录")
+    update_csv(csv_path, all_records, incremental=incremental)
+    return 0
+
 def main():
-    if len(sys.argv) < 2:
-        print("使用方法: python update_70cityprice.py <URL>")
-        print("例如: python update_70cityprice.py 'https://www.stats.gov.cn/sj/zxfb/202601/t20260119_1962319.html'")
-        sys.exit(1)
-    
-    url = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description='70城房价数据更新工具',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  %(prog)s "https://www.stats.gov.cn/sj/zxfb/202601/t20260119_1962319.html"
+  %(prog)s "https://www.stats.gov.cn/sj/zxfb/202601/t20260119_1962319.html" --incremental
+  %(prog)s --batch URL1 URL2 saved/202503.html --jobs 8   # 批量回填多个月份
+  %(prog)s compact                                # 按规范顺序整理CSV
+        """
+    )
+    parser.add_argument('url', nargs='+', help='国家统计局发布页面的URL，或 compact（整理CSV排序）')
+    parser.add_argument('--incremental', '-i', action='store_true',
+                        help='增量模式: 新月份直接追加到CSV末尾，不重写历史数据')
+    parser.add_argument('--batch', '-b', action='store_true',
+                        help='批量模式: 接受多个URL或HTML文件，并发解析后一次性写入')
+    parser.add_argument('--jobs', '-j', type=int, default=4, help='批量模式的并发数（默认4）')
+    parser.add_argument('--refresh', action='store_true', help='忽略本地页面快照，重新下载')
+    parser.add_argument('--offline', action='store_true', help='离线模式: 只使用本地页面快照')
+    args = parser.parse_args()
+    
+    if len(args.url) > 1 and not args.batch:
+        parser.error('提供多个URL时请使用 --batch')
+    url = args.url[0]
     
     # 获取仓库根目录（脚本所在目录的上级）
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -446,50 +785,25 @@ def main():
         print(f"错误: CSV文件不存在: {csv_path}")
         sys.exit(1)
     
+    if url == 'compact' and not args.batch:
+        compact_csv(csv_path)
+        return
+    
     try:
-        # 抓取数据
-        tables = fetch_data_from_url(url)
-        
-        # 解析日期
-        year, month = parse_date_from_url(url)
-        if not year:
-            year, month = parse_date_from_title(tables)
-        
-        if not year:
-            print("错误: 无法从URL或表格中解析日期")
-            print("请检查URL格式是否正确")
-            sys.exit(1)
-        
-        # 数据日期通常是URL发布月份的上一个月
-        # 例如: 202507发布的是2025年6月的数据
-        data_month = month - 1
-        data_year = year
-        if data_month == 0:
-            data_month = 12
-            data_year -= 1
-        
-        date_str = f"{data_year}/{data_month}/1"
-        print(f"数据日期: {date_str}")
-        
-        # 检查是否为1月份数据
-        is_january = (data_month == 1)
-        if is_january:
-            print("提示: 1月份数据，定基比将使用同比数据")
-        
-        # 处理表格
-        commodity_main, secondhand_main, commodity_size, secondhand_size = process_tables(tables, is_january=is_january)
-        
-        print(f"解析到 {len(commodity_main)} 个城市的新建商品住宅数据")
-        print(f"解析到 {len(secondhand_main)} 个城市的二手住宅数据")
-        
-        # 创建记录
-        records = create_records(date_str, commodity_main, secondhand_main, 
-                                 commodity_size, secondhand_size)
+        if args.batch:
+            exit_code = run_batch(csv_path, args.url, jobs=args.jobs, incremental=args.incremental,
+                                  refresh=args.refresh, offline=args.offline)
+            if exit_code != 0:
+                sys.exit(exit_code)
+            print("\n✅ 批量回填完成!")
+            return
         
-        print(f"生成 {len(records)} 条新记录")
+        date_str, records, messages = prepare_month_records(url, refresh=args.refresh, offline=args.offline)
+        for text in messages:
+            print(text)
         
         # 更新CSV
-        update_csv(csv_path, records)
+        update_csv(csv_path, records, incremental=args.incremental)
         
         print("\n✅ 数据更新完成!")
         
@@ -7,16 +7,28 @@
 使用方法:
     python tools/validate_70cityprice.py
     python tools/validate_70cityprice.py --csv path/to/70cityprice.csv
+    python tools/validate_70cityprice.py --incremental   # 只复查内容变化的月份
+    python tools/validate_70cityprice.py --chunksize 200000   # 分块读取超大文件
+    python tools/validate_70cityprice.py --rules dates,coverage --jobs 4 --timing
 """
 
 import argparse
+import hashlib
+import json
 import os
 import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List
 
+import numpy as np
 import pandas as pd
 
-from update_70cityprice import CITY_ADCODE, standardize_city_column
+from storage_70cityprice import (
+    cache_enabled, decode_rows, load_dataset, load_encoded, read_sidecar_json, write_sidecar_json
+)
+from update_70cityprice import CITY_ADCODE, standardize_city_column, standardize_city_series
 
 
 REQUIRED_COLUMNS = [
@@ -38,6 +50,15 @@ NUMERIC_COLUMNS = [
 EXPECTED_CITY_COUNT = len(CITY_ADCODE)
 EXPECTED_CITY_NAMES = {standardize_city_column(f'{city}市') for city in CITY_ADCODE}
 
+# 增量校验状态: .cache/<CSV文件名>.validate.json
+VALIDATE_STATE_SUFFIX = '.validate.json'
+VALIDATE_STATE_VERSION = 1
+DIGEST_MULTIPLIER = 0x100000001B3
+NULL_VALUE_HASH = 0x9E3779B97F4A7C15
+
+# 分块校验默认每块行数
+DEFAULT_CHUNKSIZE = 200_000
+
 
 def get_repo_root() -> str:
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -60,142 +81,718 @@ def non_empty_mask(series: pd.Series) -> pd.Series:
     return series.notna() & (series.astype(str).str.strip() != '')
 
 
-def validate_csv(csv_path: str, max_details: int = 8) -> int:
-    issues: List[str] = []
-    warnings: List[str] = []
+# FixedBase 位标记: 每个(月, 城市)的指数类型集合按位或汇总
+FIXED_BASE_BITS = {'同比': 1, '环比': 2, '定基比': 4}
+REQUIRED_FIXED_BASE_MASK = FIXED_BASE_BITS['同比'] | FIXED_BASE_BITS['环比']
+
+
+def factorize_values(series: pd.Series):
+    """
+    按取值分组: 返回 (codes, 每个取值的代表值Series)
+    对代表值逐项计算后按 codes 展开，与逐行计算结果一致，但每个不同取值只计算一次
+    """
+    codes, _ = pd.factorize(series, use_na_sentinel=False)
+    _, first = np.unique(codes, return_index=True)
+    return codes, series.iloc[first].reset_index(drop=True)
+
 
+def derived_codes(codes: np.ndarray, derived: pd.Series, sort: bool = False):
+    """代表值计算结果再分组（不同原值可能得到相同结果），返回 (行编码, 结果取值)"""
+    value_codes, values = pd.factorize(derived, use_na_sentinel=False, sort=sort)
+    return value_codes[codes], values
+
+
+def month_label(key: int) -> str:
+    """月份键 -> 'YYYY-MM'（与 Period('M') 的字符串一致）"""
+    year, month_index = divmod(int(key), 12)
+    return f'{year}-{month_index + 1:02d}'
+
+
+def parse_value_months(date_values: pd.Series):
+    """DATE代表值 -> (是否无法解析, 月份键 年*12+月-1，无法解析为 -1)"""
+    date_parsed = pd.to_datetime(date_values, format='%Y/%m/%d', errors='coerce')
+    date_invalid = date_parsed.isna().to_numpy()
+    value_month = np.where(
+        date_invalid, -1,
+        date_parsed.dt.year.fillna(0).to_numpy(dtype=np.int64) * 12
+        + date_parsed.dt.month.fillna(1).to_numpy(dtype=np.int64) - 1
+    )
+    return date_invalid, value_month
+
+
+def validate_csv(csv_path: str, max_details: int = 8, incremental: bool = False, chunksize=None,
+                 rules=None, jobs: int = 1, executor: str = 'thread', timing: bool = False) -> int:
+    """
+    校验CSV并打印报告，返回退出码
+        rules: 只执行的规则名列表（None 为全部，见 VALIDATION_RULES）
+        jobs/executor: 规则并行数与方式（thread/process）
+        timing: 报告中附带每条规则的耗时与峰值内存
+    """
     if not os.path.exists(csv_path):
         print(f'错误: CSV文件不存在: {csv_path}')
         return 1
 
-    print(f'开始校验: {csv_path}')
-    df = pd.read_csv(csv_path, dtype=str)
-    print(f'记录数: {len(df)}')
+    parallel = {'jobs': jobs, 'executor': executor, 'timing': timing}
+    if incremental:
+        return validate_incremental(csv_path, max_details, **parallel)
+    if chunksize:
+        return validate_chunked(csv_path, max_details, chunksize, rules=rules, **parallel)
 
-    # 1) 列结构校验
-    missing_columns = [c for c in REQUIRED_COLUMNS if c not in df.columns]
-    extra_columns = [c for c in df.columns if c not in REQUIRED_COLUMNS]
+    print(f'开始校验: {csv_path}')
+    timings = [] if timing else None
+    if cache_enabled():
+        # 内存映射读取: 按块还原字符串，进程池中各进程直接映射同一份缓存
+        arrays = load_encoded(csv_path)
+        columns = arrays['__columns__'].tolist()
+        print(f'记录数: {len(arrays[f"{columns[0]}.codes"])}')
+        usecols = [c for c in columns if c in REQUIRED_COLUMNS]
+        source = ('mapped', csv_path, DEFAULT_CHUNKSIZE, usecols)
+    else:
+        df = load_dataset(csv_path)
+        print(f'记录数: {len(df)}')
+        columns = list(df.columns)
+        source = ('frame', df)
+    issues, warnings = check_source(columns, source, max_details, rules=rules, jobs=jobs, executor=executor,
+                                    timings=timings)
+    return print_report(issues, warnings, timings)
+
+
+def check_frame(df: pd.DataFrame, max_details: int = 8, all_months=None, skipped_clean_months: bool = False,
+                rules=None, jobs: int = 1, executor: str = 'thread', timings=None):
+    """
+    对数据执行校验规则，返回 (issues, warnings)
+
+    增量校验时 df 只包含需要复查的月份:
+        all_months: 全量数据的有效月份键，用于月份连续性校验
+        skipped_clean_months: 是否跳过了已通过校验的月份（这些月份恰好覆盖标准70城）
+    rules/jobs/executor 见 run_rules；传入列表 timings 时追加每条规则的耗时与峰值内存
+    """
+    return check_source(list(df.columns), ('frame', df), max_details, all_months, skipped_clean_months,
+                        rules=rules, jobs=jobs, executor=executor, timings=timings)
+
+
+def check_source(columns: List[str], source, max_details: int = 8, all_months=None,
+                 skipped_clean_months: bool = False, rules=None, jobs: int = 1, executor: str = 'thread',
+                 timings=None):
+    """对数据来源（见 iter_source_chunks）执行列结构校验与校验规则，返回 (issues, warnings)"""
+    issues, warnings, missing = check_columns(columns)
+    if missing:
+        return issues, warnings
+    options = {'all_months': all_months, 'skipped_clean_months': skipped_clean_months}
+    _, rule_issues, profile = run_rules(
+        source, max_details, options, rules=rules, jobs=jobs, executor=executor,
+        measure_memory=timings is not None,
+    )
+    issues.extend(rule_issues)
+    if timings is not None:
+        timings.extend(profile)
+    return issues, warnings
+
+
+def check_columns(columns: List[str]):
+    """1) 列结构校验，返回 (issues, warnings, 是否缺少必需列)"""
+    issues: List[str] = []
+    warnings: List[str] = []
+    missing_columns = [c for c in REQUIRED_COLUMNS if c not in columns]
+    extra_columns = [c for c in columns if c not in REQUIRED_COLUMNS]
     if missing_columns:
         issues.append(f"缺少必需列: {', '.join(missing_columns)}")
     if extra_columns:
         warnings.append(f"存在额外列: {', '.join(extra_columns)}")
-    if missing_columns:
-        return print_report(issues, warnings)
+    return issues, warnings, bool(missing_columns)
+
+
+def _global_ids(mapping: dict, labels: list, values: pd.Series) -> np.ndarray:
+    """代表值 -> 全局编号（空值共用一个编号），新取值追加到字典末尾"""
+    ids = np.empty(len(values), dtype=np.int64)
+    for idx, value in enumerate(values.tolist()):
+        key = None if pd.isna(value) else value
+        if key not in mapping:
+            mapping[key] = len(labels)
+            labels.append(f'{value}')
+        ids[idx] = mapping[key]
+    return ids
+
+
+def build_chunk_context(df: pd.DataFrame, needs: set, shared: dict) -> dict:
+    """
+    按规则声明的依赖解析一块数据，返回各规则共用的分组键（每列只对不同取值计算一次）
+        date: DATE分组; month: 月份键; city: 标准化城市; fixedbase: FixedBase分组
+        month_city: (月, 标准化城市) 组合键，城市编号记录在 shared 中跨块共用
+    """
+    ctx = {'df': df}
+    shared['rows'] += len(df)
+
+    if needs & {'date', 'month', 'month_city'}:
+        ctx['date_codes'], ctx['date_values'] = factorize_values(df['DATE'])
+    if needs & {'month', 'month_city'}:
+        ctx['date_invalid'], ctx['value_month'] = parse_value_months(ctx['date_values'])
+        ctx['row_month'] = ctx['value_month'][ctx['date_codes']]
+    if needs & {'city', 'month_city'}:
+        ctx['city_codes'], ctx['city_values'] = factorize_values(df['CITY'])
+        ctx['city_std'] = standardize_city_series(ctx['city_values'])
+    if 'fixedbase' in needs:
+        ctx['fb_codes'], fb_values = factorize_values(df['FixedBase'])
+        ctx['fb_stripped'] = fb_values.astype(str).str.strip()
+
+    if 'month_city' in needs:
+        city_std = ctx['city_std']
+        std_city_valid = city_std.notna().to_numpy()
+        std_ids = np.full(len(city_std), -1, dtype=np.int64)
+        std_ids[std_city_valid] = _global_ids(
+            shared['std_city_ids'], shared['std_city_names'], city_std[std_city_valid]
+        )
+        city_codes = ctx['city_codes']
+        ctx['coverage_rows'] = (ctx['row_month'] >= 0) & std_city_valid[city_codes]
+        ctx['month_city_key'] = (ctx['row_month'] << 21) | std_ids[city_codes]
+    return ctx
 
-    # 2) 日期与月份连续性校验
-    date_parsed = pd.to_datetime(df['DATE'], format='%Y/%m/%d', errors='coerce')
-    invalid_dates = sorted(df.loc[date_parsed.isna(), 'DATE'].dropna().astype(str).unique().tolist())
+
+def _sorted_groups(keys, std_names: list):
+    """组合键 (月, 城市) 按 月份 + 城市名 排序（与 groupby 的分组顺序一致），返回 (月份, 城市编号, 排序)"""
+    name_rank = np.empty(len(std_names), dtype=np.int64)
+    name_rank[np.argsort(np.asarray(std_names, dtype=object), kind='stable')] = np.arange(len(std_names))
+    keys = np.asarray(sorted(keys), dtype=np.int64)
+    months = keys >> 21
+    cities = keys & ((1 << 21) - 1)
+    order = np.lexsort((name_rank[cities], months)) if len(keys) else np.empty(0, dtype=np.int64)
+    return months[order], cities[order], order
+
+
+# 2) 日期与月份连续性校验
+def _accumulate_dates(state: dict, ctx: dict) -> None:
+    state['invalid_dates'].update(ctx['date_values'][ctx['date_invalid']].dropna().astype(str).tolist())
+    value_month = ctx['value_month']
+    state['months'].update(int(m) for m in value_month[value_month >= 0])
+
+
+def _finish_dates(state: dict, shared: dict, max_details: int, options: dict) -> List[str]:
+    issues: List[str] = []
+    invalid_dates = sorted(state['invalid_dates'])
     if invalid_dates:
         issues.append(f"存在无法解析的DATE值: {limit_join(invalid_dates, max_details)}")
 
-    month_series = date_parsed.dt.to_period('M')
-    valid_months = sorted(month_series.dropna().unique())
-    if not valid_months:
+    if options.get('all_months') is None:
+        valid_months = np.array(sorted(state['months']), dtype=np.int64)
+    else:
+        valid_months = np.asarray(options['all_months'], dtype=np.int64)
+    if len(valid_months) == 0:
         issues.append('未检测到可用的月份数据')
     else:
-        gaps = []
-        for prev, curr in zip(valid_months[:-1], valid_months[1:]):
-            month_delta = (curr.year - prev.year) * 12 + (curr.month - prev.month)
-            if month_delta != 1:
-                gaps.append(f'{prev}->{curr}')
+        breaks = np.flatnonzero(np.diff(valid_months) != 1)
+        gaps = [f'{month_label(valid_months[i])}->{month_label(valid_months[i + 1])}' for i in breaks]
         if gaps:
             issues.append(f"月份不连续: {limit_join(gaps, max_details)}")
+    return issues
 
-    # 3) 固定基类型校验
-    fixed_base_series = df['FixedBase'].astype(str).str.strip()
-    invalid_fixed_base = sorted((set(fixed_base_series.unique()) - ALLOWED_FIXED_BASE) - {'nan'})
-    if invalid_fixed_base:
-        issues.append(f"存在非法FixedBase值: {', '.join(invalid_fixed_base)}")
 
-    # 4) 城市标准化与城市集合校验
-    city_std = df['CITY'].apply(standardize_city_column)
-    city_raw = df['CITY'].fillna('').astype(str).str.strip()
-    changed_rows = (city_std.fillna('') != city_raw).sum()
+# 3) 固定基类型校验
+def _accumulate_fixedbase(state: dict, ctx: dict) -> None:
+    state['invalid'].update(set(ctx['fb_stripped'].dropna().unique()) - ALLOWED_FIXED_BASE - {'nan'})
+
+
+def _finish_fixedbase(state: dict, shared: dict, max_details: int, options: dict) -> List[str]:
+    invalid_fixed_base = sorted(state['invalid'])
+    if invalid_fixed_base:
+        return [f"存在非法FixedBase值: {', '.join(invalid_fixed_base)}"]
+    return []
+
+
+# 4) 城市标准化与城市集合校验
+def _accumulate_cities(state: dict, ctx: dict) -> None:
+    city_values, city_std = ctx['city_values'], ctx['city_std']
+    city_raw = city_values.fillna('').astype(str).str.strip()
+    changed = (city_std.fillna('') != city_raw).to_numpy()
+    state['changed_rows'] += np.bincount(ctx['city_codes'], minlength=len(city_values))[changed].sum()
+    changed_pairs = (
+        pd.DataFrame({'raw': city_raw, 'std': city_std})
+        .loc[lambda x: x['raw'] != x['std']]
+        .drop_duplicates()
+    )
+    for r in changed_pairs.itertuples(index=False):
+        state['changed_pairs'].setdefault(f"{r.raw}->{r.std}", None)
+    state['city_set'].update(city_std.dropna().astype(str).str.strip().tolist())
+
+
+def _finish_cities(state: dict, shared: dict, max_details: int, options: dict) -> List[str]:
+    issues: List[str] = []
+    changed_rows = state['changed_rows']
     if changed_rows > 0:
-        changed_pairs = (
-            pd.DataFrame({'raw': city_raw, 'std': city_std})
-            .loc[lambda x: x['raw'] != x['std']]
-            .drop_duplicates()
-        )
-        pair_strings = [f"{r.raw}->{r.std}" for r in changed_pairs.itertuples(index=False)]
         issues.append(
             f"检测到{changed_rows}条CITY值不符合标准命名: "
-            f"{limit_join(pair_strings, max_details)}"
+            f"{limit_join(list(state['changed_pairs']), max_details)}"
         )
 
-    city_set = set(city_std.dropna().astype(str).str.strip().tolist())
+    city_set = set(state['city_set'])
+    if options.get('skipped_clean_months'):
+        city_set |= EXPECTED_CITY_NAMES
     unknown_cities = sorted(city_set - EXPECTED_CITY_NAMES)
     if unknown_cities:
         issues.append(f"存在非70城城市名称: {limit_join(unknown_cities, max_details)}")
     if len(city_set) != EXPECTED_CITY_COUNT:
         issues.append(f"标准化后城市数异常: 实际{len(city_set)}，期望{EXPECTED_CITY_COUNT}")
-
-    # 5) 主键唯一性校验（使用标准化城市名）
-    key_df = pd.DataFrame({
-        'DATE': df['DATE'].astype(str),
-        'CITY_STD': city_std.astype(str),
-        'FixedBase': fixed_base_series
-    })
-    duplicated = key_df.duplicated(['DATE', 'CITY_STD', 'FixedBase'], keep=False)
-    if duplicated.any():
-        dup_samples = (
-            key_df.loc[duplicated, ['DATE', 'CITY_STD', 'FixedBase']]
-            .drop_duplicates()
-            .head(max_details)
-        )
-        sample_text = ', '.join(
-            f"{r.DATE}|{r.CITY_STD}|{r.FixedBase}" for r in dup_samples.itertuples(index=False)
-        )
-        issues.append(f"存在重复主键(DATE,CITY,FixedBase)，示例: {sample_text}")
-
-    # 6) 月度覆盖校验（每月应覆盖70城）
-    coverage_df = pd.DataFrame({'MONTH': month_series, 'CITY_STD': city_std}).dropna()
-    month_city_counts = coverage_df.drop_duplicates().groupby('MONTH').size()
-    bad_months = month_city_counts[month_city_counts != EXPECTED_CITY_COUNT]
-    if len(bad_months) > 0:
-        bad_text = [f'{idx}:{val}' for idx, val in bad_months.items()]
-        issues.append(f"月度城市覆盖异常(非70城): {limit_join(bad_text, max_details)}")
-
-    # 7) 每个(月, 城市)至少有同比和环比
-    base_presence = pd.DataFrame({
-        'MONTH': month_series,
-        'CITY_STD': city_std,
-        'FixedBase': fixed_base_series
-    }).dropna()
-    base_sets = base_presence.groupby(['MONTH', 'CITY_STD'])['FixedBase'].agg(set)
-    missing_required = base_sets[~base_sets.apply(lambda s: REQUIRED_FIXED_BASE.issubset(s))]
-    if len(missing_required) > 0:
-        sample_idx = list(missing_required.index[:max_details])
-        sample_text = ', '.join([f'{m}|{c}' for m, c in sample_idx])
-        issues.append(f"存在缺少同比或环比的(月,城市)组合: {sample_text}")
-
-    # 8) 定基比一致性（同一月份不应部分城市有、部分城市无）
-    has_fixed_base = base_sets.apply(lambda s: '定基比' in s)
-    monthly_ratio = has_fixed_base.groupby(level=0).mean()
-    mixed_months = monthly_ratio[(monthly_ratio > 0) & (monthly_ratio < 1)]
-    if len(mixed_months) > 0:
-        mixed_text = [f'{idx}:{val:.2%}' for idx, val in mixed_months.items()]
-        issues.append(f"定基比发布不一致（同月仅部分城市存在）: {limit_join(mixed_text, max_details)}")
-
-    # 9) 数值列格式校验
+    return issues
+
+
+# 5) 主键唯一性校验（使用标准化城市名）: 三列取值的全局编号合成一个整数键
+def _accumulate_primary_key(state: dict, ctx: dict) -> None:
+    key_parts = []
+    for mapping, labels, codes, derived in zip(
+        state['key_ids'], state['key_labels'],
+        (ctx['date_codes'], ctx['city_codes'], ctx['fb_codes']),
+        (ctx['date_values'].astype(str), ctx['city_std'].astype(str), ctx['fb_stripped']),
+    ):
+        key_parts.append(_global_ids(mapping, labels, derived)[codes])
+    state['keys'].append((key_parts[0] << 42) | (key_parts[1] << 21) | key_parts[2])
+
+
+def _finish_primary_key(state: dict, shared: dict, max_details: int, options: dict) -> List[str]:
+    primary_key = np.concatenate(state['keys']) if state['keys'] else np.empty(0, dtype=np.int64)
+    duplicated = pd.Series(primary_key).duplicated(keep=False).to_numpy()
+    if not duplicated.any():
+        return []
+    dup_keys = primary_key[duplicated]
+    _, first = np.unique(dup_keys, return_index=True)
+    date_labels, city_labels, fb_labels = state['key_labels']
+    mask21 = (1 << 21) - 1
+    sample_text = ', '.join(
+        f"{date_labels[key >> 42]}|{city_labels[(key >> 21) & mask21]}|{fb_labels[key & mask21]}"
+        for key in dup_keys[np.sort(first)][:max_details].tolist()
+    )
+    return [f"存在重复主键(DATE,CITY,FixedBase)，示例: {sample_text}"]
+
+
+# 6) 月度覆盖校验（每月应覆盖70城）
+def _accumulate_coverage(state: dict, ctx: dict) -> None:
+    state['coverage'].update(np.unique(ctx['month_city_key'][ctx['coverage_rows']]).tolist())
+
+
+def _finish_coverage(state: dict, shared: dict, max_details: int, options: dict) -> List[str]:
+    coverage_months, _, _ = _sorted_groups(state['coverage'], shared['std_city_names'])
+    months, month_city_counts = np.unique(coverage_months, return_counts=True)
+    bad = month_city_counts != EXPECTED_CITY_COUNT
+    if bad.any():
+        bad_text = [f'{month_label(m)}:{c}' for m, c in zip(months[bad], month_city_counts[bad])]
+        return [f"月度城市覆盖异常(非70城): {limit_join(bad_text, max_details)}"]
+    return []
+
+
+# 7) / 8) FixedBase 位标记按 (月, 城市) 按位或
+def _accumulate_presence(state: dict, ctx: dict) -> None:
+    fb_codes, fb_stripped = ctx['fb_codes'], ctx['fb_stripped']
+    value_bits = np.array([FIXED_BASE_BITS.get(v, 0) for v in fb_stripped.tolist()], dtype=np.int64)
+    presence_rows = ctx['coverage_rows'] & fb_stripped.notna().to_numpy()[fb_codes]
+    group_keys, group_inverse = np.unique(ctx['month_city_key'][presence_rows], return_inverse=True)
+    row_bits = value_bits[fb_codes[presence_rows]]
+    group_bits = np.zeros(len(group_keys), dtype=np.int64)
+    for bit in FIXED_BASE_BITS.values():
+        has_bit = np.bincount(group_inverse, weights=(row_bits & bit) > 0, minlength=len(group_keys)) > 0
+        group_bits |= np.where(has_bit, bit, 0)
+    presence = state['presence']
+    for key, bits in zip(group_keys.tolist(), group_bits.tolist()):
+        presence[key] = presence.get(key, 0) | bits
+
+
+def _presence_groups(state: dict, shared: dict):
+    """按 月份 + 城市名 排序的 (月份, 城市编号, FixedBase位标记)"""
+    presence_keys = sorted(state['presence'])
+    group_months, group_cities, order = _sorted_groups(presence_keys, shared['std_city_names'])
+    group_bits = np.asarray([state['presence'][k] for k in presence_keys], dtype=np.int64)[order]
+    return group_months, group_cities, group_bits
+
+
+# 7) 每个(月, 城市)至少有同比和环比
+def _finish_required_bases(state: dict, shared: dict, max_details: int, options: dict) -> List[str]:
+    group_months, group_cities, group_bits = _presence_groups(state, shared)
+    missing_required = np.flatnonzero((group_bits & REQUIRED_FIXED_BASE_MASK) != REQUIRED_FIXED_BASE_MASK)
+    if len(missing_required) == 0:
+        return []
+    std_names = shared['std_city_names']
+    sample_text = ', '.join([
+        f'{month_label(group_months[i])}|{std_names[group_cities[i]]}'
+        for i in missing_required[:max_details]
+    ])
+    return [f"存在缺少同比或环比的(月,城市)组合: {sample_text}"]
+
+
+# 8) 定基比一致性（同一月份不应部分城市有、部分城市无）
+def _finish_fixedbase_consistency(state: dict, shared: dict, max_details: int, options: dict) -> List[str]:
+    group_months, _, group_bits = _presence_groups(state, shared)
+    has_fixed_base = (group_bits & FIXED_BASE_BITS['定基比']) > 0
+    ratio_months, month_starts, month_groups = np.unique(group_months, return_index=True, return_counts=True)
+    if len(ratio_months) == 0:
+        return []
+    monthly_ratio = np.add.reduceat(has_fixed_base.astype(np.float64), month_starts) / month_groups
+    mixed = (monthly_ratio > 0) & (monthly_ratio < 1)
+    if mixed.any():
+        mixed_text = [f'{month_label(m)}:{r:.2%}' for m, r in zip(ratio_months[mixed], monthly_ratio[mixed])]
+        return [f"定基比发布不一致（同月仅部分城市存在）: {limit_join(mixed_text, max_details)}"]
+    return []
+
+
+# 9) 数值列格式校验
+def _accumulate_numeric(state: dict, ctx: dict) -> None:
+    df = ctx['df']
     for column in NUMERIC_COLUMNS:
-        mask = non_empty_mask(df[column])
+        value_codes, values = factorize_values(df[column])
+        mask = non_empty_mask(values)
         if not mask.any():
             continue
-        parsed = pd.to_numeric(df.loc[mask, column], errors='coerce')
-        invalid_count = int(parsed.isna().sum())
+        parsed = pd.to_numeric(values[mask], errors='coerce')
+        invalid_values = parsed[parsed.isna()].index
+        if len(invalid_values) > 0:
+            counts = np.bincount(value_codes, minlength=len(values))
+            state[column][0] += int(counts[invalid_values].sum())
+            state[column][1].update(values[invalid_values].astype(str).tolist())
+
+
+def _finish_numeric(state: dict, shared: dict, max_details: int, options: dict) -> List[str]:
+    issues: List[str] = []
+    for column in NUMERIC_COLUMNS:
+        invalid_count, bad_values = state[column]
         if invalid_count > 0:
-            invalid_index = parsed[parsed.isna()].index
-            bad_values = sorted(df.loc[invalid_index, column].astype(str).unique().tolist())
             issues.append(
                 f"列{column}存在{invalid_count}个非数值内容: "
-                f"{limit_join(bad_values, max_details)}"
+                f"{limit_join(sorted(bad_values), max_details)}"
             )
+    return issues
+
+
+# 校验规则注册表（按报告顺序）
+#   title: 规则说明; needs: 依赖的共享解析结果（见 build_chunk_context）
+#   init(): 累积状态; accumulate(state, ctx): 逐块累积
+#   finish(state, shared, max_details, options): 生成问题列表
+# 规则之间只共享只读的解析结果，各自的状态互不依赖，可以并行执行
+VALIDATION_RULES = {
+    'dates': {
+        'title': '日期与月份连续性',
+        'needs': {'month'},
+        'init': lambda: {'invalid_dates': set(), 'months': set()},
+        'accumulate': _accumulate_dates,
+        'finish': _finish_dates,
+    },
+    'fixedbase': {
+        'title': 'FixedBase取值',
+        'needs': {'fixedbase'},
+        'init': lambda: {'invalid': set()},
+        'accumulate': _accumulate_fixedbase,
+        'finish': _finish_fixedbase,
+    },
+    'cities': {
+        'title': '城市命名与70城集合',
+        'needs': {'city'},
+        'init': lambda: {'changed_rows': 0, 'changed_pairs': {}, 'city_set': set()},
+        'accumulate': _accumulate_cities,
+        'finish': _finish_cities,
+    },
+    'primary_key': {
+        'title': '主键唯一性',
+        'needs': {'date', 'city', 'fixedbase'},
+        'init': lambda: {'key_ids': ({}, {}, {}), 'key_labels': ([], [], []), 'keys': []},
+        'accumulate': _accumulate_primary_key,
+        'finish': _finish_primary_key,
+    },
+    'coverage': {
+        'title': '月度70城覆盖',
+        'needs': {'month_city'},
+        'init': lambda: {'coverage': set()},
+        'accumulate': _accumulate_coverage,
+        'finish': _finish_coverage,
+    },
+    'required_bases': {
+        'title': '同比/环比齐全',
+        'needs': {'month_city', 'fixedbase'},
+        'init': lambda: {'presence': {}},
+        'accumulate': _accumulate_presence,
+        'finish': _finish_required_bases,
+    },
+    'fixedbase_consistency': {
+        'title': '定基比发布一致性',
+        'needs': {'month_city', 'fixedbase'},
+        'init': lambda: {'presence': {}},
+        'accumulate': _accumulate_presence,
+        'finish': _finish_fixedbase_consistency,
+    },
+    'numeric': {
+        'title': '数值列格式',
+        'needs': set(),
+        'init': lambda: {column: [0, set()] for column in NUMERIC_COLUMNS},
+        'accumulate': _accumulate_numeric,
+        'finish': _finish_numeric,
+    },
+}
+
+# 并行执行方式
+RULE_EXECUTORS = ('thread', 'process')
+
+
+def parse_rule_names(text: str) -> List[str]:
+    """'dates,coverage' -> 按注册表顺序排列的规则名列表"""
+    names = {name.strip() for name in text.split(',') if name.strip()}
+    unknown = sorted(names - set(VALIDATION_RULES))
+    if unknown:
+        raise ValueError(f"未知的校验规则: {', '.join(unknown)}（可选: {', '.join(VALIDATION_RULES)}）")
+    if not names:
+        raise ValueError('未指定校验规则')
+    return [name for name in VALIDATION_RULES if name in names]
+
+
+def iter_source_chunks(source):
+    """
+    数据来源 -> 数据块迭代器（来源为可pickle的元组，进程池中各进程自行读取）
+        ('frame', df) / ('csv', 路径, 每块行数, 读取列)
+        ('mapped', 路径, 每块行数, 读取列): 内存映射列式缓存，按块还原字符串
+    """
+    kind = source[0]
+    if kind == 'frame':
+        yield source[1]
+    elif kind == 'mapped':
+        _, csv_path, chunksize, usecols = source
+        arrays = load_encoded(csv_path, columns=usecols)
+        rows = len(arrays[f'{usecols[0]}.codes'])
+        for start in range(0, max(rows, 1), chunksize):
+            yield decode_rows(arrays, slice(start, start + chunksize), usecols)
+    elif kind == 'csv':
+        _, csv_path, chunksize, usecols = source
+        yield from pd.read_csv(csv_path, dtype=str, usecols=usecols, chunksize=chunksize)
+    else:
+        raise ValueError(f'未知的数据来源: {kind}')
+
+
+def _measured(record: list, measure_memory: bool, func, *args):
+    """执行 func 并把耗时累加到 record[0]，峰值内存增量（字节）取最大值记入 record[1]"""
+    start = time.perf_counter()
+    if measure_memory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    result = func(*args)
+    record[0] += time.perf_counter() - start
+    if measure_memory:
+        record[1] = max(record[1] or 0, tracemalloc.get_traced_memory()[1] - baseline)
+    return result
+
+
+def _next_context(chunks, needs: set, shared: dict):
+    chunk = next(chunks, None)
+    return None if chunk is None else build_chunk_context(chunk, needs, shared)
+
+
+def run_rule_group(source, names: List[str], max_details: int = 8, options=None,
+                   threads: int = 1, measure_memory: bool = False) -> dict:
+    """
+    在当前进程内执行一组规则: 每块数据只解析一次，各规则的累积与汇总可分派到线程池
+    返回 {'rows', 'issues': {规则: 问题列表}, 'timings': {规则: [秒, 峰值字节]}, 'prepare': [秒, 峰值字节]}
+    线程并行时 tracemalloc 无法区分各线程的分配，规则的峰值内存记为 None
+    """
+    options = options or {}
+    rules = {name: VALIDATION_RULES[name] for name in names}
+    needs = set().union(*(rule['needs'] for rule in rules.values()))
+    shared = {'rows': 0, 'std_city_ids': {}, 'std_city_names': []}
+    states = {name: rule['init']() for name, rule in rules.items()}
+    timings = {name: [0.0, None] for name in names}
+    prepare = [0.0, None]
+
+    started_tracing = measure_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 and len(names) > 1 else None
+    rule_memory = measure_memory and pool is None
+
+    def run_each(step, *args):
+        def run_one(name):
+            return _measured(timings[name], rule_memory, rules[name][step], states[name], *args)
+        if pool is None:
+            return [run_one(name) for name in names]
+        return list(pool.map(run_one, names))
+
+    try:
+        chunks = iter_source_chunks(source)
+        while True:
+            ctx = _measured(prepare, measure_memory, _next_context, chunks, needs, shared)
+            if ctx is None:
+                break
+            run_each('accumulate', ctx)
+            del ctx
+        results = run_each('finish', shared, max_details, options)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if started_tracing:
+            tracemalloc.stop()
+
+    return {
+        'rows': shared['rows'],
+        'issues': dict(zip(names, results)),
+        'timings': timings,
+        'prepare': prepare,
+    }
+
+
+def run_rules(source, max_details: int = 8, options=None, rules=None, jobs: int = 1,
+              executor: str = 'thread', measure_memory: bool = False):
+    """
+    执行注册表中的校验规则（rules 为 None 时执行全部），返回 (记录数, issues, 耗时统计)
+        jobs > 1 且 executor='thread': 共用一次解析，各规则在线程池中并行累积
+        jobs > 1 且 executor='process': 规则轮流分配到 jobs 个进程，每个进程自行读取并解析数据
+    问题列表始终按注册表顺序排列，与串行执行一致
+    耗时统计为 [(名称, 秒, 峰值内存字节或None)]，包含读取与共享解析一项
+    """
+    names = [name for name in VALIDATION_RULES if rules is None or name in rules]
+    if executor == 'process' and jobs > 1 and len(names) > 1:
+        groups = [names[i::jobs] for i in range(min(jobs, len(names)))]
+        with ProcessPoolExecutor(max_workers=len(groups)) as pool:
+            futures = [
+                pool.submit(run_rule_group, source, group, max_details, options, 1, measure_memory)
+                for group in groups
+            ]
+            results = [future.result() for future in futures]
+    else:
+        threads = jobs if executor == 'thread' else 1
+        results = [run_rule_group(source, names, max_details, options, threads, measure_memory)]
+
+    issues: List[str] = []
+    rule_timings = {}
+    for result in results:
+        rule_timings.update(result['timings'])
+    merged = {}
+    for result in results:
+        merged.update(result['issues'])
+    for name in names:
+        issues.extend(merged[name])
+
+    prepare_seconds = sum(result['prepare'][0] for result in results)
+    prepare_peaks = [result['prepare'][1] for result in results if result['prepare'][1] is not None]
+    label = '读取与共享解析' if len(results) == 1 else f'读取与共享解析（{len(results)}个进程合计）'
+    profile = [(label, prepare_seconds, max(prepare_peaks) if prepare_peaks else None)]
+    for name in names:
+        seconds, peak = rule_timings[name]
+        profile.append((f"{name} {VALIDATION_RULES[name]['title']}", seconds, peak))
+    return results[0]['rows'], issues, profile
+
+
+def validate_chunked(csv_path: str, max_details: int = 8, chunksize: int = DEFAULT_CHUNKSIZE,
+                     rules=None, jobs: int = 1, executor: str = 'thread', timing: bool = False) -> int:
+    """
+    分块校验: 按 chunksize 行分块读取CSV，逐块累积校验状态，结果与全量校验一致
+    内存占用只与块大小、不同取值数和每行8字节的主键编号有关
+    """
+    print(f'开始校验: {csv_path}')
+    columns = pd.read_csv(csv_path, dtype=str, nrows=0).columns.tolist()
+    issues, warnings, missing = check_columns(columns)
+    if missing:
+        rows = sum(len(chunk) for chunk in pd.read_csv(csv_path, dtype=str, usecols=[0], chunksize=chunksize))
+        print(f'记录数: {rows}')
+        return print_report(issues, warnings)
+
+    usecols = [c for c in columns if c in REQUIRED_COLUMNS]
+    rows, rule_issues, profile = run_rules(
+        ('csv', csv_path, chunksize, usecols), max_details, rules=rules, jobs=jobs, executor=executor,
+        measure_memory=timing,
+    )
+    print(f'记录数: {rows}')
+    issues.extend(rule_issues)
+    return print_report(issues, warnings, profile if timing else None)
+
+
+def row_digests(arrays) -> np.ndarray:
+    """
+    每行内容的64位摘要（与字典编码顺序无关，缓存重建后保持不变）
+    每列只对去重后的字符串求哈希，再按编码展开并逐列混合
+    """
+    columns = arrays['__columns__'].tolist()
+    digest = np.zeros(len(arrays[f'{columns[0]}.codes']), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in columns:
+            values = arrays[f'{column}.values']
+            value_hash = pd.util.hash_array(values.astype(object), categorize=False)
+            value_hash = np.append(value_hash, np.uint64(NULL_VALUE_HASH))
+            digest = digest * np.uint64(DIGEST_MULTIPLIER) ^ value_hash[arrays[f'{column}.codes']]
+    return digest
+
+
+def month_digests(row_month: np.ndarray, digest: np.ndarray):
+    """按月份汇总行摘要（求和，与行顺序无关）: 返回 {月份键: (摘要hex, 行数)}"""
+    order = np.argsort(row_month, kind='stable')
+    months, starts, counts = np.unique(row_month[order], return_index=True, return_counts=True)
+    if len(months) == 0:
+        return {}
+    with np.errstate(over='ignore'):
+        sums = np.add.reduceat(digest[order], starts, dtype=np.uint64)
+    return {int(m): (f'{int(h):016x}', int(c)) for m, h, c in zip(months, sums, counts)}
+
+
+def rules_signature(columns: List[str]) -> str:
+    """校验规则签名: 规则版本、列结构或城市口径变化时，已保存的月份结果全部失效"""
+    payload = json.dumps([VALIDATE_STATE_VERSION, columns, sorted(EXPECTED_CITY_NAMES)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def validate_incremental(csv_path: str, max_details: int = 8, jobs: int = 1, executor: str = 'thread',
+                         timing: bool = False) -> int:
+    """
+    增量校验: 按月份保存内容摘要，只复查摘要变化、新增或上次未通过的月份
+    无法解析日期的行每次都复查；月份连续性按全量月份列表检查
+    月份是否通过取决于全部规则，因此增量校验总是执行全部规则
+    """
+    if not cache_enabled():
+        print('提示: 缓存已禁用，改为全量校验')
+        return validate_csv(csv_path, max_details, jobs=jobs, executor=executor, timing=timing)
+
+    print(f'开始校验: {csv_path}')
+    arrays = load_encoded(csv_path)
+    columns = arrays['__columns__'].tolist()
+    total_rows = len(arrays[f'{columns[0]}.codes'])
+    print(f'记录数: {total_rows}')
+    if any(c not in columns for c in REQUIRED_COLUMNS):
+        issues, warnings = check_frame(decode_rows(arrays, slice(0, 0)), max_details)
+        return print_report(issues, warnings)
+
+    _, value_month = parse_value_months(pd.Series(arrays['DATE.values'], dtype=object))
+    row_month = np.append(value_month, -1)[arrays['DATE.codes']]
+    digests = month_digests(row_month, row_digests(arrays))
+    all_months = sorted(m for m in digests if m >= 0)
+
+    signature = rules_signature(columns)
+    state = read_sidecar_json(csv_path, VALIDATE_STATE_SUFFIX) or {}
+    saved = state.get('months', {}) if state.get('signature') == signature else {}
+
+    recheck = set()
+    for month, (digest, rows) in digests.items():
+        entry = saved.get(str(month))
+        if month < 0 or entry is None or not entry.get('clean') or entry.get('digest') != digest:
+            recheck.add(month)
+    skipped = len(digests) - len(recheck)
+    print(f'增量校验: 复查 {len([m for m in recheck if m >= 0])}/{len(all_months)} 个月份'
+          f'{"（含无法解析日期的行）" if -1 in recheck else ""}')
+
+    positions = np.flatnonzero(np.isin(row_month, sorted(recheck)))
+    df = decode_rows(arrays, positions)
+    timings = [] if timing else None
+    issues, warnings = check_frame(
+        df, max_details, all_months=all_months, skipped_clean_months=skipped > 0,
+        jobs=jobs, executor=executor, timings=timings,
+    )
+
+    # 本次存在问题时无法确定具体月份，所有复查的月份都记为未通过，下次继续复查
+    months_state = {}
+    for month, (digest, rows) in digests.items():
+        if month < 0:
+            continue
+        clean = not issues if month in recheck else True
+        months_state[str(month)] = {'digest': digest, 'rows': rows, 'clean': clean}
+    try:
+        write_sidecar_json(csv_path, VALIDATE_STATE_SUFFIX, {
+            'version': VALIDATE_STATE_VERSION,
+            'signature': signature,
+            'months': months_state,
+        })
+    except OSError as e:
+        print(f'警告: 无法写入增量校验状态 ({e})')
 
-    return print_report(issues, warnings)
+    return print_report(issues, warnings, timings)
 
 
-def print_report(issues: List[str], warnings: List[str]) -> int:
+def print_report(issues: List[str], warnings: List[str], timings=None) -> int:
     print('\n================ 校验结果 ================')
     if issues:
         print(f'失败: 发现 {len(issues)} 个问题')
@@ -209,6 +806,13 @@ def print_report(issues: List[str], warnings: List[str]) -> int:
         for idx, text in enumerate(warnings, start=1):
             print(f'W{idx}. {text}')
 
+    if timings:
+        print(f'\n规则耗时: 各项合计 {sum(t[1] for t in timings) * 1000:.1f}ms')
+        print(f"  {'耗时':>8}  {'峰值内存':>8}  规则")
+        for label, seconds, peak in timings:
+            memory = '-' if peak is None else f'{peak / 1024 / 1024:.1f}MB'
+            print(f'  {seconds * 1000:>8.1f}ms  {memory:>10}  {label}')
+
     return 1 if issues else 0
 
 
@@ -216,9 +820,38 @@ def main() -> int:
     parser = argparse.ArgumentParser(description='70城房价数据质量校验工具')
     parser.add_argument('--csv', default=get_default_csv_path(), help='CSV文件路径')
     parser.add_argument('--max-details', type=int, default=8, help='每项问题最多展示的细节数量')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--incremental', '-i', action='store_true',
+                      help='增量校验: 只复查内容变化或上次未通过的月份')
+    mode.add_argument('--chunksize', type=int, nargs='?', const=DEFAULT_CHUNKSIZE,
+                      help=f'分块校验: 每块行数（默认{DEFAULT_CHUNKSIZE}），适用于超大文件')
+    parser.add_argument('--rules', help=f"只执行指定规则（逗号分隔）: {', '.join(VALIDATION_RULES)}")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='规则并行数（默认1，串行）')
+    parser.add_argument('--executor', choices=RULE_EXECUTORS, default='thread',
+                        help='并行方式: thread 共用一次解析; process 各进程独立解析（默认thread）')
+    parser.add_argument('--timing', action='store_true',
+                        help='报告中附带每条规则的耗时与峰值内存（使用tracemalloc，校验会变慢）')
     args = parser.parse_args()
 
-    return validate_csv(args.csv, max_details=args.max_details)
+    if args.chunksize is not None and args.chunksize <= 0:
+        print('错误: --chunksize 必须为正整数')
+        return 1
+    if args.jobs <= 0:
+        print('错误: --jobs 必须为正整数')
+        return 1
+    rules = None
+    if args.rules is not None:
+        if args.incremental:
+            print('错误: --incremental 需要执行全部规则，不能与 --rules 同时使用')
+            return 1
+        try:
+            rules = parse_rule_names(args.rules)
+        except ValueError as e:
+            print(f'错误: {e}')
+            return 1
+    return validate_csv(args.csv, max_details=args.max_details,
+                        incremental=args.incremental, chunksize=args.chunksize,
+                        rules=rules, jobs=args.jobs, executor=args.executor, timing=args.timing)
 
 
 if __name__ == '__main__':